@@ -15,219 +15,41 @@
 # If not, see <https://www.gnu.org/licenses/>.
 
 
-import streamlit as st
-from primer3.bindings import design_primers
-from primer3_st_args import example_values, task_help, primer_task, table_th, table_salt, st_args, st_default_values, st_static_values
-import misprime_libs
-
-colors = {'LEFT': '#8383FC', 'INTERNAL': '#DE83FC', 'RIGHT': '#FCFC83', 'EXCLUDED_REGION': '#FB6A6A', 'TARGET': '#0DF20D', 'INCLUDED_REGION': '#83FCFC'}
-
-
-def hierarchize(primer3_results):
-    results = {}
-    p = 0
-    results['PRIMERS'] = []
-    results['EXPLAIN'] = {}
-    for k, v in primer3_results.items():
-        if k.startswith('PRIMER_'):
-            tmp = k.split('_', 3)
-            if len(tmp) == 2:
-                results[tmp[1]] = v
-                continue
-            if tmp[2] == 'EXPLAIN':
-                results['EXPLAIN'][tmp[0] + '_' + tmp[1]] = v
-            elif tmp[2].isdigit():
-                p = int(tmp[2])
-                while p + 1 > len(results['PRIMERS']):
-                    results['PRIMERS'].append({})
-                if tmp[1] not in results['PRIMERS'][p]:
-                    results['PRIMERS'][p][tmp[1]] = {}
-                if len(tmp) > 3:
-                    results['PRIMERS'][p][tmp[1]][tmp[3]] = v
-                else:
-                    results['PRIMERS'][p][tmp[1]]['POSITION'] = v[0]
-                    results['PRIMERS'][p][tmp[1]]['LENGTH'] = v[1]
-            elif tmp[2] == 'NUM':
-                pass
-        else:
-            results[k] = v
-    return results
-
-
-def sequence_block(seq, LEFT_POSITION=None, LEFT_LENGTH=None, INTERNAL_POSITION=None, INTERNAL_LENGTH=None, RIGHT_POSITION=None, RIGHT_LENGTH=None, EXCLUDED_REGION=None, TARGET=None, INCLUDED_REGION=None):
-    def non_intersecting_parts(ranges, ref):
-        non_intersecting = []
-        label, start, end = ref
-        for _, r_start, r_end in ranges:
-            if r_end >= start and r_start <= end:
-                if r_start > start:
-                    non_intersecting.append((label, start, r_start - 1))
-                start = r_end + 1
-        if end >= start:
-            non_intersecting.append((label, start, end))
-        return non_intersecting
-
-    def remove_overlap(ranges):
-        ranges.sort(key=lambda x: x[1])
-        merged = [ranges[0]]
-        for current in ranges[1:]:
-            previous = merged[-1]
-            if current[1] <= previous[2]:
-                merged[-1] = (previous[0], previous[1], max(previous[2], current[2]))
-            else:
-                merged.append(current)
-        return merged
-
-    ranges = []
-    io_range = None
-    p_ranges = []
-    e_ranges = []
-    t_ranges = []
-    range_gaps = []
-    block_coords = []
-    ir_start = len(seq) + 1
-    ir_end = 0
-    if LEFT_POSITION is not None and LEFT_LENGTH is not None:
-        p_ranges.append(('LEFT', LEFT_POSITION, LEFT_POSITION + LEFT_LENGTH - 1))
-    if INTERNAL_POSITION is not None and INTERNAL_LENGTH is not None:
-        io_range = ('INTERNAL', INTERNAL_POSITION, INTERNAL_POSITION + INTERNAL_LENGTH - 1)
-    if RIGHT_POSITION is not None and RIGHT_LENGTH is not None:
-        p_ranges.append(('RIGHT', RIGHT_POSITION - RIGHT_LENGTH + 1, RIGHT_POSITION))
-
-    if EXCLUDED_REGION is not None:
-        for start, length in EXCLUDED_REGION:
-            e_ranges.append(('EXCLUDED_REGION', start - 1, start + length - 2))
-        e_ranges = remove_overlap(e_ranges)
-        ranges += e_ranges
-
-    if TARGET is not None:
-        for start, length in TARGET:
-            t_ranges.append(('TARGET', start - 1, start + length - 2))
-        t_ranges = remove_overlap(t_ranges)
-        ranges += t_ranges
-        if io_range is not None:
-            p_ranges += non_intersecting_parts(t_ranges, io_range)
-    elif io_range is not None:
-        p_ranges.append(io_range)
-
-    if EXCLUDED_REGION is not None or TARGET is not None:
-        range_gaps = remove_overlap(e_ranges + t_ranges)
-
-    for p_range in p_ranges:
-        if len(range_gaps) > 0:
-            ranges += non_intersecting_parts(range_gaps, p_range)
-        else:
-            ranges += [p_range]
-
-    if INCLUDED_REGION is not None:
-        i_range = ''
-        for start, length in INCLUDED_REGION:
-            ir_start = start - 1
-            ir_end = start + length - 2
-            i_range = ('INCLUDED_REGION', ir_start, ir_end)
-            break
-        range_gaps = remove_overlap(ranges)
-        ranges += non_intersecting_parts(range_gaps, i_range)
-
-    for label, start, end in ranges:
-        start_line = start // 50
-        end_line = end // 50
-        if start_line == end_line:
-            block_coords.append((label, start, end))
-        else:
-            block_coords.append((label, start, (start_line + 1) * 50 - 1))
-            for i in range(start_line + 1, end_line):
-                block_coords.append((label, i * 50, (i + 1) * 50 - 1))
-            block_coords.append((label, end_line * 50, end))
-    formatted_seq = ''
-    c = 0
-    close = False
-    block_coords = sorted(block_coords, key=lambda x: x[1])
-
-    for i, char in enumerate(seq):
-        if c < len(block_coords):
-            label, block_start, block_end = block_coords[c]
-            if i % 50 == 0:
-                formatted_seq += str(i + 1)
-                padding = 0
-                while padding < 12 - len(str(i + 1)):
-                    formatted_seq += "&nbsp;"
-                    padding += 1
-            if i == block_start:
-                formatted_seq += f'<span style="color:black; background-color: {colors[label]}">'
-                close = True
-            if (i + 1) % 10 == 0 and (i + 1) % 50 != 0:
-                formatted_seq += char
-                if io_range is not None:
-                    io_start = io_range[1]
-                    io_end = io_range[2]
-                else:
-                    io_start = len(seq) + 1
-                    io_end = 0
-                if i == block_end and io_start < i <= io_end and label == 'TARGET':
-                    formatted_seq += '</span><span style="color:black; background-color: ' + colors['INTERNAL'] + '">'
-                elif i > 0 and i == ir_end and label == 'INCLUDED_REGION':
-                    formatted_seq += '</span><span>'
-                elif i == block_end and ir_start < i < ir_end and label != 'INCLUDED_REGION':
-                    formatted_seq += '</span><span style="color:black; background-color: ' + colors['INCLUDED_REGION'] + '">'
-                elif i == block_end and ir_start >= i >= ir_end:
-                    formatted_seq += '</span><span>'
-                formatted_seq += '&nbsp;&nbsp;'
-            elif (i + 1) % 50 == 0:
-                formatted_seq += f'{char}<br>\n'
-            else:
-                formatted_seq += char
-            if i == block_end and close:
-                formatted_seq += "</span>"
-                c += 1
-                close = False
-        else:
-            if i % 50 == 0:
-                formatted_seq += str(i + 1)
-                padding = 0
-                while padding < 12 - len(str(i + 1)):
-                    formatted_seq += "&nbsp;"
-                    padding += 1
-            if (i + 1) % 10 == 0 and (i + 1) % 50 != 0:
-                formatted_seq += f'{char}&nbsp;&nbsp;'
-            elif (i + 1) % 50 == 0:
-                formatted_seq += f'{char}<br>\n'
-            else:
-                formatted_seq += char
-    return f'<span style="font-family: monospace, \'Courier New\';">{formatted_seq}</span>'
-
-
-def ranges_to_list(input):
-    r_list = input.split()
-    output = []
-    for s in r_list:
-        if ',' in s:
-            rs = s.split(',')
-        elif '-' in s:
-            rs = s.split('-')
-        output.append([int(x) for x in rs])
-    return output
-
-
-def text_monospace(text):
-    html = f'<span style="font-family: monospace, \'Courier New\';">{text}</span>'
-    return html
+import os
+import sqlite3
+import time
+import uuid
 
+import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from primer3_st_args import example_values, task_help, table_th, table_salt, st_args, st_default_values
+from primer3_st_batch import read_fasta
+from primer3_st_boulder import record_text
+from primer3_st_cache import design_cache
+from primer3_st_check import check_columns, check_table, read_oligos
+from primer3_st_core import (build_args, changed_params, design_params, get_task_region_flags, hierarchize, pair_summary,
+                             sanitize_sequence)
+from primer3_st_export import batch_rows, export_bytes, export_formats, primer_rows, columns as export_columns
+from primer3_st_history import history, owner_id
+from primer3_st_jobs import (batch_design_job, cancel, forget, get_job, job_key, multiplex_job, oligo_check_job,
+                             single_design_job, specificity_job, submit, sweep_design_job, tiled_design_job, walking_design_job)
+from primer3_st_libs import add_library
+from primer3_st_presets import (changed_settings, preset_values, settings_from_file, settings_to_json,
+                                settings_to_primer3, widget_state)
+from primer3_st_render import colors, highlight, sequence_block, text_monospace
+from primer3_st_results import as_dict
+from primer3_st_specificity import genome_path, primer_pairs, product_rows, specificity_rows
+from primer3_st_sweep import MAX_COMBINATIONS, parse_sweep, string_sweep_keys, sweep_count, sweep_keys
+from primer3_st_templates import fetch_region, template_path
+from primer3_st_thermo import thermo
+from primer3_st_tiling import check_tiling
+from primer3_st_timing import RunTimer
 
-def highlight(text, color):
-    html = f'<span style="color:black; background-color: {color}">{text}</span>'
-    return html
 
 def reset_values():
     return {key: dict(st_default_values[key]) for key in st_default_values}
 
-def get_task_region_flags(task):
-    return {
-        "show_excluded": task in ["Detection", "Primer_List"],
-        "show_target": task in ["Detection", "Sequencing"],
-        "show_included": task in ["Detection", "Cloning", "Primer_List"],
-    }
-
 def build_region_input_ui(col_obj, field_key, st_args_dict, st_values_dict, bracket_open, bracket_close):
     with col_obj:
         if field_key in st_args_dict:
@@ -275,11 +97,23 @@ state_defaults = {
     "mishyb_lib_index": 0,
     "table_th_index": table_th_default,
     "table_salt_index": table_salt_default,
+    "job_id": None,
+    "cancelled_job_id": None,
+    "multiplex_job_id": None,
+    "run_token": None,
+    "history_run_token": None,
+    "timing_run_token": None,
+    "applied_values": {},
+    "custom_libraries": {},
+    "settings_message": None,
 }
 
 for key, default_value in state_defaults.items():
     if key not in st.session_state:
         st.session_state[key] = default_value
+if "history_owner" not in st.session_state:
+    user = getattr(st, "user", {})
+    st.session_state.history_owner = owner_id(user.get("email") if user.get("is_logged_in") else None)
 
 def sync_task_state():
     st.session_state.task_help = task_help[st.session_state.task]
@@ -287,19 +121,11 @@ def sync_task_state():
 
 if "task_help" not in st.session_state:
     sync_task_state()
-seq_args = {}
-global_args = {}
-
-for key, value in st_static_values.items():
-    if key.startswith("SEQUENCE_"):
-        seq_args[key] = value
-    elif key.startswith("PRIMER_"):
-        global_args[key] = value
-p3_args = []
-misprime_lib = None
-misprime_lib_name = None
-mishyb_lib = None
-mishyb_lib_name = None
+sequence_records = []
+oligo_records = []
+# Input values replaced by a fetched template region, restored when going
+# back so the slice is not kept in back_params.
+template_inputs = {}
 primer_desc = {'POSITION': 'Start',
                'LENGTH': 'Length',
                'TM': 'Tm',
@@ -323,9 +149,105 @@ def change_task():
     sync_task_state()
 
 
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def submit_job(*job, key):
+    # Jobs are shared by key between sessions, each session subscribes once
+    # and ended sessions are dropped from the running jobs
+    forget(is_active=runtime.get_instance().is_active_session if runtime.exists() else None)
+    return submit(*job, key=key, session=session_id())
+
+
+def cancel_design():
+    cancel(st.session_state.job_id, session_id())
+    st.session_state.cancelled_job_id = st.session_state.job_id
+
+
+def export_download(rows, file_name, table_columns=export_columns, label='Download primers'):
+    col_1, col_2 = st.columns([1, 3])
+    with col_1:
+        export_format = st.selectbox('Export format', options=list(export_formats), key='EXPORT_FORMAT')
+    extension, mime = export_formats[export_format]
+    with col_2:
+        st.caption('')
+        st.download_button(label, data=export_bytes(rows, export_format, table_columns),
+                           file_name=f'{file_name}.{extension}', mime=mime)
+
+
+def record_history(records):
+    # Each press of Pick Primers is stored once, reruns of the results page
+    # skip it. Jobs are shared and cached, so their ids do not tell runs apart.
+    if history is None or st.session_state.history_run_token == st.session_state.run_token:
+        return
+    st.session_state.history_run_token = st.session_state.run_token
+    try:
+        for record in records:
+            history.record(st.session_state.history_owner, st.session_state.task, *record)
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f'The run was not saved to the history: {e}', icon="⚠️")
+
+
+def write_timing_log(run_timer):
+    # One line per run, like the history
+    if st.session_state.timing_run_token == st.session_state.run_token:
+        return
+    st.session_state.timing_run_token = st.session_state.run_token
+    run_timer.write_log()
+
+
+def library_options(key):
+    return st_args[key]["options"] + tuple(st.session_state.custom_libraries)
+
+
+def library_label(name):
+    return st.session_state.custom_libraries.get(name, name)
+
+
+def apply_settings(values):
+    st.session_state.update(widget_state(values))
+    st.session_state.table_th_index = table_th[values["SCRIPT_PRIMER_TM_FORMULA"]]
+    st.session_state.table_salt_index = table_salt[values["SCRIPT_PRIMER_SALT_CORRECTIONS"]]
+    st.session_state.misprime_lib_index = st_args["PRIMER_MISPRIMING_LIBRARY"]["options"].index(
+        values["PRIMER_MISPRIMING_LIBRARY"])
+    st.session_state.mishyb_lib_index = st_args["PRIMER_INTERNAL_MISHYB_LIBRARY"]["options"].index(
+        values["PRIMER_INTERNAL_MISHYB_LIBRARY"])
+    st.session_state.applied_values = changed_settings(values)
+
+
+def change_preset():
+    apply_settings(preset_values(st.session_state["SCRIPT_SETTINGS_PRESET"]))
+    st.session_state.settings_message = None
+
+
+def activate_settings():
+    settings_file = st.session_state["SCRIPT_SETTINGS_FILE"]
+    if settings_file is None:
+        st.session_state.settings_message = ('warning', 'Choose a settings file first')
+        return
+    try:
+        values, skipped = settings_from_file(settings_file.name, settings_file.getvalue())
+    except (ValueError, UnicodeDecodeError) as e:
+        st.session_state.settings_message = ('error', f'{settings_file.name}: {e}')
+        return
+    apply_settings(values)
+    message = f'Settings from {settings_file.name} activated'
+    if skipped:
+        message += ', ignored ' + ', '.join(skipped)
+    st.session_state.settings_message = ('info', message)
+
+
+def current_settings():
+    return {key: st.session_state.get(st_args[key]["key"], value)
+            for key, value in preset_values("Default").items()}
+
+
 def back_to_input():
     st.session_state.pick_primers = False
-    st.session_state.back_params = dict(params)
+    st.session_state.back_params = changed_params(params, st.session_state.applied_values)
+    st.session_state.back_params.update(template_inputs)
     st.session_state.back_active = True
 
 
@@ -351,6 +273,8 @@ with primer3_main.container():
         st_values = reset_values()
         reset_session_keys()
         st.session_state.reset_form = False
+    for key, value in st.session_state.applied_values.items():
+        st_values[key]["value"] = value
     
     st.title('Primer3')
     col_1, col_2, col_3, col_4 = st.columns([3, 3, 1, 1])
@@ -365,8 +289,7 @@ with primer3_main.container():
         st.selectbox(**st_args["SCRIPT_TASK"], on_change=change_task,
                      index=st.session_state.task_index, help=st.session_state.task_help)
     with col_2:
-        params["SCRIPT_SETTINGS_PRESET"] = st.selectbox(**st_args["SCRIPT_SETTINGS_PRESET"],
-                                                        help="Not implemented yet", disabled=True)
+        params["SCRIPT_SETTINGS_PRESET"] = st.selectbox(**st_args["SCRIPT_SETTINGS_PRESET"], on_change=change_preset)
     with col_4:
         st.caption('')
         st.caption('')
@@ -377,6 +300,9 @@ with primer3_main.container():
         st.caption('')
         if st.button('Pick Primers', key="PICK_PRIMERS", type="primary"):
             st.session_state.pick_primers = True
+            st.session_state.job_id = None
+            st.session_state.run_token = uuid.uuid4().hex
+            st.session_state.cancelled_job_id = None
     tab_main, tab_g_set, tab_a_set, tab_io, tab_pw, tab_sq = st.tabs(
         ['Main', 'General Settings', 'Advanced Settings', 'Internal Oligo', 'Penalty Weights', 'Sequence Quality'])
 
@@ -405,13 +331,42 @@ with primer3_main.container():
                     **st_args["SCRIPT_SEQUENCE_ID"], **st_values["SCRIPT_SEQUENCE_ID"])
                 if st.session_state.task in ["Primer_Check"]:
                     params["SEQUENCE_PRIMER"] = st.text_input("Primer to test:", key="SEQUENCE_PRIMER", **st_values["SEQUENCE_PRIMER"])
+            if st.session_state.task in ["Primer_Check"]:
+                with col_2:
+                    params["SCRIPT_OLIGO_FILE"] = st.file_uploader(
+                        **st_args["SCRIPT_OLIGO_FILE"], **st_values["SCRIPT_OLIGO_FILE"])
+                    params["SCRIPT_OLIGO_LIST"] = st.text_area(
+                        **st_args["SCRIPT_OLIGO_LIST"], **st_values["SCRIPT_OLIGO_LIST"])
+                oligo_records = read_oligos(params["SCRIPT_OLIGO_LIST"])
+                if params["SCRIPT_OLIGO_FILE"] is not None:
+                    oligo_records += read_oligos(params["SCRIPT_OLIGO_FILE"].getvalue().decode(errors='replace'))
+                if len(oligo_records) > 0:
+                    st.info(f'{len(oligo_records)} oligos loaded, all of them will be checked')
             if st.session_state.task in ["Detection", "Cloning", "Sequencing", "Primer_List"]:
                 with col_2:
                     st.caption('')
                     params["SCRIPT_SEQUENCE_FILE"] = st.file_uploader(
-                        **st_args["SCRIPT_SEQUENCE_FILE"], **st_values["SCRIPT_SEQUENCE_FILE"], help="Not implemented yet", disabled=True)
+                        **st_args["SCRIPT_SEQUENCE_FILE"], **st_values["SCRIPT_SEQUENCE_FILE"],
+                        help="FASTA or plain sequence. Primers are picked for every record of a multi-FASTA file.")
+                    params["SCRIPT_TEMPLATE_SOURCE"] = st.text_input(
+                        **st_args["SCRIPT_TEMPLATE_SOURCE"], **st_values["SCRIPT_TEMPLATE_SOURCE"])
+                    col_2a, col_2b = st.columns([3, 1])
+                    with col_2a:
+                        params["SCRIPT_TEMPLATE_REGION"] = st.text_input(
+                            **st_args["SCRIPT_TEMPLATE_REGION"], **st_values["SCRIPT_TEMPLATE_REGION"])
+                    with col_2b:
+                        params["SCRIPT_TEMPLATE_FLANK"] = st.number_input(
+                            **st_args["SCRIPT_TEMPLATE_FLANK"], **st_values["SCRIPT_TEMPLATE_FLANK"])
                 params["SEQUENCE_TEMPLATE"] = st.text_area(
                     **st_args["SEQUENCE_TEMPLATE"], **st_values["SEQUENCE_TEMPLATE"])
+                if params["SCRIPT_SEQUENCE_FILE"] is not None:
+                    sequence_records = list(read_fasta(params["SCRIPT_SEQUENCE_FILE"].getvalue()))
+                    if len(sequence_records) == 1 and params["SEQUENCE_TEMPLATE"] == "":
+                        if params["SCRIPT_SEQUENCE_ID"] == "":
+                            params["SCRIPT_SEQUENCE_ID"] = sequence_records[0][0]
+                        params["SEQUENCE_TEMPLATE"] = sequence_records[0][1]
+                    elif len(sequence_records) > 1:
+                        st.info(f'{len(sequence_records)} sequences loaded, primers will be picked for each of them')
                 col_1, col_2, col_3, col_4, col_5, col_6, col_7 = st.columns([6, 2, 2, 2, 3, 1, 5])
                 with col_1:
                     st.markdown("Mark selected region:", help="Not implemented yet")
@@ -534,27 +489,47 @@ with primer3_main.container():
                 **st_args["PRIMER_DNTP_CONC"], **st_values["PRIMER_DNTP_CONC"])
         st.divider()
         col_1, col_2 = st.columns(2)
+        with col_2:
+            params["SCRIPT_LIBRARY_FILE"] = st.file_uploader(
+                **st_args["SCRIPT_LIBRARY_FILE"], **st_values["SCRIPT_LIBRARY_FILE"])
+            if params["SCRIPT_LIBRARY_FILE"] is not None:
+                try:
+                    library_name, library_size = add_library(params["SCRIPT_LIBRARY_FILE"].getvalue())
+                except (OSError, ValueError) as e:
+                    st.error(f'Library not loaded: {e}', icon="🚨")
+                else:
+                    st.session_state.custom_libraries = {
+                        **st.session_state.custom_libraries,
+                        library_name: f'{params["SCRIPT_LIBRARY_FILE"].name} ({library_size} sequences)'}
         with col_1:
             params["PRIMER_MISPRIMING_LIBRARY"] = st.selectbox(
-                **st_args["PRIMER_MISPRIMING_LIBRARY"], index=st.session_state.misprime_lib_index)
+                **{**st_args["PRIMER_MISPRIMING_LIBRARY"], "options": library_options("PRIMER_MISPRIMING_LIBRARY")},
+                index=st.session_state.misprime_lib_index, format_func=library_label)
         st.divider()
         st.markdown("To upload or save a settings file from your local computer, choose here:",
-                    help="Not implemented yet")
+                    help="Primer3 settings files and JSON files saved here are accepted.")
         col_1, col_2, col_3 = st.columns([11, 5, 4])
         with col_1:
             params["SCRIPT_SETTINGS_FILE"] = st.file_uploader(
-                **st_args["SCRIPT_SETTINGS_FILE"], **st_values["SCRIPT_SETTINGS_FILE"], disabled=True)
+                **st_args["SCRIPT_SETTINGS_FILE"], **st_values["SCRIPT_SETTINGS_FILE"])
         with col_2:
             st.caption('')
             st.caption('')
             st.caption('')
-            params["Activate_Settings"] = st.button(label="Activate Settings", disabled=True)
+            params["Activate_Settings"] = st.button(label="Activate Settings", on_click=activate_settings)
         with col_3:
             st.caption('')
             st.caption('')
             st.caption('')
             params["Save_Settings"] = st.download_button(
-                label="Save Settings", data="", disabled=True)
+                label="Save Settings", data=settings_to_primer3(current_settings()),
+                file_name="primer3_settings.txt", mime="text/plain")
+            st.download_button(label="Save as JSON",
+                               data=settings_to_json(current_settings(), params["SCRIPT_SETTINGS_PRESET"]),
+                               file_name="primer3_settings.json", mime="application/json")
+        if st.session_state.settings_message is not None:
+            message_type, message = st.session_state.settings_message
+            getattr(st, message_type)(message)
 
     with tab_a_set:
         col_1, col_2 = st.columns(2)
@@ -650,14 +625,71 @@ with primer3_main.container():
         with col_1:
             params["SCRIPT_SEQUENCING_REVERSE"] = st.number_input(
                 **st_args["SCRIPT_SEQUENCING_REVERSE"], **st_values["SCRIPT_SEQUENCING_REVERSE"])
+        with col_2:
+            params["SCRIPT_SEQUENCING_READ_LENGTH"] = st.number_input(
+                **st_args["SCRIPT_SEQUENCING_READ_LENGTH"], **st_values["SCRIPT_SEQUENCING_READ_LENGTH"])
+        st.divider()
+        st.write("Tiling:")
+        col_1, col_2, col_3 = st.columns(3)
+        with col_1:
+            st.caption('')
+            params["SCRIPT_TILING"] = st.checkbox(
+                **st_args["SCRIPT_TILING"], **st_values["SCRIPT_TILING"])
+        with col_2:
+            params["SCRIPT_TILING_WINDOW"] = st.number_input(
+                **st_args["SCRIPT_TILING_WINDOW"], **st_values["SCRIPT_TILING_WINDOW"])
+        with col_3:
+            params["SCRIPT_TILING_OVERLAP"] = st.number_input(
+                **st_args["SCRIPT_TILING_OVERLAP"], **st_values["SCRIPT_TILING_OVERLAP"])
+        st.divider()
+        st.write("Parameter sweep:")
+        col_1, col_2 = st.columns([1, 2])
+        with col_1:
+            st.caption('')
+            params["SCRIPT_SWEEP"] = st.checkbox(
+                **st_args["SCRIPT_SWEEP"], **st_values["SCRIPT_SWEEP"])
+        with col_2:
+            params["SCRIPT_SWEEP_KEYS"] = st.multiselect(
+                **st_args["SCRIPT_SWEEP_KEYS"], **st_values["SCRIPT_SWEEP_KEYS"], options=sweep_keys())
+        sweep_values = {}
+        for key in params["SCRIPT_SWEEP_KEYS"]:
+            if key in string_sweep_keys:
+                sweep_help = 'Alternative values separated by ";", e.g. 100-300; 150-250 200-400'
+            else:
+                sweep_help = 'Values separated by ",", or start:stop:step ranges, e.g. 57:61:0.5, 63'
+            sweep_values[key] = st.text_input(f'{key} values:', key=f'SWEEP_{key}', help=sweep_help)
+        params["SCRIPT_SWEEP_VALUES"] = sweep_values
+        st.divider()
+        st.write("Specificity:")
+        params["SCRIPT_SPECIFICITY_GENOME"] = st.text_input(
+            **st_args["SCRIPT_SPECIFICITY_GENOME"], **st_values["SCRIPT_SPECIFICITY_GENOME"])
+        col_1, col_2 = st.columns(2)
+        with col_1:
+            params["SCRIPT_SPECIFICITY_MAX_SIZE"] = st.number_input(
+                **st_args["SCRIPT_SPECIFICITY_MAX_SIZE"], **st_values["SCRIPT_SPECIFICITY_MAX_SIZE"])
+        with col_2:
+            params["SCRIPT_SPECIFICITY_MISMATCHES"] = st.number_input(
+                **st_args["SCRIPT_SPECIFICITY_MISMATCHES"], **st_values["SCRIPT_SPECIFICITY_MISMATCHES"])
+        st.divider()
+        st.write("Multiplex panel:")
+        col_1, col_2 = st.columns(2)
+        with col_1:
+            params["SCRIPT_MULTIPLEX_MIN_DG"] = st.number_input(
+                **st_args["SCRIPT_MULTIPLEX_MIN_DG"], **st_values["SCRIPT_MULTIPLEX_MIN_DG"])
+        with col_2:
+            st.caption('With a multi-FASTA file, the batch results offer to pick one compatible pair per sequence.')
         st.divider()
         col_1, col_2, col_3 = st.columns(3)
         with col_1:
             st.write('Show sequence block:')
             params["SCRIPT_SEQUENCE_BLOCK_PAIRS"] = st.checkbox("Only on pair design", value=True)
             params["SCRIPT_SEQUENCE_BLOCK_FIRST"] = st.checkbox("Only on first entry", value=True)
+            params["SCRIPT_RESULTS_PAGE_SIZE"] = st.number_input(
+                **st_args["SCRIPT_RESULTS_PAGE_SIZE"], **st_values["SCRIPT_RESULTS_PAGE_SIZE"])
         with col_2:
             params["SCRIPT_SHOW_INPUT"] = st.checkbox("Show original input", value=False)
+            params["SCRIPT_SHOW_PERFORMANCE"] = st.checkbox(
+                **st_args["SCRIPT_SHOW_PERFORMANCE"], **st_values["SCRIPT_SHOW_PERFORMANCE"])
         with col_3:
             results_format = st.radio('Show output in JSON format:', options=('No', 'Flat', 'Hierarchized'), help='"Flat" is the standard Primer3 output. "Hierarchized" means outputing Primer3 results in an hierachical dictionary, which is easier to read and use in downstream applications.')
             if results_format == 'Flat':
@@ -746,7 +778,8 @@ with primer3_main.container():
         col_1, col_2 = st.columns(2)
         with col_1:
             params["PRIMER_INTERNAL_MISHYB_LIBRARY"] = st.selectbox(
-                **st_args["PRIMER_INTERNAL_MISHYB_LIBRARY"], index=st.session_state.mishyb_lib_index)
+                **{**st_args["PRIMER_INTERNAL_MISHYB_LIBRARY"], "options": library_options("PRIMER_INTERNAL_MISHYB_LIBRARY")},
+                index=st.session_state.mishyb_lib_index, format_func=library_label)
     with tab_pw:
         col_p, col_pp, col_io = st.columns(3)
         with col_p:
@@ -851,88 +884,191 @@ with primer3_main.container():
             params["PRIMER_SEQUENCE_QUALITY"] = st.text_area(
                 label="_", label_visibility="hidden", height=150, value=st_values["PRIMER_SEQUENCE_QUALITY"]["value"])
 
-global_args["PRIMER_TASK"] = primer_task[st.session_state.task]
 if st.session_state.task in ["Primer_Check"]:
     params["SEQUENCE_TEMPLATE"] = params["SEQUENCE_PRIMER"]
-    global_args["PRIMER_TM_FORMULA"] = 0
-    global_args["PRIMER_SALT_CORRECTIONS"] = 0
-if st.session_state.pick_primers and params["SEQUENCE_TEMPLATE"] != "":
+batch_mode = len(sequence_records) > 1 and st.session_state.task not in ["Primer_Check"]
+check_mode = len(oligo_records) > 0 and st.session_state.task in ["Primer_Check"]
+if (st.session_state.pick_primers and not batch_mode and st.session_state.task not in ["Primer_Check"]
+        and params["SEQUENCE_TEMPLATE"] == "" and params["SCRIPT_TEMPLATE_REGION"] != ""):
+    try:
+        if params["SCRIPT_TEMPLATE_SOURCE"] == "":
+            raise ValueError('no indexed template file given')
+        template_id, template, (region_start, region_length) = fetch_region(
+            template_path(params["SCRIPT_TEMPLATE_SOURCE"]), params["SCRIPT_TEMPLATE_REGION"],
+            params["SCRIPT_TEMPLATE_FLANK"])
+    except OSError as e:
+        st.error(f'Template region: {params["SCRIPT_TEMPLATE_SOURCE"]}: {e.strerror}', icon="🚨")
+    except ValueError as e:
+        st.error(f'Template region: {e}', icon="🚨")
+    else:
+        template_inputs = {key: params.get(key, "") for key in ["SEQUENCE_TEMPLATE", "SCRIPT_SEQUENCE_ID", "SCRIPT_TARGET"]}
+        params["SEQUENCE_TEMPLATE"] = template
+        if params["SCRIPT_SEQUENCE_ID"] == "":
+            params["SCRIPT_SEQUENCE_ID"] = template_id
+        if (params["SCRIPT_TEMPLATE_FLANK"] > 0 and params["SCRIPT_TARGET"] == ""
+                and get_task_region_flags(st.session_state.task)["show_target"]):
+            params["SCRIPT_TARGET"] = f'{region_start + params["PRIMER_FIRST_BASE_INDEX"]},{region_length}'
+if st.session_state.pick_primers and (params["SEQUENCE_TEMPLATE"] != "" or batch_mode or check_mode):
     primer3_main.empty()
-    params["SEQUENCE_TEMPLATE"] = params["SEQUENCE_TEMPLATE"].strip()
-    illegal_chars = []
-    if any(char.isdigit()for char in params["SEQUENCE_TEMPLATE"]):
-        illegal_chars.append('numbers')
-    if any(char.isspace() for char in params["SEQUENCE_TEMPLATE"]):
-        illegal_chars.append('spaces')
+    run_timer = RunTimer(task=st.session_state.task, sequence_id=params["SCRIPT_SEQUENCE_ID"],
+                         records=len(sequence_records) if batch_mode else len(oligo_records) if check_mode else 1)
+    with run_timer.span('sanitize'):
+        params["SEQUENCE_TEMPLATE"], illegal_chars = sanitize_sequence(params["SEQUENCE_TEMPLATE"])
+    run_timer.info['length'] = len(params["SEQUENCE_TEMPLATE"])
     if len(illegal_chars) > 0:
-        params["SEQUENCE_TEMPLATE"] = ''.join(filter(lambda char: not char.isdigit() and not char.isspace(), params["SEQUENCE_TEMPLATE"]))
         st.warning('Deleted ' + ' and '.join(illegal_chars) + ' in input sequence', icon="⚠️")
     st_values["SEQUENCE_TEMPLATE"]["value"] = params["SEQUENCE_TEMPLATE"]
-    for key, value in seq_args.items():
-        p3_args.append(f'{key}={value}')
-    for key in params:
-        if params[key] == "":
-            continue
-        if key.startswith("SEQUENCE_"):
-            seq_args[key] = params[key]
-            p3_args.append(f'{key}={params[key]}')
-        if key.startswith("PRIMER_") and "_MISPRIMING_LIBRARY" not in key and "_MISHYB_LIBRARY" not in key:
-            global_args[key] = params[key]
-        global_args["PRIMER_LIBERAL_BASE"] = int(params["SCRIPT_PRIMER_LIBERAL_BASE"])
-        global_args["PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS"] = int(params["SCRIPT_PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS"])
-        global_args["PRIMER_LOWERCASE_MASKING"] = int(params["SCRIPT_PRIMER_LOWERCASE_MASKING"])
+    with run_timer.span('build_args'):
+        seq_args, global_args, _, misprime_lib_name, mishyb_lib_name = build_args(params, st.session_state.task)
     if st.session_state.task not in ["Primer_Check"]:
-        regions = []
-        flags = get_task_region_flags(st.session_state.task)
-        if flags["show_excluded"]:
-            regions.append("EXCLUDED_REGION")
-        if flags["show_target"]:
-            regions.append("TARGET")
-        if flags["show_included"]:
-            regions.append("INCLUDED_REGION")
-        for r in regions:
-            if params["SCRIPT_" + r] != "":
-                p3_args.append("SEQUENCE_" + r + "=" + params["SCRIPT_" + r])
-                seq_args["SEQUENCE_" + r] = ranges_to_list(params["SCRIPT_" + r])
-        if st.session_state.task in ["Detection"]:
-            global_args["PRIMER_PICK_LEFT_PRIMER"] = int(params["SCRIPT_DETECTION_PICK_LEFT"])
-            global_args["PRIMER_PICK_INTERNAL_OLIGO"] = int(params["SCRIPT_DETECTION_PICK_HYB_PROBE"])
-            global_args["PRIMER_PICK_RIGHT_PRIMER"] = int(params["SCRIPT_DETECTION_PICK_RIGHT"])
-        global_args["PRIMER_TM_FORMULA"] = table_th[params["SCRIPT_PRIMER_TM_FORMULA"]]
         st.session_state.table_th_index = table_th[params["SCRIPT_PRIMER_TM_FORMULA"]]
-        global_args["PRIMER_SALT_CORRECTIONS"] = table_salt[params["SCRIPT_PRIMER_SALT_CORRECTIONS"]]
         st.session_state.table_salt_index = table_salt[params["SCRIPT_PRIMER_SALT_CORRECTIONS"]]
-        if params["PRIMER_MISPRIMING_LIBRARY"] != 'NONE':
-            p3_args.append("PRIMER_MISPRIMING_LIBRARY" + "=" + params["PRIMER_MISPRIMING_LIBRARY"])
-            misprime_lib = getattr(misprime_libs, params["PRIMER_MISPRIMING_LIBRARY"])
-            st.session_state.misprime_lib_index = st_args["PRIMER_MISPRIMING_LIBRARY"]["options"].index(
-                params["PRIMER_MISPRIMING_LIBRARY"])
-        if params["PRIMER_INTERNAL_MISHYB_LIBRARY"] != 'NONE':
-            p3_args.append("PRIMER_INTERNAL_MISHYB_LIBRARY" + "=" + params["PRIMER_INTERNAL_MISHYB_LIBRARY"])
-            mishyb_lib = getattr(misprime_libs, params["PRIMER_INTERNAL_MISHYB_LIBRARY"])
-            st.session_state.mishyb_lib_index = st_args["PRIMER_INTERNAL_MISHYB_LIBRARY"]["options"].index(
-                params["PRIMER_INTERNAL_MISHYB_LIBRARY"])
-    for key, value in global_args.items():
-        p3_args.append(f'{key}={value}')
-    p3_args = sorted(p3_args)
-    p3_args.append('=')
-    if 'PRIMER_PRODUCT_SIZE_RANGE' in global_args:
-        global_args['PRIMER_PRODUCT_SIZE_RANGE'] = ranges_to_list(global_args['PRIMER_PRODUCT_SIZE_RANGE'])
+        if misprime_lib_name is not None:
+            st.session_state.misprime_lib_index = library_options("PRIMER_MISPRIMING_LIBRARY").index(misprime_lib_name)
+        if mishyb_lib_name is not None:
+            st.session_state.mishyb_lib_index = library_options("PRIMER_INTERNAL_MISHYB_LIBRARY").index(mishyb_lib_name)
     output_global_args = dict(global_args)
+    sweep_mode = (not batch_mode and params["SCRIPT_SWEEP"] and len(params["SCRIPT_SWEEP_VALUES"]) > 0
+                  and st.session_state.task not in ["Primer_Check"])
+    walk_mode = not batch_mode and not sweep_mode and st.session_state.task in ["Sequencing"]
+    tiling_mode = (not batch_mode and not sweep_mode and not walk_mode and params["SCRIPT_TILING"]
+                   and len(params["SEQUENCE_TEMPLATE"]) > params["SCRIPT_TILING_WINDOW"])
+    if sweep_mode:
+        try:
+            sweeps = {key: parse_sweep(key, text) for key, text in params["SCRIPT_SWEEP_VALUES"].items()}
+            if sweep_count(sweeps) > MAX_COMBINATIONS:
+                raise ValueError(f'{sweep_count(sweeps)} combinations, the limit is {MAX_COMBINATIONS}')
+        except ValueError as e:
+            st.title('Primer3 Results')
+            st.button('< Back', on_click=back_to_input, type="secondary")
+            st.error(f'Invalid sweep: {e}', icon="🚨")
+            st.stop()
+    if tiling_mode:
+        try:
+            check_tiling(params["SCRIPT_TILING_WINDOW"], params["SCRIPT_TILING_OVERLAP"], seq_args.get("SEQUENCE_TARGET", []))
+        except ValueError as e:
+            st.title('Primer3 Results')
+            st.button('< Back', on_click=back_to_input, type="secondary")
+            st.error(f'Invalid tiling: {e}', icon="🚨")
+            st.stop()
+    if batch_mode:
+        design_job = (batch_design_job, sequence_records, seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+    elif check_mode:
+        design_job = (oligo_check_job, oligo_records, seq_args, global_args)
+    elif sweep_mode:
+        design_job = (sweep_design_job, design_params(params), st.session_state.task, sweeps)
+    elif walk_mode:
+        design_job = (walking_design_job, seq_args, global_args, misprime_lib_name, mishyb_lib_name,
+                      params["SCRIPT_SEQUENCING_LEAD"], params["SCRIPT_SEQUENCING_SPACING"],
+                      params["SCRIPT_SEQUENCING_INTERVAL"], params["SCRIPT_SEQUENCING_ACCURACY"],
+                      bool(params["SCRIPT_SEQUENCING_REVERSE"]), params["SCRIPT_SEQUENCING_READ_LENGTH"])
+    elif tiling_mode:
+        design_job = (tiled_design_job, seq_args, global_args, misprime_lib_name, mishyb_lib_name,
+                      params["SCRIPT_TILING_WINDOW"], params["SCRIPT_TILING_OVERLAP"])
+    else:
+        design_job = (single_design_job, seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+    design_job_key = job_key(design_job[0].__name__, *design_job[1:])
+    job = get_job(st.session_state.job_id) if st.session_state.job_id is not None else None
+    if job is None or job.key != design_job_key:
+        st.session_state.job_id = submit_job(*design_job, key=design_job_key)
+        job = get_job(st.session_state.job_id)
+    with run_timer.span('design_primers (wait)'):
+        job.wait(0.5)
+    if job.finished is not None:
+        run_timer.info['job_ms'] = round((job.finished - job.started) * 1000, 3)
+    # A session that cancelled a job still shared with other sessions only detaches from it
+    job_status = 'cancelled' if st.session_state.cancelled_job_id == job.id else job.status
+    if batch_mode or check_mode or sweep_mode or job_status in ['running', 'cancelled']:
+        st.title('Primer3 Results')
+        col_1, col_2, col_3 = st.columns([2, 2, 8])
+        with col_1:
+            st.button('< Back', on_click=back_to_input, type="secondary")
+        if job_status == 'running':
+            with col_2:
+                st.button('Cancel', on_click=cancel_design, type="secondary")
+            if job.progress is None:
+                st.progress(0.0, text=f'Designing primers... {time.time() - job.started:.0f} s')
+            else:
+                unit = "sequences" if batch_mode else "oligos" if check_mode else "designs" if sweep_mode else "walk positions" if walk_mode else "windows"
+                st.progress(job.progress, text=f'{job.done} of {job.total} {unit}')
+        elif job_status == 'cancelled':
+            st.warning('Design cancelled', icon="⚠️")
+        elif job_status == 'failed':
+            st.exception(job.error)
+        if sweep_mode and job_status == 'done':
+            st.caption(f'{sweep_count(sweeps)} settings, {max([row["Design"] for row in job.result], default=0)} distinct designs, '
+                       'sorted by best penalty')
+            st.dataframe(job.result, hide_index=True, use_container_width=True)
+        if check_mode and job_status == 'done':
+            thermo_stats = thermo.stats()
+            st.caption(f'{len(job.result)} oligos, dG values in kcal/mol. Click a column header to sort. Thermodynamic '
+                       f"cache: {thermo_stats['hits'] + thermo_stats['store_hits']} hits, {thermo_stats['misses']} misses")
+            st.dataframe(check_table(job.result), hide_index=True, use_container_width=True)
+            st.divider()
+            export_download(job.result, 'primer3_check', check_columns, 'Download table')
+        if batch_mode:
+            for seq_id, primer3_results, error in list(job.partial):
+                st.subheader(seq_id)
+                if error is not None:
+                    st.exception(error)
+                    continue
+                primers = hierarchize(primer3_results)
+                if 'WARNING' in primers:
+                    st.warning(primers['WARNING'], icon="⚠️")
+                if len(primers['PRIMERS']) == 0:
+                    st.warning("No Primers found", icon="⚠️")
+                else:
+                    st.dataframe(pair_summary(primers), hide_index=True, use_container_width=True)
+        if job_status == 'running':
+            time.sleep(0.5)
+            st.rerun()
+        if batch_mode and len(job.partial) > 0:
+            st.divider()
+            export_download(batch_rows(job.partial), 'primer3_batch')
+        if batch_mode and job_status == 'done':
+            templates = dict(sequence_records)
+            record_history([(seq_id, {**seq_args, 'SEQUENCE_ID': seq_id, 'SEQUENCE_TEMPLATE': templates[seq_id]},
+                             output_global_args, misprime_lib_name, mishyb_lib_name, hierarchize(primer3_results))
+                            for seq_id, primer3_results, error in job.partial if error is None])
+            st.divider()
+            st.subheader('Multiplex panel')
+            panel_job = (multiplex_job, job.partial, global_args, params["SCRIPT_MULTIPLEX_MIN_DG"] * 1000)
+            panel_job_key = job_key(design_job_key, *panel_job[2:])
+            mjob = get_job(st.session_state.multiplex_job_id) if st.session_state.multiplex_job_id is not None else None
+            if mjob is None or mjob.key != panel_job_key:
+                if st.button('Check cross-dimers and pick a panel', help='Computes the heterodimer dG of all primers of all '
+                             'sequences and picks one pair per sequence with the weakest cross-dimers.'):
+                    st.session_state.multiplex_job_id = submit_job(*panel_job, key=panel_job_key)
+                    st.rerun()
+            elif mjob.running:
+                st.progress(mjob.progress or 0.0, text=f'{mjob.done} of {mjob.total or 0} primer combinations')
+                time.sleep(0.5)
+                st.rerun()
+            elif mjob.status == 'failed':
+                st.exception(mjob.error)
+            elif mjob.status == 'done':
+                panel = mjob.result['panel']
+                conflicts = sum(not row['Compatible'] for row in panel)
+                st.caption(f"{mjob.result['oligos']} primers, {len(panel)} sequences, {conflicts} with cross-dimers "
+                           f"below {params['SCRIPT_MULTIPLEX_MIN_DG']} kcal/mol")
+                st.dataframe(panel, hide_index=True, use_container_width=True)
+                with st.expander('Cross-dimer dG of the panel (kcal/mol)', expanded=False):
+                    st.dataframe(mjob.result['matrix'], hide_index=True, use_container_width=True)
+        write_timing_log(run_timer)
+        st.stop()
     primers = {'PRIMERS': [], 'EXPLAIN': {}}
-    try:
-        primer3_results = design_primers(
-            seq_args, global_args, misprime_lib=misprime_lib, mishyb_lib=mishyb_lib)
-        primers = hierarchize(primer3_results)
-    except Exception as e:
-        st.exception(e)
+    primer3_results = {}
+    if job_status == 'failed':
+        st.exception(job.error)
         st.subheader('Original input')
-        st.json({'seq_args': seq_args, 'global_args': output_global_args, 'misprime_lib': misprime_lib})
-        try:
-            st.subheader('Original output')
-            st.write(primer3_results)
-        except Exception:
-            pass
+        st.json({'seq_args': seq_args, 'global_args': output_global_args, 'misprime_lib': misprime_lib_name})
+    elif tiling_mode or walk_mode:
+        primers = job.result
+        primer3_results = primers
+    else:
+        primer3_results = job.result
+        with run_timer.span('hierarchize'):
+            primers = hierarchize(primer3_results)
 
     sequence_block_params = {'seq': params["SEQUENCE_TEMPLATE"]}
     for region in ['SEQUENCE_EXCLUDED_REGION', 'SEQUENCE_TARGET', 'SEQUENCE_INCLUDED_REGION']:
@@ -943,9 +1079,72 @@ if st.session_state.pick_primers and params["SEQUENCE_TEMPLATE"] != "":
         st.warning(primers['WARNING'], icon="⚠️")
     st.title('Primer3 Results')
     st.button('< Back', on_click=back_to_input, type="secondary")
+    # Only rendering depends on these, changing them reruns the page with
+    # the same design job.
+    with st.expander('Display options', expanded=False):
+        col_1, col_2, col_3 = st.columns(3)
+        with col_1:
+            params["SCRIPT_SEQUENCE_BLOCK_PAIRS"] = st.checkbox(
+                "Sequence block only on pair design", value=params["SCRIPT_SEQUENCE_BLOCK_PAIRS"], key="DISPLAY_SEQUENCE_BLOCK_PAIRS")
+            params["SCRIPT_SEQUENCE_BLOCK_FIRST"] = st.checkbox(
+                "Sequence block only on first entry", value=params["SCRIPT_SEQUENCE_BLOCK_FIRST"], key="DISPLAY_SEQUENCE_BLOCK_FIRST")
+        with col_2:
+            params["SCRIPT_SHOW_INPUT"] = st.checkbox(
+                "Show original input", value=params["SCRIPT_SHOW_INPUT"], key="DISPLAY_SHOW_INPUT")
+            params["SCRIPT_SHOW_PERFORMANCE"] = st.checkbox(
+                "Show performance", value=params["SCRIPT_SHOW_PERFORMANCE"], key="DISPLAY_SHOW_PERFORMANCE")
+            params["SCRIPT_RESULTS_PAGE_SIZE"] = st.number_input(
+                "Details per page", min_value=1, step=5, value=params["SCRIPT_RESULTS_PAGE_SIZE"], key="DISPLAY_PAGE_SIZE")
+        with col_3:
+            output_formats = ('No', 'Flat', 'Hierarchized')
+            output_format = st.radio('Show output in JSON format:', options=output_formats, key="DISPLAY_OUTPUT_FORMAT",
+                                     index=1 if params['SCRIPT_SHOW_OUTPUT_FLAT'] else 2 if params['SCRIPT_SHOW_OUTPUT_HIERARCHIZED'] else 0)
+            params['SCRIPT_SHOW_OUTPUT_FLAT'] = output_format == 'Flat'
+            params['SCRIPT_SHOW_OUTPUT_HIERARCHIZED'] = output_format == 'Hierarchized'
+        col_1, col_2, col_3, col_4 = st.columns(4)
+        for col, pt in zip([col_1, col_2, col_3, col_4], ['LEFT', 'INTERNAL', 'RIGHT', 'SPACER']):
+            with col:
+                key = f'SCRIPT_PRIMER_NAME_ACRONYM_{pt}'
+                params[key] = st.text_input(st_args[key]['label'], value=params[key], key=f'DISPLAY_ACRONYM_{pt}')
+    if tiling_mode and primers.get('TILES'):
+        st.caption(f'{primers["TILES"]} windows of {params["SCRIPT_TILING_WINDOW"]} bases, '
+                   f'{params["SCRIPT_TILING_OVERLAP"]} bases overlap')
+    if walk_mode and 'WALK' in primers:
+        gaps = [gap for gap in primers['GAPS'] if gap['Coverage'] == 'None']
+        st.caption(f'{len(primers["PRIMERS"])} primers at {primers["POSITIONS"]} walk positions, '
+                   f'{sum(gap["Length"] for gap in gaps)} target bases in {len(gaps)} gaps without a read')
+        st.dataframe(primers['WALK'], hide_index=True, use_container_width=True)
+        if len(primers['GAPS']) > 0:
+            with st.expander('Coverage gaps', expanded=len(gaps) > 0):
+                st.dataframe(primers['GAPS'], hide_index=True, use_container_width=True)
+        st.divider()
     if len(primers['PRIMERS']) == 0:
         st.warning("No Primers found", icon="⚠️")
-    for p, primer in enumerate(primers['PRIMERS']):
+
+    def write_sequence_block():
+        with run_timer.span('sequence_block'):
+            st.write(sequence_block(**sequence_block_params), unsafe_allow_html=True)
+
+    # The table covers all entries, the detail widgets and sequence blocks
+    # are only built for the selected rows or the current page.
+    detail_indices = range(len(primers['PRIMERS']))
+    if len(primers['PRIMERS']) > 1:
+        page_size = params["SCRIPT_RESULTS_PAGE_SIZE"]
+        summary = st.dataframe(pair_summary(primers), hide_index=True, use_container_width=True,
+                               on_select='rerun', selection_mode='multi-row', key='DISPLAY_SUMMARY')
+        if len(summary.selection.rows) > 0:
+            detail_indices = sorted(summary.selection.rows)
+            st.caption('Details of the selected rows. Clear the selection to page through all entries.')
+        elif len(primers['PRIMERS']) > page_size:
+            page = st.selectbox('Details:', options=range(-(-len(primers['PRIMERS']) // page_size)),
+                                format_func=lambda i: f'{i * page_size + 1} - '
+                                                      f'{min((i + 1) * page_size, len(primers["PRIMERS"]))} of {len(primers["PRIMERS"])}',
+                                key=f'DISPLAY_PAGE_{page_size}')
+            detail_indices = range(page * page_size, min((page + 1) * page_size, len(primers['PRIMERS'])))
+
+    render_start = time.perf_counter()
+    for p in detail_indices:
+        primer = primers['PRIMERS'][p]
         primer_number = params['SCRIPT_PRIMER_NAME_ACRONYM_SPACER']
         if p > 0:
             primer_number = f'{primer_number}{p+1}{primer_number}'
@@ -1015,14 +1214,47 @@ if st.session_state.pick_primers and params["SEQUENCE_TEMPLATE"] != "":
                 with col:
                     st.write(highlight(f'Included region{n}:', '#83FCFC') + f'&nbsp;&nbsp;Start: {rg}; Length: {le}', unsafe_allow_html=True)
         if p == 0 and 'PAIR' in primer:
-            st.write(sequence_block(**sequence_block_params), unsafe_allow_html=True)
+            write_sequence_block()
         elif p > 0 and not params["SCRIPT_SEQUENCE_BLOCK_FIRST"]:
-            st.write(sequence_block(**sequence_block_params), unsafe_allow_html=True)
+            write_sequence_block()
         if 'PAIR' not in primer and not params["SCRIPT_SEQUENCE_BLOCK_PAIRS"]:
             if p == 0:
-                st.write(sequence_block(**sequence_block_params), unsafe_allow_html=True)
+                write_sequence_block()
             elif p > 0 and not params["SCRIPT_SEQUENCE_BLOCK_FIRST"]:
-                st.write(sequence_block(**sequence_block_params), unsafe_allow_html=True)
+                write_sequence_block()
+        st.divider()
+    run_timer.add('render pairs', time.perf_counter() - render_start)
+    pairs = primer_pairs(primers)
+    specificity_running = False
+    if params["SCRIPT_SPECIFICITY_GENOME"] != "" and len(pairs) > 0:
+        st.subheader('Specificity')
+        try:
+            # The search, and the index build on first use, run as a job in
+            # the process pool, finished searches are shared by key
+            genome = genome_path(params["SCRIPT_SPECIFICITY_GENOME"])
+            specificity_job_args = (genome, pairs, params["SCRIPT_SPECIFICITY_MAX_SIZE"],
+                                    params["SCRIPT_SPECIFICITY_MISMATCHES"])
+            sjob = get_job(submit_job(specificity_job, *specificity_job_args,
+                                      key=job_key('specificity', os.path.getmtime(genome), *specificity_job_args)))
+        except OSError as e:
+            st.warning(f'Specificity check failed: {params["SCRIPT_SPECIFICITY_GENOME"]}: {e.strerror}', icon="⚠️")
+        except ValueError as e:
+            st.warning(f'Specificity check failed: {e}', icon="⚠️")
+        else:
+            if sjob.running:
+                specificity_running = True
+                text = 'Indexing the genome' if sjob.done == 0 else 'Searching the genome index'
+                st.progress(sjob.progress or 0.0, text=f'{text}... {time.time() - sjob.started:.0f} s')
+            elif sjob.status == 'failed' and isinstance(sjob.error, OSError):
+                st.warning(f'Specificity check failed: {params["SCRIPT_SPECIFICITY_GENOME"]}: {sjob.error.strerror}',
+                           icon="⚠️")
+            elif sjob.status == 'failed':
+                st.warning(f'Specificity check failed: {sjob.error}', icon="⚠️")
+            elif sjob.status == 'done':
+                run_timer.add('specificity', sjob.finished - sjob.started)
+                st.dataframe(specificity_rows(pairs, sjob.result), hide_index=True, use_container_width=True)
+                with st.expander('Predicted products', expanded=False):
+                    st.dataframe(product_rows(sjob.result), hide_index=True, use_container_width=True)
         st.divider()
     st.subheader('Statistics')
     for primer_type, explain in primers['EXPLAIN'].items():
@@ -1034,16 +1266,32 @@ if st.session_state.pick_primers and params["SEQUENCE_TEMPLATE"] != "":
             st.write(f"Right Primer: {explain}")
         if primer_type == 'PRIMER_PAIR':
             st.write(f"Primer Pairs: {explain}")
+    if len(primers['PRIMERS']) > 0:
+        st.divider()
+        export_download(primer_rows(params["SCRIPT_SEQUENCE_ID"], primers), params["SCRIPT_SEQUENCE_ID"] or 'primer3')
+    cache_stats = design_cache.stats()
+    st.caption(f"Design cache: {cache_stats['hits'] + cache_stats['disk_hits']} hits, {cache_stats['misses']} misses")
     st.divider()
     if params["SCRIPT_SHOW_INPUT"]:
         st.subheader('Original input')
         ml = None
         if params["PRIMER_MISPRIMING_LIBRARY"] != 'NONE':
             ml = params["PRIMER_MISPRIMING_LIBRARY"]
+        echo_seq_args = dict(seq_args)
+        if params["SCRIPT_SEQUENCE_ID"] != "":
+            echo_seq_args = {'SEQUENCE_ID': params["SCRIPT_SEQUENCE_ID"], **seq_args}
         with st.expander('For `primer3-py`', expanded=False):
-            st.json({'seq_args': seq_args, 'global_args': output_global_args, 'misprime_lib': ml})
+            st.json({'seq_args': echo_seq_args, 'global_args': output_global_args, 'misprime_lib': ml})
+        boulder_input = {**echo_seq_args, **output_global_args}
+        if ml is not None:
+            boulder_input['PRIMER_MISPRIMING_LIBRARY'] = ml
+        if mishyb_lib_name is not None:
+            boulder_input['PRIMER_INTERNAL_MISHYB_LIBRARY'] = mishyb_lib_name
         with st.expander('For `primer3`', expanded=False):
-            st.code('\n'.join(p3_args), language=None)
+            st.code(record_text(boulder_input), language=None)
+            if not tiling_mode and not walk_mode:
+                st.download_button('Download Boulder-IO with results', data=record_text(boulder_input, primer3_results),
+                                   file_name=f'{params["SCRIPT_SEQUENCE_ID"] or "primer3"}.boulder', mime='text/plain')
     if params["SCRIPT_SHOW_OUTPUT_FLAT"]:
         st.subheader('Original output')
         with st.expander('JSON Flat', expanded=False):
@@ -1051,4 +1299,18 @@ if st.session_state.pick_primers and params["SEQUENCE_TEMPLATE"] != "":
     if params["SCRIPT_SHOW_OUTPUT_HIERARCHIZED"]:
         st.subheader('Original output')
         with st.expander('JSON Hierarchized', expanded=False):
-            st.json(primers)
+            st.json(as_dict(primers))
+    if params["SCRIPT_SHOW_PERFORMANCE"]:
+        st.subheader('Performance')
+        with st.expander('Stage timings', expanded=False):
+            st.dataframe(run_timer.rows(), hide_index=True, use_container_width=True)
+            if 'job_ms' in run_timer.info:
+                st.caption(f"The design job ran for {run_timer.info['job_ms']:.1f} ms in the background. "
+                           "Rendering pairs includes the sequence_block calls.")
+    if job_status == 'done':
+        record_history([(params["SCRIPT_SEQUENCE_ID"], seq_args, output_global_args, misprime_lib_name,
+                         mishyb_lib_name, primers, run_timer.record())])
+    write_timing_log(run_timer)
+    if specificity_running:
+        time.sleep(0.5)
+        st.rerun()
@@ -0,0 +1,47 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from primer3_st_render import sequence_block
+
+
+def block_params(length):
+    random.seed(length)
+    seq = ''.join(random.choice('ACGT') for _ in range(length))
+    return {'seq': seq,
+            'LEFT_POSITION': length // 4, 'LEFT_LENGTH': 20,
+            'RIGHT_POSITION': length * 3 // 4, 'RIGHT_LENGTH': 20,
+            'INTERNAL_POSITION': length // 2, 'INTERNAL_LENGTH': 25,
+            'EXCLUDED_REGION': [[length // 8, 30], [length * 5 // 8, 12]],
+            'TARGET': [[length // 2 - 5, 10]],
+            'INCLUDED_REGION': [[10, length - 20]]}
+
+
+if __name__ == '__main__':
+    previous = None
+    for length in [1000, 10000, 50000, 100000, 200000]:
+        params = block_params(length)
+        seconds = min(timeit.repeat(lambda: sequence_block(**params), number=1, repeat=5))
+        ratio = '' if previous is None else f'  x{seconds / previous[1]:.1f} time for x{length / previous[0]:.0f} bases'
+        print(f'{length:>8} bases  {seconds * 1000:9.2f} ms  {seconds / length * 1e9:8.1f} ns/base{ratio}')
+        previous = (length, seconds)
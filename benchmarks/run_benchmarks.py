@@ -0,0 +1,209 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import primer3
+from primer3_st_core import build_args, design, hierarchize, ranges_to_list
+from primer3_st_libs import BUILTIN_LIBRARIES, load_library
+from primer3_st_render import sequence_block
+from bench_sequence_block import block_params
+
+SIZES = [1000, 10000, 100000, 1000000]
+HISTORY_FILE = os.path.join(BENCH_DIR, 'history.json')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def template(length):
+    random.seed(length)
+    return ''.join(random.choice('ACGT') for _ in range(length))
+
+
+def region_string(length, step=100):
+    return ' '.join(f'{start},20' for start in range(1, length - 20, step))
+
+
+def template_params(length):
+    return {'SEQUENCE_ID': f'bench_{length}',
+            'SEQUENCE_TEMPLATE': template(length),
+            'SCRIPT_EXCLUDED_REGION': f'{length // 8},30',
+            'SCRIPT_TARGET': f'{length // 2 - 5},10',
+            'SCRIPT_INCLUDED_REGION': f'10,{length - 20}'}
+
+
+def primer3_results(pairs):
+    seq_args, global_args, _, _, _ = build_args(template_params(1000))
+    results = design(seq_args, global_args)
+    output = {}
+    for k, v in results.items():
+        tmp = k.split('_', 3)
+        if len(tmp) < 3 or not tmp[2].isdigit():
+            output[k] = v
+        elif tmp[2] == '0':
+            for p in range(pairs):
+                output['_'.join(tmp[:2] + [str(p)] + tmp[3:])] = v
+    return output
+
+
+def setup_hierarchize(length):
+    results = primer3_results(max(1, length // 1000))
+    return lambda: hierarchize(results)
+
+
+def setup_sequence_block(length):
+    params = block_params(length)
+    return lambda: sequence_block(**params)
+
+
+def setup_ranges_to_list(length):
+    ranges = region_string(length)
+    return lambda: ranges_to_list(ranges)
+
+
+def setup_build_args(length):
+    params = template_params(length)
+    params['SCRIPT_EXCLUDED_REGION'] = region_string(length, 1000)
+    return lambda: build_args(params)
+
+
+def setup_design(library):
+    def setup(length):
+        seq_args, global_args, _, _, _ = build_args(template_params(length))
+        load_library(library)
+        return lambda: design(seq_args, global_args, library)
+    return setup
+
+
+cases = {
+    'hierarchize': setup_hierarchize,
+    'sequence_block': setup_sequence_block,
+    'ranges_to_list': setup_ranges_to_list,
+    'build_args': setup_build_args,
+    'design_primers[NONE]': setup_design(None),
+}
+for library in BUILTIN_LIBRARIES:
+    cases[f'design_primers[{library}]'] = setup_design(library)
+
+
+def measure(fn, repeat):
+    timer = timeit.Timer(fn)
+    number, seconds = timer.autorange()
+    samples = [seconds / number] + [t / number for t in timer.repeat(number=number, repeat=repeat - 1)]
+    return {'min': min(samples), 'mean': sum(samples) / len(samples), 'number': number, 'repeat': len(samples)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(patterns, sizes, repeat):
+    results = {}
+    for name, setup in cases.items():
+        if patterns and not any(name == p or fnmatch.fnmatchcase(name, p) for p in patterns):
+            continue
+        for length in sizes:
+            fn = setup(length)
+            result = measure(fn, repeat)
+            results[f'{name}/{length}'] = result
+            print(f'{name:<34} {length:>8} bases  {result["min"] * 1000:11.3f} ms  '
+                  f'{result["min"] / length * 1e9:9.1f} ns/base', flush=True)
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'primer3': getattr(primer3, '__version__', None),
+            'machine': platform.platform(),
+            'results': results}
+
+
+def load_json(path, default):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return default
+
+
+def save_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(data, handle, indent=1)
+    os.replace(tmp_path, path)
+
+
+def compare(run, baseline, threshold):
+    regressions = []
+    for key, result in run['results'].items():
+        if key not in baseline['results']:
+            continue
+        ratio = result['min'] / baseline['results'][key]['min']
+        if ratio > 1 + threshold:
+            regressions.append((key, ratio))
+            print(f'REGRESSION {key}: x{ratio:.2f} ({baseline["results"][key]["min"] * 1000:.3f} ms -> '
+                  f'{result["min"] * 1000:.3f} ms)')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Primer3-Streamlit hot paths.')
+    parser.add_argument('-k', '--filter', action='append', default=[],
+                        help='Only run cases matching this glob (repeatable), e.g. "design_primers*"')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=SIZES, help='Template lengths in bases')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Timing samples per case')
+    parser.add_argument('--history', default=HISTORY_FILE, help='JSON file the run is appended to')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Stored baseline to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Flag cases slower than the baseline by more than this fraction')
+    parser.add_argument('--list', action='store_true', help='List the benchmark cases and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(cases))
+        return 0
+    result = run(args.filter, args.sizes, max(1, args.repeat))
+    history = load_json(args.history, [])
+    history.append(result)
+    save_json(args.history, history)
+    if args.save_baseline:
+        save_json(args.baseline, result)
+        return 0
+    baseline = load_json(args.baseline, None)
+    if baseline is None:
+        return 0
+    regressions = compare(result, baseline, args.threshold)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
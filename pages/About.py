@@ -38,7 +38,7 @@ st.title("Primer3 - About")
 
 st.header("Primer3-Streamlit")
 
-st.markdown("**Primer3-Streamlit** is a web app interface for Primer3 that relies on [primer3-py](https://github.com/libnano/primer3-py) and [Streamlit](https://github.com/streamlit/streamlit), and is modeled after [Primer3Plus](https://github.com/primer3-org/primer3plus).\n\nThe immediate goal is to achieve feature parity with Primer3Plus 1.1.0. Features introduced on later versions will be implemented in the near future.\n\nPreset loading, region symbols in sequence, FASTA support and upload/download features are not implemented yet. Task loading is partially implemented. Otherwise, this web app is fully functional for primer design.")
+st.markdown("**Primer3-Streamlit** is a web app interface for Primer3 that relies on [primer3-py](https://github.com/libnano/primer3-py) and [Streamlit](https://github.com/streamlit/streamlit), and is modeled after [Primer3Plus](https://github.com/primer3-org/primer3plus).\n\nThe immediate goal is to achieve feature parity with Primer3Plus 1.1.0. Features introduced on later versions will be implemented in the near future.\n\nRegion symbols in sequence are not implemented yet. Settings presets can be loaded, and settings imported and exported as JSON or Primer3 settings files. Sequences can be uploaded, multi-FASTA files to pick primers for every record in one run, and results downloaded as CSV, TSV, Parquet, Arrow or Boulder-IO. Task loading is partially implemented. Otherwise, this web app is fully functional for primer design.")
 
 st.subheader("Copying or Reusing")
 
@@ -0,0 +1,140 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import datetime
+import sys
+sys.path.append('..')
+
+import streamlit as st
+from primer3_st_core import pair_summary
+from primer3_st_export import export_bytes, export_formats, primer_rows
+from primer3_st_history import history, owner_id
+from primer3_st_render import sequence_block
+
+
+def show_template_runs(template):
+    st.session_state.history_template = template
+
+
+def delete_run(run_id):
+    history.delete(run_id, st.session_state.history_owner)
+    # a new table key drops the selection of the deleted run
+    st.session_state.history_version += 1
+
+
+st.set_page_config(page_title="Primer3 - History", page_icon=":dna:",
+                   layout="centered", initial_sidebar_state="collapsed")
+
+st.markdown("""
+        <style>
+               .block-container {
+                    padding-top: 1rem;
+                    padding-bottom: 0rem;
+                }
+        </style>
+        """, unsafe_allow_html=True)
+
+st.title("Primer3 - History")
+
+if history is None:
+    st.info('The run history is switched off, PRIMER3_ST_HISTORY is set to an empty path.')
+    st.stop()
+if "history_owner" not in st.session_state:
+    user = getattr(st, "user", {})
+    st.session_state.history_owner = owner_id(user.get("email") if user.get("is_logged_in") else None)
+if "history_template" not in st.session_state:
+    st.session_state.history_template = None
+    st.session_state.history_version = 0
+
+col_1, col_2 = st.columns(2)
+with col_1:
+    sequence_id = st.text_input('Sequence ID:', key='HISTORY_SEQUENCE_ID', help='Only runs of this sequence ID')
+with col_2:
+    since = st.date_input('Runs since:', value=None, key='HISTORY_SINCE')
+if st.session_state.history_template is not None:
+    col_1, col_2 = st.columns([3, 1])
+    with col_1:
+        st.caption(f'Runs on the template {st.session_state.history_template[:12]}')
+    with col_2:
+        st.button('All templates', on_click=show_template_runs, args=(None,), type="secondary")
+runs = history.runs(st.session_state.history_owner, sequence_id=sequence_id or None,
+                    template=st.session_state.history_template,
+                    since=datetime.datetime.combine(since, datetime.time()).timestamp() if since else None)
+if len(runs) == 0:
+    st.info('No saved runs. Design runs on the Primer3 page are listed here only for you, from any session '
+            'when signed in, otherwise only in this session.')
+    st.stop()
+rows = [{'Run': run['id'],
+         'Date': datetime.datetime.fromtimestamp(run['created']).strftime('%Y-%m-%d %H:%M'),
+         'Task': run['task'],
+         'Sequence ID': run['sequence_id'],
+         'Length': run['template_length'],
+         'Entries': run['entries'],
+         'ms': run['total_ms']} for run in runs]
+selection = st.dataframe(rows, hide_index=True, use_container_width=True, on_select='rerun',
+                         selection_mode='single-row', key=f'HISTORY_RUNS_{st.session_state.history_version}')
+if len(selection.selection.rows) == 0:
+    st.caption('Select a run to show its results.')
+    st.stop()
+
+run = history.load(rows[selection.selection.rows[0]]['Run'], st.session_state.history_owner)
+primers = run['results']
+seq_args = run['seq_args']
+st.divider()
+st.subheader(f"Run {run['id']}: {run['sequence_id'] or 'no sequence ID'}")
+st.caption(f"{run['task']}, {run['template_length']} bases, {run['entries']} entries. "
+           "Loaded from the history without running Primer3 again.")
+if 'WARNING' in primers:
+    st.warning(primers['WARNING'], icon="⚠️")
+if len(primers['PRIMERS']) == 0:
+    st.warning("No Primers found", icon="⚠️")
+else:
+    st.dataframe(pair_summary(primers), hide_index=True, use_container_width=True)
+    entry = st.selectbox('Show the sequence block of entry:', options=range(len(primers['PRIMERS'])),
+                         format_func=lambda p: str(p + 1), key=f"HISTORY_ENTRY_{run['id']}")
+    sequence_block_params = {'seq': seq_args.get('SEQUENCE_TEMPLATE', '')}
+    for region in ['SEQUENCE_EXCLUDED_REGION', 'SEQUENCE_TARGET', 'SEQUENCE_INCLUDED_REGION']:
+        if region in seq_args:
+            sequence_block_params[region.replace('SEQUENCE_', '')] = seq_args[region]
+    for pt in ['LEFT', 'INTERNAL', 'RIGHT']:
+        if pt in primers['PRIMERS'][entry]:
+            sequence_block_params[f'{pt}_POSITION'] = primers['PRIMERS'][entry][pt]['POSITION']
+            sequence_block_params[f'{pt}_LENGTH'] = primers['PRIMERS'][entry][pt]['LENGTH']
+    st.write(sequence_block(**sequence_block_params), unsafe_allow_html=True)
+    col_1, col_2 = st.columns([1, 3])
+    with col_1:
+        export_format = st.selectbox('Export format', options=list(export_formats), key='HISTORY_EXPORT_FORMAT')
+    extension, mime = export_formats[export_format]
+    with col_2:
+        st.caption('')
+        st.download_button('Download primers', data=export_bytes(primer_rows(run['sequence_id'], primers), export_format),
+                           file_name=f"{run['sequence_id'] or 'primer3'}.{extension}", mime=mime)
+for primer_type, explain in primers['EXPLAIN'].items():
+    st.write(f"{primer_type.replace('PRIMER_', '').capitalize()}: {explain}")
+with st.expander('Input', expanded=False):
+    st.json({'seq_args': seq_args, 'global_args': run['global_args'], 'misprime_lib': run['misprime_lib'],
+             'mishyb_lib': run['mishyb_lib']})
+if run['timings'] is not None:
+    with st.expander('Stage timings of the original run', expanded=False):
+        st.dataframe([{'Stage': stage, 'Calls': timing['calls'], 'ms': timing['ms']}
+                      for stage, timing in run['timings']['stages'].items()], hide_index=True, use_container_width=True)
+col_1, col_2 = st.columns(2)
+with col_1:
+    st.button('Runs on the same template', on_click=show_template_runs, args=(run['template_hash'],), type="secondary")
+with col_2:
+    st.button('Delete run', on_click=delete_run, args=(run['id'],), type="secondary")
@@ -192,6 +192,10 @@ st_default_values = {"P3_FILE_FLAG": {"value": 0},
                      "SCRIPT_EXCLUDED_REGION": {"value": ""},
                      "SCRIPT_FIX_PRIMER_END": {},
                      "SCRIPT_INCLUDED_REGION": {"value": ""},
+                     "SCRIPT_LIBRARY_FILE": {},
+                     "SCRIPT_MULTIPLEX_MIN_DG": {"value": -9.0},
+                     "SCRIPT_OLIGO_FILE": {},
+                     "SCRIPT_OLIGO_LIST": {"value": ""},
                      "SCRIPT_PRIMER_LIBERAL_BASE": {"value": True},
                      "SCRIPT_PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS": {"value": True},
                      "SCRIPT_PRIMER_LOWERCASE_MASKING": {"value": False},
@@ -201,6 +205,7 @@ st_default_values = {"P3_FILE_FLAG": {"value": 0},
                      "SCRIPT_PRIMER_NAME_ACRONYM_SPACER": {"value": "_"},
                      "SCRIPT_PRIMER_SALT_CORRECTIONS": {"value": 0},
                      "SCRIPT_PRIMER_TM_FORMULA": {"value": 0},
+                     "SCRIPT_RESULTS_PAGE_SIZE": {"value": 5},
                      "SCRIPT_SEQUENCE_BLOCK_FIRST": {"value": True},
                      "SCRIPT_SEQUENCE_BLOCK_PAIRS": {"value": True},
                      "SCRIPT_SEQUENCE_FILE": {},
@@ -208,13 +213,26 @@ st_default_values = {"P3_FILE_FLAG": {"value": 0},
                      "SCRIPT_SEQUENCING_ACCURACY": {"value": 20},
                      "SCRIPT_SEQUENCING_INTERVAL": {"value": 250},
                      "SCRIPT_SEQUENCING_LEAD": {"value": 50},
+                     "SCRIPT_SEQUENCING_READ_LENGTH": {"value": 700},
                      "SCRIPT_SEQUENCING_REVERSE": {"value": False},
                      "SCRIPT_SEQUENCING_SPACING": {"value": 500},
                      "SCRIPT_SETTINGS_FILE": {},
                      "SCRIPT_SETTINGS_PRESET": {"value": "Default"},
                      "SCRIPT_SHOW_INPUT": {"value": False},
+                     "SCRIPT_SHOW_PERFORMANCE": {"value": False},
+                     "SCRIPT_SPECIFICITY_GENOME": {"value": ""},
+                     "SCRIPT_SPECIFICITY_MAX_SIZE": {"value": 3000},
+                     "SCRIPT_SPECIFICITY_MISMATCHES": {"value": 2},
+                     "SCRIPT_SWEEP": {"value": False},
+                     "SCRIPT_SWEEP_KEYS": {"default": []},
                      "SCRIPT_TASK": {"value": "Detection"},
                      "SCRIPT_TARGET": {"value": ""},
+                     "SCRIPT_TEMPLATE_FLANK": {"value": 0},
+                     "SCRIPT_TEMPLATE_REGION": {"value": ""},
+                     "SCRIPT_TEMPLATE_SOURCE": {"value": ""},
+                     "SCRIPT_TILING": {"value": False},
+                     "SCRIPT_TILING_OVERLAP": {"value": 1000},
+                     "SCRIPT_TILING_WINDOW": {"value": 5000},
                      "SEQUENCE_INTERNAL_OLIGO": {"value": ""},
                      "SEQUENCE_PRIMER": {"value": ""},
                      "SEQUENCE_PRIMER_REVCOMP": {"value": ""},
@@ -385,6 +403,10 @@ st_args = {
            "SCRIPT_EXCLUDED_REGION": {'label': '[Excluded Regions:](/Help#EXCLUDED_REGION)', 'key': 'SCRIPT_EXCLUDED_REGION', 'help': 'Primer oligos may not overlap any region specified in this tag. The associated value must be a space-separated list of start,length.\nE.g. 401,7 68,3 forbids selection of primers in the 7 bases starting at 401 and the 3 bases at 68.\n Or mark the source sequence with < and >:\n e.g. ...ATCT&lt;CCCC&gt;TCAT.. forbids primers in the central CCCC.'},
            "SCRIPT_FIX_PRIMER_END": {'help': 'Select which end of the primer is fixed and which end can be extended or shortened by Primer3 to find optimal primers.'},
            "SCRIPT_INCLUDED_REGION": {'label': '[Included Region:](/Help#INCLUDED_REGION)', 'key': 'SCRIPT_INCLUDED_REGION', 'help': 'A sub-region of the given sequence in which to pick primers. For example, often the first dozen or so bases of a sequence are vector, and should be excluded from consideration.\nThe value for this parameter has the form start,length.\nE.g. 20,400: only pick primers in the 400 base region starting at position 20.\n Or use { and } in the source sequence to mark the beginning and end of the included\n region: e.g. in ATC{TTC...TCT}AT the included region is TTC...TCT.'},
+           "SCRIPT_LIBRARY_FILE": {'label': 'or upload a library:', 'key': 'SCRIPT_LIBRARY_FILE', 'help': 'FASTA file of repeats, vectors or adapters. It is compiled once and can then be chosen as mispriming or mishybridization library.'},
+           "SCRIPT_MULTIPLEX_MIN_DG": {'label': 'Minimum cross-dimer dG (kcal/mol)', 'max_value': 0.0, 'step': 0.5, 'key': 'SCRIPT_MULTIPLEX_MIN_DG', 'help': 'Primers of different targets in a multiplex panel should not form heterodimers more stable than this.'},
+           "SCRIPT_OLIGO_FILE": {'label': 'or upload a list of oligos:', 'key': 'SCRIPT_OLIGO_FILE', 'help': 'FASTA, or one oligo per line as "sequence" or "name sequence". All oligos are checked with the settings below.'},
+           "SCRIPT_OLIGO_LIST": {'label': 'or paste a list of oligos:', 'key': 'SCRIPT_OLIGO_LIST', 'height': 120, 'help': 'One oligo per line as "sequence" or "name sequence", separated by spaces, commas or tabs.'},
            "SCRIPT_PRIMER_LIBERAL_BASE": {'label': '[Liberal Base](/Help#PRIMER_LIBERAL_BASE)', 'key': 'SCRIPT_PRIMER_LIBERAL_BASE'},
            "SCRIPT_PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS": {'label': 'Do not treat ambiguity codes in libraries as consensus', 'key': 'SCRIPT_PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS'},
            "SCRIPT_PRIMER_LOWERCASE_MASKING": {'label': '[Use Lowercase Masking](/Help#PRIMER_LOWERCASE_MASKING)', 'key': 'SCRIPT_PRIMER_LOWERCASE_MASKING'},
@@ -394,6 +416,7 @@ st_args = {
            "SCRIPT_PRIMER_NAME_ACRONYM_SPACER": {'label': '[Primer Name Spacer:](/Help#PRIMER_NAME_ACRONYM_SPACER)', 'key': 'SCRIPT_PRIMER_NAME_ACRONYM_SPACER'},
            "SCRIPT_PRIMER_SALT_CORRECTIONS": {'label': '[Salt correction formula:](/Help#PRIMER_SALT_CORRECTIONS)', 'options': ('Schildkraut and Lifson 1965', 'SantaLucia 1998', 'Owczarzy et. 2004'), 'key': 'SCRIPT_PRIMER_SALT_CORRECTIONS'},
            "SCRIPT_PRIMER_TM_FORMULA": {'label': '[Table of thermodynamic parameters:](/Help#PRIMER_TM_SANTALUCIA)', 'options': ('Breslauer et al. 1986', 'SantaLucia 1998'), 'key': 'SCRIPT_PRIMER_TM_FORMULA'},
+           "SCRIPT_RESULTS_PAGE_SIZE": {'label': 'Details per page', 'min_value': 1, 'step': 5, 'key': 'SCRIPT_RESULTS_PAGE_SIZE', 'help': 'The results start with a table of all entries, details are shown for one page of entries or for the rows selected in the table'},
            "SCRIPT_SEQUENCE_BLOCK_FIRST": {'label': 'Only on first entry', 'key': 'SCRIPT_SEQUENCE_BLOCK_FIRST'},
            "SCRIPT_SEQUENCE_BLOCK_PAIRS": {'label': 'Only on pair design', 'key': 'SCRIPT_SEQUENCE_BLOCK_PAIRS'},
            "SCRIPT_SEQUENCE_FILE": {'label': 'Paste source sequence below, or upload sequence file:', 'key': 'SCRIPT_SEQUENCE_FILE'},
@@ -401,13 +424,27 @@ st_args = {
            "SCRIPT_SEQUENCING_ACCURACY": {'label': '[Accuracy](/Help#SCRIPT_SEQUENCING_ACCURACY)', 'key': 'SCRIPT_SEQUENCING_ACCURACY', 'help': 'Space in which Primer3 picks the optimal primer'},
            "SCRIPT_SEQUENCING_INTERVAL": {'label': '[Interval](/Help#SCRIPT_SEQUENCING_INTERVAL)', 'key': 'SCRIPT_SEQUENCING_INTERVAL', 'help': 'Space between primers on the forward and the reverse strand'},
            "SCRIPT_SEQUENCING_LEAD": {'label': '[Lead](/Help#SCRIPT_SEQUENCING_LEAD)', 'key': 'SCRIPT_SEQUENCING_LEAD', 'help': 'Space between primer binding site and the start of readable sequencing'},
+           "SCRIPT_SEQUENCING_READ_LENGTH": {'label': 'Read length', 'min_value': 1, 'step': 50, 'key': 'SCRIPT_SEQUENCING_READ_LENGTH', 'help': 'Readable bases of one sequencing run, used to report the parts of the target that no read covers'},
            "SCRIPT_SEQUENCING_REVERSE": {'label': '[Pick Reverse Primers](/Help#SCRIPT_SEQUENCING_REVERSE)', 'key': 'SCRIPT_SEQUENCING_REVERSE', 'help': 'Pick primers on the reverse DNA strand as well'},
            "SCRIPT_SEQUENCING_SPACING": {'label': '[Spacing](/Help#SCRIPT_SEQUENCING_SPACING)', 'key': 'SCRIPT_SEQUENCING_SPACING', 'help': 'Space between the primers on one DNA strand'},
            "SCRIPT_SETTINGS_FILE": {'label': '_', 'label_visibility': 'hidden', 'key': 'SCRIPT_SETTINGS_FILE'},
-           "SCRIPT_SETTINGS_PRESET": {'label': 'Settings preset:', 'options': ('Default', 'qPCR', 'Probe'), 'key': 'SCRIPT_SETTINGS_PRESET'},
+           "SCRIPT_SETTINGS_PRESET": {'label': 'Settings preset:', 'options': ('Default', 'qPCR', 'Probe', 'Long range', 'Bisulfite'), 'key': 'SCRIPT_SETTINGS_PRESET'},
            "SCRIPT_SHOW_INPUT": {'label': 'Show original input in JSON format', 'key': 'SCRIPT_SHOW_INPUT'},
+           "SCRIPT_SHOW_PERFORMANCE": {'label': 'Show performance', 'key': 'SCRIPT_SHOW_PERFORMANCE',
+                                       'help': 'Time spent in each stage of the run. Set PRIMER3_ST_TIMING_LOG to also append the timings to a JSONL file.'},
+           "SCRIPT_SPECIFICITY_GENOME": {'label': 'Genome or transcriptome FASTA', 'key': 'SCRIPT_SPECIFICITY_GENOME', 'help': 'Path of a FASTA file, or of its .p3kx index, in the genome directory of the server (PRIMER3_ST_GENOME_DIR). The index is built on first use and rebuilt when the file changes.'},
+           "SCRIPT_SPECIFICITY_MAX_SIZE": {'label': 'Maximum product size', 'min_value': 50, 'step': 500, 'key': 'SCRIPT_SPECIFICITY_MAX_SIZE', 'help': 'Products up to this size are reported.'},
+           "SCRIPT_SPECIFICITY_MISMATCHES": {'label': 'Maximum mismatches', 'min_value': 0, 'max_value': 10, 'key': 'SCRIPT_SPECIFICITY_MISMATCHES', 'help': "Mismatches allowed per primer outside the 3' end, which has to match over the index k-mer length (12 bases)."},
+           "SCRIPT_SWEEP": {'label': 'Sweep parameters', 'key': 'SCRIPT_SWEEP', 'help': 'Design every combination of the values below in parallel and compare the best penalty and number of pairs. Combinations giving identical Primer3 arguments are designed once.'},
+           "SCRIPT_SWEEP_KEYS": {'label': 'Parameters to sweep', 'key': 'SCRIPT_SWEEP_KEYS', 'max_selections': 4},
            "SCRIPT_TARGET": {'label': '[Targets:](/Help#TARGET)', 'key': 'SCRIPT_TARGET', 'help': 'If one or more Targets is specified then a legal primer pair must flank at least one of them. The value should be a space-separated list of start,length pairs.\nE.g. 50,2 requires primers to surround the 2 bases at positions 50 and 51.\n Or mark the source sequence with [ and ]: e.g. ...ATCT[CCCC]TCAT..\n means that primers must flank the central CCCC.'},
            "SCRIPT_TASK": {'label': '[Task:](/Help#SCRIPT_TASK)', 'options': ('Detection', 'Cloning', 'Sequencing', 'Primer_List', 'Primer_Check'), 'key': 'SCRIPT_TASK'},
+           "SCRIPT_TEMPLATE_FLANK": {'label': 'Flanks', 'min_value': 0, 'step': 100, 'key': 'SCRIPT_TEMPLATE_FLANK', 'help': 'Bases read on both sides of the region. With flanks and without targets, the region becomes the target.'},
+           "SCRIPT_TEMPLATE_REGION": {'label': 'Template region', 'key': 'SCRIPT_TEMPLATE_REGION', 'help': 'name:start-end (1-based, inclusive) or a record name. Used when the sequence box is empty, only this part of the file is read.'},
+           "SCRIPT_TEMPLATE_SOURCE": {'label': 'Indexed template file', 'key': 'SCRIPT_TEMPLATE_SOURCE', 'help': 'Path of a FASTA or 2bit file in the template directory of the server (PRIMER3_ST_TEMPLATE_DIR). The .fai index of a FASTA file is built on first use and rebuilt when the file changes.'},
+           "SCRIPT_TILING": {'label': 'Tile long templates', 'key': 'SCRIPT_TILING', 'help': 'Split templates longer than the window into overlapping windows that are designed in parallel. Pairs found in several windows are reported once.'},
+           "SCRIPT_TILING_OVERLAP": {'label': 'Window overlap', 'min_value': 0, 'step': 100, 'key': 'SCRIPT_TILING_OVERLAP', 'help': 'Should be larger than the maximum product size, otherwise products spanning two windows are missed.'},
+           "SCRIPT_TILING_WINDOW": {'label': 'Window size', 'min_value': 100, 'step': 1000, 'key': 'SCRIPT_TILING_WINDOW'},
            "SEQUENCE_INTERNAL_OLIGO": {'label': 'or use oligo below:', 'key': 'SEQUENCE_INTERNAL_OLIGO'},
            "SEQUENCE_PRIMER": {'label': 'or use left primer below:', 'key': 'SEQUENCE_PRIMER'},
            "SEQUENCE_PRIMER_REVCOMP": {'label': 'or use right primer below', 'help': "5'->3' on opposite strand", 'key': 'SEQUENCE_PRIMER_REVCOMP'},
@@ -0,0 +1,142 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from primer3_st_cache import design_cache, design_key
+from primer3_st_core import design
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def read_fasta(handle):
+    if isinstance(handle, (bytes, str)):
+        handle = io.StringIO(handle.decode() if isinstance(handle, bytes) else handle)
+    seq_id = None
+    seq = []
+    for line in handle:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
+        if line == '' or line.startswith(';'):
+            continue
+        if line.startswith('>'):
+            if seq_id is not None:
+                yield seq_id, ''.join(seq)
+            seq_id = line[1:].strip().split(' ')[0]
+            seq = []
+            continue
+        if seq_id is None:
+            seq_id = ''
+        seq.append(''.join(char for char in line if not char.isdigit() and not char.isspace()))
+    if seq_id is not None:
+        yield seq_id, ''.join(seq)
+
+
+def get_executor(max_workers=None):
+    global _executor, _executor_workers
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    with _executor_lock:
+        # A worker that died (a primer3 assertion aborts the process) breaks
+        # the whole pool, the next caller gets a new one
+        if _executor is None or _executor_workers != max_workers or _executor._broken:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            # spawn keeps the workers free of the Streamlit server threads
+            _executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = max_workers
+        return _executor
+
+
+def design_jobs(jobs, max_workers=None, cache=design_cache):
+    get_executor(max_workers)
+    pending = {}
+    # Designs that were running when a worker died are tried once more on a
+    # new pool, one at a time so that the one crashing again gets the error
+    # and not the designs next to it
+    retries = []
+    jobs = iter(jobs)
+    exhausted = False
+    try:
+        while True:
+            while len(pending) < _executor_workers * 2:
+                if retries and not any(retried for _, _, retried in pending.values()):
+                    job, retried = retries.pop(0), True
+                elif not exhausted:
+                    try:
+                        job, retried = next(jobs), False
+                    except StopIteration:
+                        exhausted = True
+                        continue
+                else:
+                    break
+                job_id, seq_args, global_args, misprime_lib_name, mishyb_lib_name = job
+                key = design_key(seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+                primer3_results = cache.get(key)
+                if primer3_results is not None:
+                    yield job_id, primer3_results, None
+                    continue
+                future = get_executor(max_workers).submit(design, seq_args, global_args, misprime_lib_name,
+                                                          mishyb_lib_name)
+                pending[future] = (job, key, retried)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, key, retried = pending.pop(future)
+                job_id = job[0]
+                try:
+                    primer3_results = future.result()
+                except BrokenProcessPool as e:
+                    if retried:
+                        yield job_id, None, e
+                    else:
+                        retries.append(job)
+                    continue
+                except Exception as e:
+                    yield job_id, None, e
+                    continue
+                cache.put(key, primer3_results)
+                yield job_id, primer3_results, None
+    finally:
+        # an abandoned or cancelled run leaves no queued work behind
+        for future in pending:
+            future.cancel()
+
+
+def design_batch(records, seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None, max_workers=None,
+                 cache=design_cache):
+    def jobs():
+        for record in records:
+            seq_id, seq = record[:2]
+            record_args = dict(seq_args)
+            if len(record) > 2:
+                record_args.update(record[2])
+            record_args['SEQUENCE_ID'] = seq_id
+            record_args['SEQUENCE_TEMPLATE'] = seq
+            yield seq_id, record_args, global_args, misprime_lib_name, mishyb_lib_name
+
+    return design_jobs(jobs(), max_workers, cache)
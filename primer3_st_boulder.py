@@ -0,0 +1,137 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from primer3_st_core import ranges_to_list
+
+interval_tags = ['SEQUENCE_EXCLUDED_REGION', 'SEQUENCE_INCLUDED_REGION', 'SEQUENCE_TARGET',
+                 'SEQUENCE_INTERNAL_EXCLUDED_REGION', 'PRIMER_PRODUCT_SIZE_RANGE']
+string_tags = ['SEQUENCE_ID', 'SEQUENCE_TEMPLATE', 'SEQUENCE_PRIMER', 'SEQUENCE_INTERNAL_OLIGO',
+               'SEQUENCE_PRIMER_REVCOMP', 'PRIMER_TASK']
+library_tags = ['PRIMER_MISPRIMING_LIBRARY', 'PRIMER_INTERNAL_MISHYB_LIBRARY']
+settings_header = 'Primer3 File - http://primer3.org'
+
+
+def read_records(handle):
+    record = {}
+    for line in handle:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.rstrip('\r\n')
+        if line == '=':
+            yield record
+            record = {}
+        elif '=' in line:
+            key, value = line.split('=', 1)
+            record[key] = value
+    if len(record) > 0:
+        yield record
+
+
+def parse_value(key, value):
+    if key in interval_tags:
+        return ranges_to_list(value)
+    if key in string_tags or key in library_tags:
+        return value
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def format_value(key, value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float):
+        return f'{value:.6f}'.rstrip('0').rstrip('.')
+    if isinstance(value, (list, tuple)):
+        if len(value) > 0 and isinstance(value[0], (list, tuple)):
+            separator = '-' if key == 'PRIMER_PRODUCT_SIZE_RANGE' else ','
+            return ' '.join(separator.join(str(x) for x in pair) for pair in value)
+        if key.endswith('LIBRARY_MISPRIMING') or key.endswith('LIBRARY_MISHYB'):
+            return f'{value[0]:.2f}, {value[1]}'
+        return ','.join(str(x) for x in value)
+    return str(value)
+
+
+def split_record(record, global_args=None, misprime_lib_name=None, mishyb_lib_name=None):
+    # Like primer3_core, PRIMER_ tags keep their value for the following
+    # records while SEQUENCE_ tags only apply to the record they are in.
+    seq_args = {}
+    global_args = dict(global_args or {})
+    for key, value in record.items():
+        if key == 'PRIMER_MISPRIMING_LIBRARY':
+            misprime_lib_name = value if value not in ['', 'NONE'] else None
+        elif key == 'PRIMER_INTERNAL_MISHYB_LIBRARY':
+            mishyb_lib_name = value if value not in ['', 'NONE'] else None
+        elif key.startswith('SEQUENCE_'):
+            seq_args[key] = parse_value(key, value)
+        elif key.startswith('PRIMER_'):
+            global_args[key] = parse_value(key, value)
+    return seq_args, global_args, misprime_lib_name, mishyb_lib_name
+
+
+def read_settings(handle):
+    _, global_args, misprime_lib_name, mishyb_lib_name = split_record(
+        next(read_records(line for line in handle if not is_header(line)), {}))
+    if misprime_lib_name is not None:
+        global_args['PRIMER_MISPRIMING_LIBRARY'] = misprime_lib_name
+    if mishyb_lib_name is not None:
+        global_args['PRIMER_INTERNAL_MISHYB_LIBRARY'] = mishyb_lib_name
+    return global_args
+
+
+def is_header(line):
+    if isinstance(line, bytes):
+        line = line.decode()
+    return line.startswith('Primer3 File') or line.startswith('P3_FILE_')
+
+
+def read_jobs(handle, settings=None):
+    settings = dict(settings or {})
+    misprime_lib_name = settings.pop('PRIMER_MISPRIMING_LIBRARY', None)
+    mishyb_lib_name = settings.pop('PRIMER_INTERNAL_MISHYB_LIBRARY', None)
+    global_args = settings
+    for record in read_records(handle):
+        seq_args, global_args, misprime_lib_name, mishyb_lib_name = split_record(
+            record, global_args, misprime_lib_name, mishyb_lib_name)
+        yield record, seq_args, global_args, misprime_lib_name, mishyb_lib_name
+
+
+def format_record(tags):
+    # primer3-py also returns PRIMER_LEFT, PRIMER_PAIR, ... as lists of
+    # dicts, which have no Boulder-IO form and repeat the numbered tags.
+    return [f'{key}={format_value(key, value)}' for key, value in tags.items()
+            if not (isinstance(value, (list, tuple)) and (len(value) == 0 or isinstance(value[0], dict)))]
+
+
+def record_text(*tag_dicts):
+    return ''.join(line + '\n' for tags in tag_dicts for line in format_record(tags)) + '=\n'
+
+
+def write_record(handle, *tag_dicts):
+    handle.write(record_text(*tag_dicts))
+
+
+def write_settings(handle, global_args, file_id='Primer3-Streamlit settings'):
+    handle.write(settings_header + '\n')
+    handle.write('P3_FILE_TYPE=settings\n')
+    handle.write('\n')
+    handle.write(f'P3_FILE_ID={file_id}\n')
+    write_record(handle, global_args)
@@ -0,0 +1,134 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import re
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from primer3_st_batch import get_executor, read_fasta
+from primer3_st_core import design
+from primer3_st_thermo import thermo, thermo_conditions
+
+CHUNK_SIZE = 250
+# primer3 does not take longer oligos, and very short ones abort the worker
+# process on an assertion, so both are reported without running primer3.
+MAX_OLIGO_LENGTH = 36
+# (column, arrow type), dG values are in kcal/mol
+check_columns = [('NAME', 'string'), ('SEQUENCE', 'string'), ('LENGTH', 'int32'), ('TM', 'float64'),
+                 ('GC_PERCENT', 'float64'), ('SELF_ANY', 'float64'), ('SELF_END', 'float64'),
+                 ('HAIRPIN_DG', 'float64'), ('HAIRPIN_TM', 'float64'), ('SELF_DIMER_DG', 'float64'),
+                 ('SELF_DIMER_TM', 'float64'), ('END_STABILITY', 'float64'), ('PENALTY', 'float64'),
+                 ('PROBLEMS', 'string')]
+oligo_pattern = re.compile(r'^[ACGTRYKMSWBDHVNacgtrykmswbdhvn]+$')
+
+
+def read_oligos(text):
+    # FASTA, or one oligo per line as "sequence" or "name sequence",
+    # separated by whitespace, comma or semicolon. Header lines and
+    # anything else that is not a sequence are skipped.
+    if text.lstrip().startswith('>'):
+        return [(name, seq.replace(' ', '')) for name, seq in read_fasta(text)]
+    oligos = []
+    for line in text.splitlines():
+        fields = [field for field in re.split(r'[\s,;]+', line.strip()) if field != '']
+        if len(fields) == 0 or not oligo_pattern.match(fields[-1]):
+            continue
+        name = ' '.join(fields[:-1]) if len(fields) > 1 else f'Oligo {len(oligos) + 1}'
+        oligos.append((name, fields[-1]))
+    return oligos
+
+
+def check_oligo(seq, seq_args, global_args):
+    values = {'LENGTH': len(seq)}
+    problems = ''
+    try:
+        primer3_results = design({**seq_args, 'SEQUENCE_PRIMER': seq, 'SEQUENCE_TEMPLATE': seq},
+                                 {**global_args, 'PRIMER_PICK_ANYWAY': 1})
+    except (OSError, ValueError) as e:
+        primer3_results = {}
+        problems = str(e)
+    for name, key in [('TM', 'TM'), ('GC_PERCENT', 'GC_PERCENT'), ('SELF_ANY', 'SELF_ANY_TH'),
+                      ('SELF_END', 'SELF_END_TH'), ('END_STABILITY', 'END_STABILITY'), ('PENALTY', 'PENALTY')]:
+        values[name] = primer3_results.get(f'PRIMER_LEFT_0_{key}',
+                                           primer3_results.get(f'PRIMER_LEFT_0_{key.replace("_TH", "")}'))
+    if 'PRIMER_LEFT_0_PROBLEMS' in primer3_results:
+        problems = primer3_results['PRIMER_LEFT_0_PROBLEMS']
+        if isinstance(problems, bytes):
+            problems = problems.decode(errors='replace')
+    elif 'PRIMER_ERROR' in primer3_results:
+        problems = primer3_results['PRIMER_ERROR']
+    values['PROBLEMS'] = problems.strip().rstrip(';').replace(';', ',')
+    return values
+
+
+def length_problem(seq, global_args):
+    min_size = global_args.get('PRIMER_MIN_SIZE', 18)
+    if len(seq) < min_size:
+        return f'Shorter than the minimum size of {min_size} bases'
+    if len(seq) > MAX_OLIGO_LENGTH:
+        return f'Longer than {MAX_OLIGO_LENGTH} bases, the maximum oligo length of primer3'
+    return None
+
+
+def check_chunk(seqs, seq_args, global_args):
+    return [check_oligo(seq, seq_args, global_args) for seq in seqs]
+
+
+def add_structures(checked, conditions, calculator=thermo):
+    seqs = [seq for seq in checked if oligo_pattern.match(seq)]
+    values = calculator.calculate([(kind, (seq,)) for seq in seqs for kind in ['hairpin', 'homodimer']], conditions)
+    for n, seq in enumerate(seqs):
+        for column, (dg, tm) in zip(['HAIRPIN', 'SELF_DIMER'], values[2 * n:2 * n + 2]):
+            checked[seq][f'{column}_DG'] = round(dg / 1000, 2) if dg is not None else None
+            checked[seq][f'{column}_TM'] = round(tm, 2) if tm is not None else None
+
+
+def check_oligos(oligos, seq_args, global_args, max_workers=None, progress=None):
+    # Repeated sequences are checked once, the unique ones in chunks on the
+    # design process pool. Hairpins and self-dimers come from the shared
+    # thermodynamic calculator.
+    seqs = list(dict.fromkeys(seq.upper() for _, seq in oligos))
+    if progress is not None:
+        progress(done=0, total=len(seqs) + 1)
+    checked = {}
+    for seq in seqs:
+        problem = length_problem(seq, global_args)
+        if problem is not None:
+            checked[seq] = {'LENGTH': len(seq), 'PROBLEMS': problem}
+    valid = [seq for seq in seqs if seq not in checked]
+    executor = get_executor(max_workers)
+    pending = {executor.submit(check_chunk, valid[i:i + CHUNK_SIZE], seq_args, global_args): valid[i:i + CHUNK_SIZE]
+               for i in range(0, len(valid), CHUNK_SIZE)}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                checked.update(zip(pending.pop(future), future.result()))
+                if progress is not None:
+                    progress(done=len(checked))
+    finally:
+        for future in pending:
+            future.cancel()
+    add_structures({seq: checked[seq] for seq in valid}, thermo_conditions(global_args))
+    if progress is not None:
+        progress(done=len(seqs) + 1)
+    return [[name, seq] + [checked[seq.upper()].get(column) for column, _ in check_columns[2:]]
+            for name, seq in oligos]
+
+
+def check_table(rows):
+    return [dict(zip([column for column, _ in check_columns], row)) for row in rows]
@@ -0,0 +1,151 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import argparse
+import json
+import sys
+
+from primer3_st_batch import design_jobs
+from primer3_st_boulder import read_jobs, read_settings, write_record
+from primer3_st_core import build_args, hierarchize
+from primer3_st_export import batch_rows, export_formats, export_rows
+from primer3_st_results import as_dict
+from primer3_st_specificity import check_pairs, primer_pairs
+
+def read_jsonl(handle):
+    for line in handle:
+        line = line.strip()
+        if line != '':
+            yield json.loads(line)
+
+
+def record_to_args(record):
+    # Records either carry primer3-py arguments as shown in the "For
+    # primer3-py" expander, or app parameters as used by build_args.
+    if 'seq_args' in record or 'global_args' in record:
+        return (record.get('seq_args', {}), record.get('global_args', {}),
+                record.get('misprime_lib'), record.get('mishyb_lib'))
+    params = dict(record)
+    task = params.pop('SCRIPT_TASK', 'Detection')
+    seq_args, global_args, _, misprime_lib_name, mishyb_lib_name = build_args(params, task)
+    return seq_args, global_args, misprime_lib_name, mishyb_lib_name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run Primer3 designs without the Streamlit interface.')
+    parser.add_argument('input', nargs='?', default='-', help='JSONL or Boulder-IO input file, - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='Output file, - for stdout')
+    parser.add_argument('-f', '--format', choices=['jsonl', 'boulder'], default=None,
+                        help='Input format, guessed from the file extension by default')
+    parser.add_argument('-O', '--output-format', choices=['jsonl', 'boulder'], default='jsonl',
+                        help='Write JSON lines or Boulder-IO records like primer3_core, in input order')
+    parser.add_argument('-p', '--settings', default=None,
+                        help='Primer3 settings file applied before the Boulder-IO records, like -p3_settings_file')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--flat', action='store_true', help='Write the flat Primer3 output instead of the hierarchized one')
+    parser.add_argument('--export', choices=[name.lower() for name in export_formats], default=None,
+                        help='Write one row per pair and oligo in this format instead of JSONL')
+    parser.add_argument('--genome', default=None,
+                        help='FASTA file or .p3kx index to predict the products of every pair from, added to the JSON output')
+    parser.add_argument('--max-product', type=int, default=3000, help='Largest product reported with --genome')
+    parser.add_argument('--mismatches', type=int, default=2, help='Mismatches allowed per primer with --genome')
+    args = parser.parse_args(argv)
+    if args.genome is not None and (args.export is not None or args.output_format == 'boulder'):
+        parser.error('--genome adds the products to the JSONL output, it cannot be used with --export or -O boulder')
+
+    input_format = args.format
+    if input_format is None:
+        input_format = 'jsonl' if args.input.endswith(('.jsonl', '.json')) or args.input == '-' else 'boulder'
+    if args.settings is not None and input_format != 'boulder':
+        parser.error('--settings applies to Boulder-IO input, JSONL records carry their own settings')
+    settings = None
+    if args.settings is not None:
+        with open(args.settings) as settings_handle:
+            settings = read_settings(settings_handle)
+    in_handle = sys.stdin if args.input == '-' else open(args.input)
+    if args.export is None:
+        out_handle = sys.stdout if args.output == '-' else open(args.output, 'w')
+    else:
+        out_handle = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    if input_format == 'jsonl':
+        records = ((record, *record_to_args(record)) for record in read_jsonl(in_handle))
+    else:
+        records = read_jobs(in_handle, settings)
+
+    def jobs():
+        for n, (record, seq_args, global_args, misprime_lib_name, mishyb_lib_name) in enumerate(records):
+            echo = record if input_format == 'boulder' else seq_args
+            seq_id = seq_args.get('SEQUENCE_ID', record.get('SCRIPT_SEQUENCE_ID', ''))
+            yield (n, seq_id, echo), seq_args, global_args, misprime_lib_name, mishyb_lib_name
+
+    failed = 0
+
+    def results():
+        nonlocal failed
+        for (n, seq_id, echo), primer3_results, error in design_jobs(jobs(), args.workers):
+            if error is not None:
+                failed += 1
+            yield n, seq_id, echo, primer3_results, error
+
+    def ordered_results():
+        # design_jobs keeps a bounded number of designs in flight, so only
+        # a few finished records wait here for an earlier, slower one.
+        waiting = {}
+        next_n = 0
+        for result in results():
+            waiting[result[0]] = result
+            while next_n in waiting:
+                yield waiting.pop(next_n)
+                next_n += 1
+
+    def export_records():
+        for n, seq_id, _, primer3_results, error in results():
+            if error is not None:
+                print(f'{n} {seq_id}: {error}', file=sys.stderr)
+            yield seq_id, primer3_results, error
+
+    try:
+        if args.export is not None:
+            export_format = {name.lower(): name for name in export_formats}[args.export]
+            export_rows(batch_rows(export_records()), out_handle, export_format)
+        elif args.output_format == 'boulder':
+            for n, seq_id, echo, primer3_results, error in ordered_results():
+                write_record(out_handle, echo, {'PRIMER_ERROR': str(error)} if error is not None else primer3_results)
+                out_handle.flush()
+        else:
+            for n, seq_id, _, primer3_results, error in results():
+                if error is not None:
+                    out = {'index': n, 'SEQUENCE_ID': seq_id, 'error': str(error)}
+                else:
+                    primers = hierarchize(primer3_results) if not args.flat or args.genome is not None else None
+                    out = {'index': n, 'SEQUENCE_ID': seq_id,
+                           'results': primer3_results if args.flat else as_dict(primers)}
+                    if args.genome is not None:
+                        out['products'] = dict(check_pairs(args.genome, list(primer_pairs(primers)),
+                                                           args.max_product, args.mismatches, args.workers))
+                out_handle.write(json.dumps(out) + '\n')
+                out_handle.flush()
+    finally:
+        if in_handle is not sys.stdin:
+            in_handle.close()
+        if out_handle not in (sys.stdout, sys.stdout.buffer):
+            out_handle.close()
+    return 1 if failed > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+from primer3.bindings import design_primers
+from primer3_st_args import primer_task, table_th, table_salt, st_args, st_default_values, st_static_values
+from primer3_st_cache import design_cache, design_key
+from primer3_st_libs import load_library
+from primer3_st_results import hierarchize
+
+
+def ranges_to_list(input):
+    r_list = input.split()
+    output = []
+    for s in r_list:
+        if ',' in s:
+            rs = s.split(',')
+        elif '-' in s:
+            rs = s.split('-')
+        output.append([int(x) for x in rs])
+    return output
+
+
+def get_task_region_flags(task):
+    return {
+        "show_excluded": task in ["Detection", "Primer_List"],
+        "show_target": task in ["Detection", "Sequencing"],
+        "show_included": task in ["Detection", "Cloning", "Primer_List"],
+    }
+
+
+def sanitize_sequence(seq):
+    seq = seq.strip()
+    illegal_chars = []
+    if any(char.isdigit() for char in seq):
+        illegal_chars.append('numbers')
+    if any(char.isspace() for char in seq):
+        illegal_chars.append('spaces')
+    if len(illegal_chars) > 0:
+        seq = ''.join(filter(lambda char: not char.isdigit() and not char.isspace(), seq))
+    return seq, illegal_chars
+
+
+display_keys = ['SCRIPT_SEQUENCE_ID', 'SCRIPT_SEQUENCE_BLOCK_FIRST', 'SCRIPT_SEQUENCE_BLOCK_PAIRS',
+                'SCRIPT_SHOW_INPUT', 'SCRIPT_SHOW_OUTPUT_FLAT', 'SCRIPT_SHOW_OUTPUT_HIERARCHIZED', 'SCRIPT_SHOW_PERFORMANCE',
+                'SCRIPT_PRIMER_NAME_ACRONYM_LEFT', 'SCRIPT_PRIMER_NAME_ACRONYM_INTERNAL',
+                'SCRIPT_PRIMER_NAME_ACRONYM_RIGHT', 'SCRIPT_PRIMER_NAME_ACRONYM_SPACER']
+
+
+def design_params(params):
+    return {key: value for key, value in params.items()
+            if key in st_default_values and key not in display_keys
+            and key not in ['SCRIPT_SEQUENCE_FILE', 'SCRIPT_SETTINGS_FILE', 'SCRIPT_OLIGO_FILE', 'SCRIPT_LIBRARY_FILE']}
+
+
+def changed_params(params, applied=None):
+    # Only inputs that differ from what the form starts from (the defaults with
+    # the applied preset or settings file on top), enough to restore the form
+    applied = applied or {}
+    return {key: value for key, value in params.items()
+            if 'value' in st_default_values.get(key, {})
+            and value != applied.get(key, st_default_values[key]['value'])}
+
+
+def default_params(task='Detection'):
+    params = {key: value['value'] for key, value in st_default_values.items()
+              if 'value' in value and key.startswith('SCRIPT_')}
+    params['SCRIPT_PRIMER_TM_FORMULA'] = st_args['SCRIPT_PRIMER_TM_FORMULA']['options'][params['SCRIPT_PRIMER_TM_FORMULA']]
+    params['SCRIPT_PRIMER_SALT_CORRECTIONS'] = st_args['SCRIPT_PRIMER_SALT_CORRECTIONS']['options'][params['SCRIPT_PRIMER_SALT_CORRECTIONS']]
+    params['SCRIPT_TASK'] = task
+    params['PRIMER_MISPRIMING_LIBRARY'] = 'NONE'
+    params['PRIMER_INTERNAL_MISHYB_LIBRARY'] = 'NONE'
+    return params
+
+
+def build_args(params, task='Detection'):
+    params = {**default_params(task), **params}
+    seq_args = {}
+    global_args = {}
+    p3_args = []
+    misprime_lib_name = None
+    mishyb_lib_name = None
+    for key, value in st_static_values.items():
+        if key.startswith("SEQUENCE_"):
+            seq_args[key] = value
+        elif key.startswith("PRIMER_"):
+            global_args[key] = value
+    global_args["PRIMER_TASK"] = primer_task[task]
+    if task in ["Primer_Check"]:
+        params["SEQUENCE_TEMPLATE"] = params.get("SEQUENCE_PRIMER", "")
+        global_args["PRIMER_TM_FORMULA"] = 0
+        global_args["PRIMER_SALT_CORRECTIONS"] = 0
+    for key, value in seq_args.items():
+        p3_args.append(f'{key}={value}')
+    for key in params:
+        if params[key] == "":
+            continue
+        if key.startswith("SEQUENCE_"):
+            seq_args[key] = params[key]
+            p3_args.append(f'{key}={params[key]}')
+        if key.startswith("PRIMER_") and "_MISPRIMING_LIBRARY" not in key and "_MISHYB_LIBRARY" not in key:
+            global_args[key] = params[key]
+    # The sequence ID is only for display, it stays out of seq_args so that
+    # renaming a sequence does not change the design, cache and job keys
+    if "SEQUENCE_ID" not in seq_args and params.get("SCRIPT_SEQUENCE_ID", "") != "":
+        p3_args.append(f'SEQUENCE_ID={params["SCRIPT_SEQUENCE_ID"]}')
+    global_args["PRIMER_LIBERAL_BASE"] = int(params["SCRIPT_PRIMER_LIBERAL_BASE"])
+    global_args["PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS"] = int(params["SCRIPT_PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS"])
+    global_args["PRIMER_LOWERCASE_MASKING"] = int(params["SCRIPT_PRIMER_LOWERCASE_MASKING"])
+    if task not in ["Primer_Check"]:
+        regions = []
+        flags = get_task_region_flags(task)
+        if flags["show_excluded"]:
+            regions.append("EXCLUDED_REGION")
+        if flags["show_target"]:
+            regions.append("TARGET")
+        if flags["show_included"]:
+            regions.append("INCLUDED_REGION")
+        for r in regions:
+            if params.get("SCRIPT_" + r, "") != "":
+                p3_args.append("SEQUENCE_" + r + "=" + params["SCRIPT_" + r])
+                seq_args["SEQUENCE_" + r] = ranges_to_list(params["SCRIPT_" + r])
+        if task in ["Detection"]:
+            global_args["PRIMER_PICK_LEFT_PRIMER"] = int(params["SCRIPT_DETECTION_PICK_LEFT"])
+            global_args["PRIMER_PICK_INTERNAL_OLIGO"] = int(params["SCRIPT_DETECTION_PICK_HYB_PROBE"])
+            global_args["PRIMER_PICK_RIGHT_PRIMER"] = int(params["SCRIPT_DETECTION_PICK_RIGHT"])
+        global_args["PRIMER_TM_FORMULA"] = table_th[params["SCRIPT_PRIMER_TM_FORMULA"]]
+        global_args["PRIMER_SALT_CORRECTIONS"] = table_salt[params["SCRIPT_PRIMER_SALT_CORRECTIONS"]]
+        if params["PRIMER_MISPRIMING_LIBRARY"] != 'NONE':
+            p3_args.append("PRIMER_MISPRIMING_LIBRARY" + "=" + params["PRIMER_MISPRIMING_LIBRARY"])
+            misprime_lib_name = params["PRIMER_MISPRIMING_LIBRARY"]
+        if params["PRIMER_INTERNAL_MISHYB_LIBRARY"] != 'NONE':
+            p3_args.append("PRIMER_INTERNAL_MISHYB_LIBRARY" + "=" + params["PRIMER_INTERNAL_MISHYB_LIBRARY"])
+            mishyb_lib_name = params["PRIMER_INTERNAL_MISHYB_LIBRARY"]
+    for key, value in global_args.items():
+        p3_args.append(f'{key}={value}')
+    p3_args = sorted(p3_args)
+    p3_args.append('=')
+    if 'PRIMER_PRODUCT_SIZE_RANGE' in global_args and isinstance(global_args['PRIMER_PRODUCT_SIZE_RANGE'], str):
+        global_args['PRIMER_PRODUCT_SIZE_RANGE'] = ranges_to_list(global_args['PRIMER_PRODUCT_SIZE_RANGE'])
+    return seq_args, global_args, p3_args, misprime_lib_name, mishyb_lib_name
+
+
+def run_design(params, task='Detection', cache=design_cache):
+    seq_args, global_args, _, misprime_lib_name, mishyb_lib_name = build_args(params, task)
+    primer3_results = cached_design(seq_args, global_args, misprime_lib_name, mishyb_lib_name, cache)
+    return primer3_results, hierarchize(primer3_results)
+
+
+def design(seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None):
+    return design_primers(seq_args, global_args,
+                          misprime_lib=load_library(misprime_lib_name),
+                          mishyb_lib=load_library(mishyb_lib_name))
+
+
+def cached_design(seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None, cache=design_cache):
+    key = design_key(seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+    primer3_results = cache.get(key)
+    if primer3_results is None:
+        primer3_results = design(seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+        cache.put(key, primer3_results)
+    return primer3_results
+
+
+def pair_summary(primers):
+    rows = []
+    for p, primer in enumerate(primers['PRIMERS']):
+        row = {'Pair': p + 1}
+        for pt in ['LEFT', 'INTERNAL', 'RIGHT']:
+            if pt in primer:
+                row[pt.capitalize()] = primer[pt].get('SEQUENCE', '')
+                row[f'{pt.capitalize()} Tm'] = round(primer[pt].get('TM', 0), 1)
+        if 'PAIR' in primer:
+            row['Product Size'] = primer['PAIR'].get('PRODUCT_SIZE')
+            row['Penalty'] = primer['PAIR'].get('PENALTY')
+        elif len(row) == 3:
+            row['Penalty'] = next(primer[pt].get('PENALTY') for pt in ['LEFT', 'INTERNAL', 'RIGHT'] if pt in primer)
+        rows.append(row)
+    return rows
@@ -0,0 +1,131 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import csv
+import io
+
+from primer3_st_results import hierarchize
+
+export_formats = {'CSV': ('csv', 'text/csv'),
+                  'TSV': ('tsv', 'text/tab-separated-values'),
+                  'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+                  'Arrow': ('arrow', 'application/vnd.apache.arrow.file')}
+
+# (column, oligo keys tried in order, arrow type)
+oligo_columns = [('SEQUENCE', ['SEQUENCE'], 'string'),
+                 ('POSITION', ['POSITION'], 'int64'),
+                 ('LENGTH', ['LENGTH'], 'int32'),
+                 ('TM', ['TM'], 'float64'),
+                 ('GC_PERCENT', ['GC_PERCENT'], 'float64'),
+                 ('SELF_ANY', ['SELF_ANY_TH', 'SELF_ANY'], 'float64'),
+                 ('SELF_END', ['SELF_END_TH', 'SELF_END'], 'float64'),
+                 ('HAIRPIN', ['HAIRPIN_TH'], 'float64'),
+                 ('END_STABILITY', ['END_STABILITY'], 'float64'),
+                 ('PENALTY', ['PENALTY'], 'float64')]
+pair_columns = [('PRODUCT_SIZE', ['PRODUCT_SIZE'], 'int32'),
+                ('PAIR_PENALTY', ['PENALTY'], 'float64'),
+                ('PAIR_COMPL_ANY', ['COMPL_ANY_TH', 'COMPL_ANY'], 'float64'),
+                ('PAIR_COMPL_END', ['COMPL_END_TH', 'COMPL_END'], 'float64')]
+columns = [('SEQUENCE_ID', 'string'), ('PAIR', 'int32'), ('OLIGO', 'string')] + \
+          [(name, arrow_type) for name, _, arrow_type in oligo_columns + pair_columns]
+oligo_types = ['LEFT', 'INTERNAL', 'RIGHT']
+
+
+def first_value(record, keys):
+    for key in keys:
+        if key in record:
+            return record[key]
+    return None
+
+
+def primer_rows(seq_id, primers):
+    for p, primer in enumerate(primers['PRIMERS']):
+        pair = primer.get('PAIR', {})
+        pair_values = [first_value(pair, keys) for _, keys, _ in pair_columns]
+        for pt in oligo_types:
+            if pt in primer:
+                yield [seq_id, p + 1, pt] + [first_value(primer[pt], keys) for _, keys, _ in oligo_columns] + pair_values
+
+
+def batch_rows(results):
+    for seq_id, primer3_results, error in results:
+        if error is None:
+            yield from primer_rows(seq_id, hierarchize(primer3_results))
+
+
+def write_delimited(rows, handle, delimiter=',', table_columns=columns):
+    text = io.TextIOWrapper(handle, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text, delimiter=delimiter)
+    writer.writerow([name for name, _ in table_columns])
+    for row in rows:
+        writer.writerow(['' if value is None else value for value in row])
+    text.detach()
+
+
+def arrow_schema(table_columns=columns):
+    import pyarrow as pa
+    return pa.schema([(name, getattr(pa, arrow_type)()) for name, arrow_type in table_columns])
+
+
+def arrow_batches(rows, schema, batch_size=10000):
+    import pyarrow as pa
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield pa.RecordBatch.from_arrays([pa.array(col, type=field.type) for col, field in zip(zip(*batch), schema)],
+                                             schema=schema)
+            batch = []
+    if len(batch) > 0:
+        yield pa.RecordBatch.from_arrays([pa.array(col, type=field.type) for col, field in zip(zip(*batch), schema)],
+                                         schema=schema)
+
+
+def write_arrow(rows, handle, batch_size=10000, table_columns=columns):
+    import pyarrow as pa
+    schema = arrow_schema(table_columns)
+    with pa.ipc.new_file(handle, schema) as writer:
+        for batch in arrow_batches(rows, schema, batch_size):
+            writer.write_batch(batch)
+
+
+def write_parquet(rows, handle, batch_size=10000, table_columns=columns):
+    import pyarrow.parquet as pq
+    schema = arrow_schema(table_columns)
+    with pq.ParquetWriter(handle, schema) as writer:
+        for batch in arrow_batches(rows, schema, batch_size):
+            writer.write_batch(batch)
+
+
+def export_rows(rows, handle, export_format='CSV', table_columns=columns):
+    if export_format == 'CSV':
+        write_delimited(rows, handle, ',', table_columns)
+    elif export_format == 'TSV':
+        write_delimited(rows, handle, '\t', table_columns)
+    elif export_format == 'Parquet':
+        write_parquet(rows, handle, table_columns=table_columns)
+    elif export_format == 'Arrow':
+        write_arrow(rows, handle, table_columns=table_columns)
+    else:
+        raise ValueError(f'Unknown export format: {export_format}')
+
+
+def export_bytes(rows, export_format='CSV', table_columns=columns):
+    handle = io.BytesIO()
+    export_rows(rows, handle, export_format, table_columns)
+    return handle.getvalue()
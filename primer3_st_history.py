@@ -0,0 +1,148 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from primer3_st_cache import design_key
+from primer3_st_results import as_dict
+
+HISTORY_PATH = os.environ.get('PRIMER3_ST_HISTORY',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'primer3-streamlit', 'history.sqlite'))
+
+# One row per design run. The inputs and the hierarchized results are kept
+# as JSON, the listed columns are what the history page filters and sorts
+# on without reading the JSON. Every query is scoped to the owner of the runs.
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS runs (
+           id INTEGER PRIMARY KEY,
+           owner TEXT NOT NULL DEFAULT '',
+           created REAL NOT NULL,
+           task TEXT NOT NULL,
+           sequence_id TEXT NOT NULL,
+           template_hash TEXT NOT NULL,
+           template_length INTEGER NOT NULL,
+           input_hash TEXT NOT NULL,
+           entries INTEGER NOT NULL,
+           total_ms REAL,
+           seq_args TEXT NOT NULL,
+           global_args TEXT NOT NULL,
+           misprime_lib TEXT,
+           mishyb_lib TEXT,
+           results TEXT NOT NULL,
+           timings TEXT)''',
+    'CREATE INDEX IF NOT EXISTS runs_owner_sequence_id ON runs (owner, sequence_id)',
+    'CREATE INDEX IF NOT EXISTS runs_owner_template_hash ON runs (owner, template_hash)',
+    'CREATE INDEX IF NOT EXISTS runs_owner_created ON runs (owner, created)',
+]
+RUN_COLUMNS = ['owner', 'created', 'task', 'sequence_id', 'template_hash', 'template_length', 'input_hash', 'entries', 'total_ms',
+               'seq_args', 'global_args', 'misprime_lib', 'mishyb_lib', 'results', 'timings']
+SUMMARY_COLUMNS = ['id', 'created', 'task', 'sequence_id', 'template_hash', 'template_length', 'entries', 'total_ms']
+
+
+def template_hash(seq):
+    return hashlib.sha256(seq.upper().encode()).hexdigest()
+
+
+def owner_id(email=None):
+    # Signed-in users see their runs from any session, anonymous sessions
+    # only their own runs
+    return f'user:{email}' if email else f'session:{secrets.token_hex(16)}'
+
+
+class RunHistory:
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        # Opened on first use, so importing the module never touches the disk
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(runs)')]
+            if columns and 'owner' not in columns:
+                self._db.execute("ALTER TABLE runs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            for statement in SCHEMA:
+                self._db.execute(statement)
+            self._db.commit()
+        return self._db
+
+    def record(self, owner, task, sequence_id, seq_args, global_args, misprime_lib_name, mishyb_lib_name, primers, timings=None):
+        results = as_dict(primers)
+        seq = seq_args.get('SEQUENCE_TEMPLATE', '')
+        row = (owner, time.time(), task, sequence_id, template_hash(seq), len(seq),
+               design_key(seq_args, global_args, misprime_lib_name, mishyb_lib_name), len(results.get('PRIMERS', [])),
+               timings.get('total_ms') if timings else None,
+               json.dumps(seq_args), json.dumps(global_args, default=str), misprime_lib_name, mishyb_lib_name,
+               json.dumps(results, separators=(',', ':'), default=str),
+               json.dumps(timings) if timings else None)
+        with self._lock:
+            db = self._connect()
+            cursor = db.execute(f'INSERT INTO runs ({", ".join(RUN_COLUMNS)}) VALUES ({", ".join("?" * len(row))})', row)
+            db.commit()
+        return cursor.lastrowid
+
+    def runs(self, owner, sequence_id=None, template=None, since=None, until=None, limit=500):
+        where = ['owner = ?']
+        values = [owner]
+        for column, operator, value in [('sequence_id', '=', sequence_id), ('template_hash', '=', template),
+                                        ('created', '>=', since), ('created', '<', until)]:
+            if value is not None:
+                where.append(f'{column} {operator} ?')
+                values.append(value)
+        query = f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM runs WHERE ' + ' AND '.join(where)
+        query += ' ORDER BY created DESC LIMIT ?'
+        with self._lock:
+            rows = self._connect().execute(query, values + [limit]).fetchall()
+        return [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+
+    def load(self, run_id, owner):
+        with self._lock:
+            row = self._connect().execute(
+                f'SELECT {", ".join(SUMMARY_COLUMNS)}, seq_args, global_args, misprime_lib, mishyb_lib, results, timings '
+                'FROM runs WHERE id = ? AND owner = ?', (run_id, owner)).fetchone()
+        if row is None:
+            raise KeyError(f'No run {run_id} in the history')
+        run = dict(zip(SUMMARY_COLUMNS, row))
+        seq_args, global_args, run['misprime_lib'], run['mishyb_lib'], results, timings = row[len(SUMMARY_COLUMNS):]
+        run['seq_args'] = json.loads(seq_args)
+        run['global_args'] = json.loads(global_args)
+        run['results'] = json.loads(results)
+        run['timings'] = json.loads(timings) if timings else None
+        return run
+
+    def delete(self, run_id, owner):
+        with self._lock:
+            db = self._connect()
+            db.execute('DELETE FROM runs WHERE id = ? AND owner = ?', (run_id, owner))
+            db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+history = RunHistory() if HISTORY_PATH else None
@@ -0,0 +1,219 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from primer3_st_batch import design_batch, get_executor
+from primer3_st_cache import canonical_json, design_cache, design_key
+from primer3_st_check import check_oligos
+from primer3_st_core import design
+from primer3_st_multiplex import design_panel
+from primer3_st_specificity import check_pairs
+from primer3_st_sweep import design_sweep
+from primer3_st_tiling import design_tiled, tile_count
+from primer3_st_walking import design_walk, walk_count
+
+_jobs = {}
+_lock = threading.Lock()
+# Threads only drive the jobs, the designs themselves run in the batch process pool
+_runner = ThreadPoolExecutor(max_workers=8, thread_name_prefix='primer3-job')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, key, total=None):
+        self.id = job_id
+        self.key = key
+        self.status = 'running'
+        self.done = 0
+        self.total = total
+        self.partial = []
+        self.result = None
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        # Sessions waiting on a running job, it is only cancelled when the
+        # last of them cancels or ends
+        self.subscribers = set()
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def running(self):
+        return self.status == 'running'
+
+    @property
+    def progress(self):
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def update(self, done=None, total=None):
+        if total is not None:
+            self.total = total
+        if done is not None:
+            self.done = done
+        if self.cancelled:
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+
+def job_key(*parts):
+    return hashlib.sha256(canonical_json(parts).encode()).hexdigest()
+
+
+def _run(job, fn, args, kwargs):
+    try:
+        job.result = fn(job, *args, **kwargs)
+        job.status = 'done'
+    except JobCancelled:
+        job.status = 'cancelled'
+    except Exception as e:
+        job.error = e
+        job.status = 'failed'
+    finally:
+        job.finished = time.time()
+        job._finished.set()
+
+
+def submit(fn, *args, key=None, total=None, session=None, **kwargs):
+    with _lock:
+        if key is not None:
+            for job in _jobs.values():
+                if job.key == key and (job.status == 'done' or job.running and not job.cancelled):
+                    job.subscribers.add(session)
+                    return job.id
+        job = Job(uuid.uuid4().hex, key, total)
+        job.subscribers.add(session)
+        _jobs[job.id] = job
+    forget()
+    _runner.submit(_run, job, fn, args, kwargs)
+    return job.id
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def cancel(job_id, session=None):
+    # Detaches the session, returns whether the job itself was cancelled
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or not job.running:
+            return False
+        job.subscribers.discard(session)
+        if len(job.subscribers) > 0:
+            return False
+    job.cancel()
+    return True
+
+
+def forget(max_age=3600, is_active=None):
+    # is_active tells whether a session still exists, running jobs left
+    # without any active session are cancelled
+    now = time.time()
+    abandoned = []
+    with _lock:
+        for job_id in [job_id for job_id, job in _jobs.items()
+                       if job.finished is not None and now - job.finished > max_age]:
+            del _jobs[job_id]
+        if is_active is not None:
+            for job in _jobs.values():
+                if job.running and len(job.subscribers) > 0:
+                    job.subscribers = {session for session in job.subscribers
+                                       if session is None or is_active(session)}
+                    if len(job.subscribers) == 0:
+                        abandoned.append(job)
+    for job in abandoned:
+        job.cancel()
+
+
+def single_design_job(job, seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None, cache=design_cache):
+    key = design_key(seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+    primer3_results = cache.get(key)
+    if primer3_results is None:
+        future = get_executor().submit(design, seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+        while not future.done():
+            wait([future], timeout=0.2)
+            if job.cancelled:
+                future.cancel()
+                raise JobCancelled()
+        primer3_results = future.result()
+        cache.put(key, primer3_results)
+    job.update(done=1, total=1)
+    return primer3_results
+
+
+def batch_design_job(job, records, seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None):
+    job.update(done=0, total=len(records))
+    for seq_id, primer3_results, error in design_batch(records, seq_args, global_args, misprime_lib_name,
+                                                       mishyb_lib_name):
+        job.partial.append((seq_id, primer3_results, error))
+        job.update(done=len(job.partial))
+    return job.partial
+
+
+def tiled_design_job(job, seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None, window=5000,
+                     overlap=1000):
+    job.update(done=0, total=tile_count(len(seq_args['SEQUENCE_TEMPLATE']), window, overlap))
+    return design_tiled(seq_args, global_args, misprime_lib_name, mishyb_lib_name, window, overlap,
+                        progress=job.update)
+
+
+def walking_design_job(job, seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None, lead=50, spacing=500,
+                       interval=250, accuracy=20, reverse=False, read_length=700):
+    job.update(done=0, total=walk_count(seq_args, spacing, interval, reverse,
+                                        global_args.get('PRIMER_FIRST_BASE_INDEX', 1)))
+    return design_walk(seq_args, global_args, misprime_lib_name, mishyb_lib_name, lead, spacing, interval, accuracy,
+                       reverse, read_length, progress=job.update)
+
+
+def sweep_design_job(job, params, task, sweeps):
+    job.update(done=0)
+    return design_sweep(params, task, sweeps, progress=job.update)
+
+
+def multiplex_job(job, records, global_args, min_dg):
+    job.update(done=0)
+    return design_panel(records, global_args, min_dg, progress=job.update)
+
+
+def oligo_check_job(job, oligos, seq_args, global_args):
+    job.update(done=0)
+    return check_oligos(oligos, seq_args, global_args, progress=job.update)
+
+
+def specificity_job(job, path, pairs, max_size, max_mismatches):
+    job.update(done=0)
+    return check_pairs(path, list(pairs), max_size, max_mismatches, progress=job.update)
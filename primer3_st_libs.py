@@ -0,0 +1,190 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+# Binary library layout: header, one (name offset, name length, sequence
+# offset, sequence length) entry per sequence, then the raw ASCII blob.
+# Sequences keep their IUPAC codes and soft-masking, which primer3 reads
+# verbatim, so they are stored byte for byte rather than 2-bit packed.
+MAGIC = b'P3LB'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+ENTRY = struct.Struct('<IIII')
+
+BUILTIN_LIBRARIES = ('HUMAN', 'RODENT_AND_SIMPLE', 'RODENT', 'DROSOPHILA')
+# Uploaded FASTA libraries are named after a hash of the file content, so
+# the same file is compiled once and shared by every session and worker.
+CUSTOM_PREFIX = 'USER_'
+LIBRARY_DIR = os.environ.get('PRIMER3_ST_LIBRARY_DIR',
+                             os.path.join(os.path.expanduser('~'), '.cache', 'primer3-streamlit', 'libraries'))
+
+# Only the memory maps are kept, their pages are shared by all worker
+# processes. primer3-py takes a plain dict and copies it into its own
+# sequence library on every design anyway, so the dict is built from the
+# map for each call (under a millisecond, against seconds for a design
+# with DROSOPHILA) and not kept in every worker. The least recently used
+# maps are dropped once more than MAX_LOADED libraries were selected.
+MAX_LOADED = 8
+
+_loaded = OrderedDict()
+_lock = threading.Lock()
+
+
+def compile_library(library, path):
+    names = []
+    seqs = []
+    for name, seq in library.items():
+        names.append(name.encode())
+        seqs.append(seq.encode('ascii'))
+    offset = HEADER.size + ENTRY.size * len(names)
+    entries = []
+    for name, seq in zip(names, seqs):
+        entries.append(ENTRY.pack(offset, len(name), offset + len(name), len(seq)))
+        offset += len(name) + len(seq)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(names)))
+        f.writelines(entries)
+        for name, seq in zip(names, seqs):
+            f.write(name)
+            f.write(seq)
+    os.replace(tmp_path, path)
+
+
+class MappedLibrary:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a compiled mispriming library')
+
+    def __len__(self):
+        return self._count
+
+    def items(self):
+        for i in range(self._count):
+            name_offset, name_length, seq_offset, seq_length = ENTRY.unpack_from(
+                self._map, HEADER.size + i * ENTRY.size)
+            yield (self._map[name_offset:name_offset + name_length].decode(),
+                   self._map[seq_offset:seq_offset + seq_length].decode('ascii'))
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def close(self):
+        self._map.close()
+
+
+def library_path(name, library_dir=None):
+    return os.path.join(library_dir or LIBRARY_DIR, name + '.p3lib')
+
+
+def build_builtin_libraries(library_dir=None):
+    import misprime_libs
+    library_dir = library_dir or LIBRARY_DIR
+    os.makedirs(library_dir, exist_ok=True)
+    for name in BUILTIN_LIBRARIES:
+        compile_library(getattr(misprime_libs, name), library_path(name, library_dir))
+
+
+def _is_stale(path):
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'misprime_libs.py')
+    try:
+        return os.path.getmtime(path) < os.path.getmtime(source)
+    except OSError:
+        return True
+
+
+def open_library(name):
+    path = library_path(name)
+    if name in BUILTIN_LIBRARIES and _is_stale(path):
+        build_builtin_libraries()
+    return MappedLibrary(path)
+
+
+def read_library(data):
+    from primer3_st_batch import read_fasta
+    library = {}
+    for name, seq in read_fasta(data):
+        if name == '':
+            raise ValueError('Libraries have to be FASTA files')
+        if seq == '' or not seq.isascii() or not seq.isalpha():
+            raise ValueError(f'{name or "The first record"} is not a DNA sequence')
+        unique_name = name
+        n = 1
+        while unique_name in library:
+            n += 1
+            unique_name = f'{name}_{n}'
+        library[unique_name] = seq
+    if len(library) == 0:
+        raise ValueError('No sequences found, libraries have to be FASTA files')
+    return library
+
+
+def add_library(data):
+    # Returns the name to pass as misprime_lib_name or mishyb_lib_name and
+    # the number of sequences. The FASTA file is only parsed if no library
+    # with the same content was compiled before.
+    if isinstance(data, str):
+        data = data.encode()
+    name = CUSTOM_PREFIX + hashlib.sha256(data).hexdigest()[:16]
+    path = library_path(name)
+    if not os.path.exists(path):
+        library = read_library(data)
+        os.makedirs(LIBRARY_DIR, exist_ok=True)
+        compile_library(library, path)
+    library = MappedLibrary(path)
+    count = len(library)
+    library.close()
+    return name, count
+
+
+def load_library(name):
+    if name is None or name == 'NONE':
+        return None
+    if name not in BUILTIN_LIBRARIES and not name.startswith(CUSTOM_PREFIX):
+        # A FASTA file, as PRIMER_MISPRIMING_LIBRARY names it in primer3_core
+        if not os.path.isfile(name):
+            raise KeyError(f'Unknown mispriming library: {name}')
+        with open(name, 'rb') as f:
+            name = add_library(f.read())[0]
+    with _lock:
+        if name in _loaded:
+            _loaded.move_to_end(name)
+        else:
+            try:
+                _loaded[name] = open_library(name)
+            except OSError:
+                if name not in BUILTIN_LIBRARIES:
+                    raise KeyError(f'Unknown mispriming library: {name}')
+                import misprime_libs
+                return getattr(misprime_libs, name)
+            # Evicted maps are not closed here, another thread may still be
+            # reading one; it is closed with its last reference.
+            while len(_loaded) > MAX_LOADED:
+                _loaded.popitem(last=False)
+        library = _loaded[name]
+    return library.to_dict()
@@ -0,0 +1,125 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import numpy as np
+
+from primer3_st_results import hierarchize
+from primer3_st_thermo import thermo, thermo_conditions
+
+oligo_types = ['LEFT', 'INTERNAL', 'RIGHT']
+oligo_acronyms = {'LEFT': 'L', 'INTERNAL': 'IN', 'RIGHT': 'R'}
+oligo_columns = {'LEFT': 'Left', 'INTERNAL': 'Internal', 'RIGHT': 'Right'}
+
+
+def dimer_matrix(oligos, conditions, max_workers=None, progress=None, calculator=thermo):
+    # Only the upper triangle (including the diagonal) is requested, the
+    # calculator stores each pair once whichever primer comes first.
+    oligos = list(oligos)
+    cells = [(i, j) for i in range(len(oligos)) for j in range(i, len(oligos))]
+    values = calculator.calculate([('heterodimer', (oligos[i], oligos[j])) for i, j in cells], conditions,
+                                  max_workers, progress)
+    matrix = np.zeros((len(oligos), len(oligos)))
+    for (i, j), (dg, _) in zip(cells, values):
+        matrix[i, j] = matrix[j, i] = dg or 0.0
+    return matrix
+
+
+def panel_targets(records):
+    targets = []
+    for seq_id, primer3_results, error in records:
+        if error is not None or primer3_results is None:
+            continue
+        alternates = []
+        for p, primer in enumerate(hierarchize(primer3_results)['PRIMERS']):
+            if 'PAIR' not in primer:
+                continue
+            oligos = {pt: primer[pt]['SEQUENCE'] for pt in oligo_types if pt in primer}
+            alternates.append({'Alternate': p + 1, 'Oligos': oligos, 'Penalty': primer['PAIR']['PENALTY']})
+        if alternates:
+            targets.append((seq_id, alternates))
+    return targets
+
+
+def _worst(matrix, rows, columns):
+    if not rows or not columns:
+        return 0.0, None
+    block = matrix[np.ix_(rows, columns)]
+    position = np.unravel_index(np.argmin(block), block.shape)
+    return float(block[position]), columns[position[1]]
+
+
+def select_panel(targets, matrix, index, min_dg=-9000.0, passes=3):
+    # Targets with the fewest alternates are placed first, each taking the
+    # alternate whose worst heterodimer with the panel so far is weakest.
+    # Further passes revisit every target against the complete panel.
+    rows = {seq_id: [[index[seq] for seq in alternate['Oligos'].values()] for alternate in alternates]
+            for seq_id, alternates in targets}
+    chosen = {}
+
+    def best_alternate(seq_id, alternates):
+        others = [row for other, a in chosen.items() if other != seq_id for row in rows[other][a]]
+        scores = [(_worst(matrix, rows[seq_id][a], others)[0], -alternate['Penalty'], -a)
+                  for a, alternate in enumerate(alternates)]
+        return -max(scores)[2]
+
+    for seq_id, alternates in sorted(targets, key=lambda target: len(target[1])):
+        chosen[seq_id] = best_alternate(seq_id, alternates)
+    for _ in range(passes - 1):
+        changed = False
+        for seq_id, alternates in targets:
+            a = best_alternate(seq_id, alternates)
+            if a != chosen[seq_id]:
+                chosen[seq_id] = a
+                changed = True
+        if not changed:
+            break
+
+    owner = {row: seq_id for seq_id, a in chosen.items() for row in rows[seq_id][a]}
+    panel = []
+    for seq_id, alternates in targets:
+        alternate = alternates[chosen[seq_id]]
+        others = [row for other, a in chosen.items() if other != seq_id for row in rows[other][a]]
+        dg, partner = _worst(matrix, rows[seq_id][chosen[seq_id]], others)
+        panel.append({'Target': seq_id, 'Alternate': alternate['Alternate'],
+                      **{oligo_columns[pt]: seq for pt, seq in alternate['Oligos'].items()},
+                      'Penalty': alternate['Penalty'], 'Worst dG (kcal/mol)': round(dg / 1000, 2),
+                      'Partner': owner.get(partner), 'Compatible': dg >= min_dg})
+    return panel
+
+
+def matrix_rows(panel, matrix, index):
+    names = []
+    rows = []
+    for entry in panel:
+        for pt in oligo_types:
+            seq = entry.get(oligo_columns[pt])
+            if seq is not None:
+                names.append(f"{entry['Target']} {oligo_acronyms[pt]}")
+                rows.append(index[seq])
+    return [{'Oligo': name, **{other: round(matrix[row, column] / 1000, 2) for other, column in zip(names, rows)}}
+            for name, row in zip(names, rows)]
+
+
+def design_panel(records, global_args, min_dg=-9000.0, max_workers=None, progress=None):
+    targets = panel_targets(records)
+    oligos = list(dict.fromkeys(seq for _, alternates in targets for alternate in alternates
+                                for seq in alternate['Oligos'].values()))
+    index = {seq: i for i, seq in enumerate(oligos)}
+    matrix = dimer_matrix(oligos, thermo_conditions(global_args), max_workers, progress)
+    panel = select_panel(targets, matrix, index, min_dg)
+    return {'panel': panel, 'matrix': matrix_rows(panel, matrix, index), 'oligos': len(oligos)}
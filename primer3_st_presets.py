@@ -0,0 +1,190 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import io
+import json
+from functools import lru_cache
+from types import MappingProxyType
+
+from primer3_st_args import st_args, st_default_values, table_salt, table_th
+from primer3_st_boulder import read_settings, write_settings
+from primer3_st_core import display_keys
+
+# Only the differences to st_default_values are listed, every preset
+# starts from the defaults.
+preset_settings = {
+    'Default': {},
+    'qPCR': {
+        'PRIMER_MIN_SIZE': 18, 'PRIMER_OPT_SIZE': 20, 'PRIMER_MAX_SIZE': 24,
+        'PRIMER_MIN_TM': 58.0, 'PRIMER_OPT_TM': 60.0, 'PRIMER_MAX_TM': 62.0, 'PRIMER_PAIR_MAX_DIFF_TM': 2.0,
+        'PRIMER_MIN_GC': 40.0, 'PRIMER_MAX_GC': 60.0, 'PRIMER_GC_CLAMP': 1, 'PRIMER_MAX_POLY_X': 3,
+        'PRIMER_PRODUCT_SIZE_RANGE': '70-150 150-200',
+        'PRIMER_SALT_DIVALENT': 3.0, 'PRIMER_DNTP_CONC': 0.8,
+        'SCRIPT_PRIMER_TM_FORMULA': 'SantaLucia 1998', 'SCRIPT_PRIMER_SALT_CORRECTIONS': 'SantaLucia 1998',
+    },
+    'Probe': {
+        'PRIMER_MIN_SIZE': 18, 'PRIMER_OPT_SIZE': 20, 'PRIMER_MAX_SIZE': 24,
+        'PRIMER_MIN_TM': 58.0, 'PRIMER_OPT_TM': 60.0, 'PRIMER_MAX_TM': 62.0, 'PRIMER_PAIR_MAX_DIFF_TM': 2.0,
+        'PRIMER_MIN_GC': 40.0, 'PRIMER_MAX_GC': 60.0, 'PRIMER_MAX_POLY_X': 3,
+        'PRIMER_PRODUCT_SIZE_RANGE': '70-150 150-200',
+        'PRIMER_SALT_DIVALENT': 3.0, 'PRIMER_DNTP_CONC': 0.8,
+        'SCRIPT_DETECTION_PICK_HYB_PROBE': True,
+        'PRIMER_INTERNAL_MIN_SIZE': 20, 'PRIMER_INTERNAL_OPT_SIZE': 25, 'PRIMER_INTERNAL_MAX_SIZE': 30,
+        'PRIMER_INTERNAL_MIN_TM': 66.0, 'PRIMER_INTERNAL_OPT_TM': 68.0, 'PRIMER_INTERNAL_MAX_TM': 70.0,
+        'PRIMER_INTERNAL_MIN_GC': 30.0, 'PRIMER_INTERNAL_MAX_GC': 80.0, 'PRIMER_INTERNAL_MAX_POLY_X': 3,
+        'PRIMER_INTERNAL_SALT_DIVALENT': 3.0, 'PRIMER_INTERNAL_DNTP_CONC': 0.8,
+        'SCRIPT_PRIMER_TM_FORMULA': 'SantaLucia 1998', 'SCRIPT_PRIMER_SALT_CORRECTIONS': 'SantaLucia 1998',
+    },
+    'Long range': {
+        'PRIMER_MIN_SIZE': 24, 'PRIMER_OPT_SIZE': 27, 'PRIMER_MAX_SIZE': 32,
+        'PRIMER_MIN_TM': 62.0, 'PRIMER_OPT_TM': 65.0, 'PRIMER_MAX_TM': 68.0, 'PRIMER_PAIR_MAX_DIFF_TM': 3.0,
+        'PRIMER_MIN_GC': 40.0, 'PRIMER_MAX_GC': 60.0, 'PRIMER_GC_CLAMP': 1,
+        'PRIMER_PRODUCT_SIZE_RANGE': '3000-5000 5000-8000 8000-12000',
+        'SCRIPT_PRIMER_TM_FORMULA': 'SantaLucia 1998', 'SCRIPT_PRIMER_SALT_CORRECTIONS': 'SantaLucia 1998',
+    },
+    'Bisulfite': {
+        'PRIMER_MIN_SIZE': 22, 'PRIMER_OPT_SIZE': 26, 'PRIMER_MAX_SIZE': 32,
+        'PRIMER_MIN_TM': 52.0, 'PRIMER_OPT_TM': 56.0, 'PRIMER_MAX_TM': 60.0,
+        'PRIMER_MIN_GC': 20.0, 'PRIMER_OPT_GC_PERCENT': 35.0, 'PRIMER_MAX_GC': 60.0, 'PRIMER_MAX_POLY_X': 5,
+        'PRIMER_PRODUCT_SIZE_RANGE': '100-250 250-400',
+        'SCRIPT_PRIMER_TM_FORMULA': 'SantaLucia 1998', 'SCRIPT_PRIMER_SALT_CORRECTIONS': 'SantaLucia 1998',
+    },
+}
+
+# Sequence specific inputs are not part of a settings preset
+excluded_keys = display_keys + ['SCRIPT_SETTINGS_PRESET', 'SCRIPT_TASK', 'SCRIPT_EXCLUDED_REGION', 'SCRIPT_TARGET',
+                                'SCRIPT_INCLUDED_REGION', 'SCRIPT_OLIGO_LIST', 'SCRIPT_TEMPLATE_REGION', 'PRIMER_SEQUENCE_QUALITY']
+# Primer3 tags that are set through SCRIPT_ widgets in the app
+script_tags = {'PRIMER_PICK_LEFT_PRIMER': 'SCRIPT_DETECTION_PICK_LEFT',
+               'PRIMER_PICK_INTERNAL_OLIGO': 'SCRIPT_DETECTION_PICK_HYB_PROBE',
+               'PRIMER_PICK_RIGHT_PRIMER': 'SCRIPT_DETECTION_PICK_RIGHT',
+               'PRIMER_LIBERAL_BASE': 'SCRIPT_PRIMER_LIBERAL_BASE',
+               'PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS': 'SCRIPT_PRIMER_LIB_AMBIGUITY_CODES_CONSENSUS',
+               'PRIMER_LOWERCASE_MASKING': 'SCRIPT_PRIMER_LOWERCASE_MASKING'}
+option_tags = {'PRIMER_TM_FORMULA': ('SCRIPT_PRIMER_TM_FORMULA', table_th),
+               'PRIMER_SALT_CORRECTIONS': ('SCRIPT_PRIMER_SALT_CORRECTIONS', table_salt)}
+
+
+def setting_defaults():
+    defaults = {}
+    for key, value in st_default_values.items():
+        if 'value' not in value or 'key' not in st_args.get(key, {}):
+            continue
+        if key.startswith('SEQUENCE_') or key in excluded_keys:
+            continue
+        defaults[key] = value['value']
+        if 'options' in st_args.get(key, {}) and isinstance(value['value'], int):
+            defaults[key] = st_args[key]['options'][value['value']]
+    return defaults
+
+
+defaults = MappingProxyType(setting_defaults())
+
+
+def validate_value(key, value):
+    if key not in defaults:
+        raise ValueError(f'{key} is not a setting')
+    default = defaults[key]
+    if isinstance(default, bool):
+        if isinstance(value, (bool, int)) and value in (0, 1):
+            return bool(value)
+    elif isinstance(default, int):
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value == int(value):
+            return int(value)
+    elif isinstance(default, float):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    elif isinstance(value, str):
+        if value in st_args.get(key, {}).get('options', [value]):
+            return value
+    raise ValueError(f'{key}: invalid value {value!r}')
+
+
+def validate_settings(settings):
+    return {key: validate_value(key, value) for key, value in settings.items()}
+
+
+presets = MappingProxyType({name: MappingProxyType(validate_settings(settings))
+                            for name, settings in preset_settings.items()})
+if tuple(presets) != tuple(st_args['SCRIPT_SETTINGS_PRESET']['options']):
+    raise ValueError('Settings presets do not match the SCRIPT_SETTINGS_PRESET options')
+
+
+@lru_cache(maxsize=None)
+def preset_values(name):
+    return MappingProxyType({**defaults, **presets[name]})
+
+
+def widget_state(values):
+    return {st_args[key]['key']: value for key, value in values.items()}
+
+
+def changed_settings(values):
+    return {key: value for key, value in values.items() if key in defaults and value != defaults[key]}
+
+
+def settings_to_json(values, name=None):
+    return json.dumps({'preset': name, 'settings': changed_settings(values)}, indent=1)
+
+
+def settings_from_json(text):
+    data = json.loads(text)
+    settings = data.get('settings', data) if isinstance(data, dict) else None
+    if not isinstance(settings, dict):
+        raise ValueError('Expected a JSON object of settings')
+    return {**defaults, **validate_settings(settings)}, []
+
+
+def settings_to_primer3(values, name='Primer3-Streamlit settings'):
+    global_args = {}
+    for key, value in values.items():
+        if key.startswith('PRIMER_') and key in defaults:
+            global_args[key] = value
+    for tag, key in script_tags.items():
+        global_args[tag] = int(values[key])
+    for tag, (key, table) in option_tags.items():
+        global_args[tag] = table[values[key]]
+    handle = io.StringIO()
+    write_settings(handle, dict(sorted(global_args.items())), name)
+    return handle.getvalue()
+
+
+def settings_from_primer3(text):
+    values = dict(defaults)
+    skipped = []
+    for tag, value in read_settings(io.StringIO(text)).items():
+        try:
+            if tag in script_tags:
+                values[script_tags[tag]] = validate_value(script_tags[tag], value)
+            elif tag in option_tags:
+                key, table = option_tags[tag]
+                values[key] = {number: option for option, number in table.items()}[value]
+            elif tag == 'PRIMER_PRODUCT_SIZE_RANGE' and isinstance(value, list):
+                values[tag] = ' '.join(f'{start}-{end}' for start, end in value)
+            else:
+                values[tag] = validate_value(tag, value)
+        except (KeyError, ValueError):
+            skipped.append(tag)
+    return values, skipped
+
+
+def settings_from_file(name, data):
+    text = data.decode() if isinstance(data, bytes) else data
+    if name.lower().endswith('.json') or text.lstrip().startswith('{'):
+        return settings_from_json(text)
+    return settings_from_primer3(text)
@@ -0,0 +1,187 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+colors = {'LEFT': '#8383FC', 'INTERNAL': '#DE83FC', 'RIGHT': '#FCFC83', 'EXCLUDED_REGION': '#FB6A6A', 'TARGET': '#0DF20D', 'INCLUDED_REGION': '#83FCFC'}
+
+
+def non_intersecting_parts(ranges, ref):
+    non_intersecting = []
+    label, start, end = ref
+    for _, r_start, r_end in ranges:
+        if r_end >= start and r_start <= end:
+            if r_start > start:
+                non_intersecting.append((label, start, r_start - 1))
+            start = r_end + 1
+    if end >= start:
+        non_intersecting.append((label, start, end))
+    return non_intersecting
+
+
+def remove_overlap(ranges):
+    if len(ranges) == 0:
+        return []
+    ranges.sort(key=lambda x: x[1])
+    merged = [ranges[0]]
+    for current in ranges[1:]:
+        previous = merged[-1]
+        if current[1] <= previous[2]:
+            merged[-1] = (previous[0], previous[1], max(previous[2], current[2]))
+        else:
+            merged.append(current)
+    return merged
+
+
+def paint_blocks(seq_length, LEFT_POSITION=None, LEFT_LENGTH=None, INTERNAL_POSITION=None, INTERNAL_LENGTH=None, RIGHT_POSITION=None, RIGHT_LENGTH=None, EXCLUDED_REGION=None, TARGET=None, INCLUDED_REGION=None):
+    ranges = []
+    io_range = None
+    p_ranges = []
+    e_ranges = []
+    t_ranges = []
+    range_gaps = []
+    block_coords = []
+    ir_start = seq_length + 1
+    ir_end = 0
+    if LEFT_POSITION is not None and LEFT_LENGTH is not None:
+        p_ranges.append(('LEFT', LEFT_POSITION, LEFT_POSITION + LEFT_LENGTH - 1))
+    if INTERNAL_POSITION is not None and INTERNAL_LENGTH is not None:
+        io_range = ('INTERNAL', INTERNAL_POSITION, INTERNAL_POSITION + INTERNAL_LENGTH - 1)
+    if RIGHT_POSITION is not None and RIGHT_LENGTH is not None:
+        p_ranges.append(('RIGHT', RIGHT_POSITION - RIGHT_LENGTH + 1, RIGHT_POSITION))
+
+    if EXCLUDED_REGION is not None:
+        for start, length in EXCLUDED_REGION:
+            e_ranges.append(('EXCLUDED_REGION', start - 1, start + length - 2))
+        e_ranges = remove_overlap(e_ranges)
+        ranges += e_ranges
+
+    if TARGET is not None:
+        for start, length in TARGET:
+            t_ranges.append(('TARGET', start - 1, start + length - 2))
+        t_ranges = remove_overlap(t_ranges)
+        ranges += t_ranges
+        if io_range is not None:
+            p_ranges += non_intersecting_parts(t_ranges, io_range)
+    elif io_range is not None:
+        p_ranges.append(io_range)
+
+    if EXCLUDED_REGION is not None or TARGET is not None:
+        range_gaps = remove_overlap(e_ranges + t_ranges)
+
+    for p_range in p_ranges:
+        if len(range_gaps) > 0:
+            ranges += non_intersecting_parts(range_gaps, p_range)
+        else:
+            ranges += [p_range]
+
+    if INCLUDED_REGION is not None:
+        i_range = ''
+        for start, length in INCLUDED_REGION:
+            ir_start = start - 1
+            ir_end = start + length - 2
+            i_range = ('INCLUDED_REGION', ir_start, ir_end)
+            break
+        range_gaps = remove_overlap(ranges)
+        ranges += non_intersecting_parts(range_gaps, i_range)
+
+    # run-length label runs, split so that no run crosses a 50 base line
+    for label, start, end in ranges:
+        start_line = start // 50
+        end_line = end // 50
+        if start_line == end_line:
+            block_coords.append((label, start, end))
+        else:
+            block_coords.append((label, start, (start_line + 1) * 50 - 1))
+            for i in range(start_line + 1, end_line):
+                block_coords.append((label, i * 50, (i + 1) * 50 - 1))
+            block_coords.append((label, end_line * 50, end))
+    block_coords = sorted(block_coords, key=lambda x: x[1])
+    return block_coords, io_range, ir_start, ir_end
+
+
+def sequence_block(seq, **regions):
+    block_coords, io_range, ir_start, ir_end = paint_blocks(len(seq), **regions)
+    if io_range is not None:
+        io_start = io_range[1]
+        io_end = io_range[2]
+    else:
+        io_start = len(seq) + 1
+        io_end = 0
+    seq_length = len(seq)
+    n_blocks = len(block_coords)
+    c = 0
+    close = False
+    lines = []
+    for line_start in range(0, seq_length, 50):
+        line_number = str(line_start + 1)
+        parts = [line_number, '&nbsp;' * (12 - len(line_number))]
+        for group_start in range(line_start, min(line_start + 50, seq_length), 10):
+            group_end = min(group_start + 9, seq_length - 1)
+            pos = group_start
+            while pos <= group_end:
+                # bases before the next run boundary or group end are copied as one slice
+                i = group_end
+                if c < n_blocks:
+                    label, block_start, block_end = block_coords[c]
+                    if pos <= block_start < i:
+                        i = block_start
+                    if pos <= block_end < i:
+                        i = block_end
+                parts.append(seq[pos:i])
+                char = seq[i]
+                if c < n_blocks:
+                    if i == block_start:
+                        parts.append(f'<span style="color:black; background-color: {colors[label]}">')
+                        close = True
+                    if (i + 1) % 10 == 0 and (i + 1) % 50 != 0:
+                        parts.append(char)
+                        if i == block_end and io_start < i <= io_end and label == 'TARGET':
+                            parts.append('</span><span style="color:black; background-color: ' + colors['INTERNAL'] + '">')
+                        elif i > 0 and i == ir_end and label == 'INCLUDED_REGION':
+                            parts.append('</span><span>')
+                        elif i == block_end and ir_start < i < ir_end and label != 'INCLUDED_REGION':
+                            parts.append('</span><span style="color:black; background-color: ' + colors['INCLUDED_REGION'] + '">')
+                        elif i == block_end and ir_start >= i >= ir_end:
+                            parts.append('</span><span>')
+                        parts.append('&nbsp;&nbsp;')
+                    elif (i + 1) % 50 == 0:
+                        parts.append(f'{char}<br>\n')
+                    else:
+                        parts.append(char)
+                    if i == block_end and close:
+                        parts.append('</span>')
+                        c += 1
+                        close = False
+                elif (i + 1) % 10 == 0 and (i + 1) % 50 != 0:
+                    parts.append(f'{char}&nbsp;&nbsp;')
+                elif (i + 1) % 50 == 0:
+                    parts.append(f'{char}<br>\n')
+                else:
+                    parts.append(char)
+                pos = i + 1
+        lines.append(''.join(parts))
+    formatted_seq = ''.join(lines)
+    return f'<span style="font-family: monospace, \'Courier New\';">{formatted_seq}</span>'
+
+
+def text_monospace(text):
+    html = f'<span style="font-family: monospace, \'Courier New\';">{text}</span>'
+    return html
+
+
+def highlight(text, color):
+    html = f'<span style="color:black; background-color: {color}">{text}</span>'
+    return html
@@ -0,0 +1,136 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+from collections.abc import Mapping
+from functools import lru_cache
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=65536)
+def parse_key(key):
+    if not key.startswith('PRIMER_'):
+        return None
+    tmp = key.split('_', 3)
+    if len(tmp) == 2:
+        return 'GLOBAL', tmp[1], None, None
+    if tmp[2] == 'EXPLAIN':
+        return 'EXPLAIN', tmp[0] + '_' + tmp[1], None, None
+    if tmp[2].isdigit():
+        return 'PRIMER', tmp[1], int(tmp[2]), tmp[3] if len(tmp) > 3 else None
+    return 'SKIP', None, None, None
+
+
+class Record(Mapping):
+    # Records of the same kind share one field -> index layout, so each
+    # record only holds a list of values in primer3 output order.
+    __slots__ = ('_layout', '_values')
+
+    def __init__(self, layout):
+        self._layout = layout
+        self._values = []
+
+    def __getitem__(self, key):
+        i = self._layout.get(key)
+        if i is None or i >= len(self._values) or self._values[i] is _MISSING:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key, value):
+        i = self._layout.setdefault(key, len(self._layout))
+        if i >= len(self._values):
+            self._values.extend([_MISSING] * (i + 1 - len(self._values)))
+        self._values[i] = value
+
+    def __iter__(self):
+        values = self._values
+        for key, i in self._layout.items():
+            if i < len(values) and values[i] is not _MISSING:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+    def to_dict(self):
+        return {key: value.to_dict() if isinstance(value, Record) else value for key, value in self.items()}
+
+
+class Oligo(Record):
+    __slots__ = ()
+
+    position = property(lambda self: self.get('POSITION'))
+    length = property(lambda self: self.get('LENGTH'))
+    sequence = property(lambda self: self.get('SEQUENCE'))
+    tm = property(lambda self: self.get('TM'))
+    gc_percent = property(lambda self: self.get('GC_PERCENT'))
+    penalty = property(lambda self: self.get('PENALTY'))
+    product_size = property(lambda self: self.get('PRODUCT_SIZE'))
+
+
+class Primer(Record):
+    __slots__ = ()
+
+    pair = property(lambda self: self.get('PAIR'))
+    left = property(lambda self: self.get('LEFT'))
+    internal = property(lambda self: self.get('INTERNAL'))
+    right = property(lambda self: self.get('RIGHT'))
+
+
+def hierarchize(primer3_results):
+    results = {}
+    results['PRIMERS'] = []
+    results['EXPLAIN'] = {}
+    primers = results['PRIMERS']
+    primer_layout = {}
+    oligo_layouts = {}
+    for k, v in primer3_results.items():
+        parsed = parse_key(k)
+        if parsed is None:
+            results[k] = v
+            continue
+        section, name, p, field = parsed
+        if section == 'PRIMER':
+            while p + 1 > len(primers):
+                primers.append(Primer(primer_layout))
+            primer = primers[p]
+            oligo = primer.get(name)
+            if oligo is None:
+                oligo = primer[name] = Oligo(oligo_layouts.setdefault(name, {}))
+            if field is not None:
+                oligo[field] = v
+            else:
+                oligo['POSITION'] = v[0]
+                oligo['LENGTH'] = v[1]
+        elif section == 'GLOBAL':
+            results[name] = v
+        elif section == 'EXPLAIN':
+            results['EXPLAIN'][name] = v
+    return results
+
+
+def as_dict(results):
+    if isinstance(results, Record):
+        return results.to_dict()
+    if isinstance(results, dict):
+        return {key: as_dict(value) for key, value in results.items()}
+    if isinstance(results, list):
+        return [as_dict(value) for value in results]
+    return results
@@ -0,0 +1,355 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import mmap
+import os
+import struct
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from primer3_st_batch import get_executor, read_fasta
+from primer3_st_templates import cached_index_path, resolve_path
+
+# Index layout: header, one (sequence start, sequence length, name offset,
+# name length) entry per record, the record names, the upper-cased
+# sequences joined by N, then the sorted k-mer codes and their positions
+# in the joined sequence as uint32. Only k-mers of A, C, G and T are
+# indexed, so no k-mer spans two records.
+MAGIC = b'P3KX'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQQQQ')
+ENTRY = struct.Struct('<QQII')
+INDEX_SUFFIX = '.p3kx'
+# Like the templates, genome paths typed in the app are relative to
+# GENOME_DIR and the indexes are written to the index directory.
+GENOME_DIR = os.environ.get('PRIMER3_ST_GENOME_DIR')
+K = 12
+MAX_LENGTH = 2 ** 32 - 1
+# The whole FASTA file is indexed in memory, about 21 bytes per base at the
+# peak, so larger files are refused instead of exhausting the server
+MAX_GENOME_SIZE = int(os.environ.get('PRIMER3_ST_MAX_GENOME_SIZE', 2 ** 28))
+
+_base_codes = np.full(256, 4, dtype=np.uint8)
+for _code, _base in enumerate(b'ACGT'):
+    _base_codes[_base] = _code
+_complement = bytes.maketrans(b'ACGTRYKMBVDHacgtrykmbvdh', b'TGCAYRMKVBHDtgcayrmkvbhd')
+
+_opened = {}
+_lock = threading.Lock()
+
+
+def reverse_complement(seq):
+    return seq.encode('ascii').translate(_complement)[::-1].decode('ascii')
+
+
+def kmer_codes(values, k):
+    n = len(values) - k + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=bool)
+    codes = np.zeros(n, dtype=np.uint32)
+    valid = np.ones(n, dtype=bool)
+    for j in range(k):
+        window = values[j:j + n]
+        codes <<= 2
+        codes |= window & 3
+        valid &= window < 4
+    return codes, valid
+
+
+def _align(offset):
+    return offset + -offset % 8
+
+
+def build_index(fasta_path, path=None, k=K):
+    if not 1 <= k <= 16:
+        raise ValueError('k has to be between 1 and 16')
+    path = path or index_path(fasta_path)
+    if os.path.getsize(fasta_path) > MAX_GENOME_SIZE:
+        raise ValueError(f'{fasta_path} is too large to index, the limit is {MAX_GENOME_SIZE} bytes '
+                         f'(PRIMER3_ST_MAX_GENOME_SIZE)')
+    names = []
+    starts = []
+    chunks = []
+    offset = 0
+    with open(fasta_path) as handle:
+        for name, seq in read_fasta(handle):
+            names.append(name.encode())
+            starts.append((offset, len(seq)))
+            chunks.append(seq.upper().encode('ascii', 'replace'))
+            offset += len(seq) + 1
+    sequence = b'N'.join(chunks)
+    del chunks
+    if len(sequence) > MAX_LENGTH:
+        raise ValueError(f'{fasta_path} is too large to index, the limit is {MAX_LENGTH} bases')
+    codes, valid = kmer_codes(_base_codes[np.frombuffer(sequence, dtype=np.uint8)], k)
+    positions = np.flatnonzero(valid).astype(np.uint32)
+    codes = codes[valid]
+    del valid
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    positions = positions[order]
+    del order
+
+    name_offset = HEADER.size + ENTRY.size * len(names)
+    entries = []
+    for name, (start, length) in zip(names, starts):
+        entries.append(ENTRY.pack(start, length, name_offset, len(name)))
+        name_offset += len(name)
+    seq_offset = _align(name_offset)
+    kmer_offset = _align(seq_offset + len(sequence))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, k, len(names), seq_offset, len(sequence), kmer_offset, len(codes)))
+        f.writelines(entries)
+        f.writelines(names)
+        f.write(bytes(seq_offset - name_offset))
+        f.write(sequence)
+        f.write(bytes(kmer_offset - seq_offset - len(sequence)))
+        f.write(codes.tobytes())
+        f.write(positions.tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+
+class GenomeIndex:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.k, count, seq_offset, seq_length,
+         kmer_offset, kmer_count) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a genome index')
+        self.names = []
+        starts = []
+        for i in range(count):
+            start, length, name_offset, name_length = ENTRY.unpack_from(self._map, HEADER.size + i * ENTRY.size)
+            self.names.append(self._map[name_offset:name_offset + name_length].decode())
+            starts.append(start)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.sequence = np.frombuffer(self._map, dtype=np.uint8, count=seq_length, offset=seq_offset)
+        self.codes = np.frombuffer(self._map, dtype=np.uint32, count=kmer_count, offset=kmer_offset)
+        self.positions = np.frombuffer(self._map, dtype=np.uint32, count=kmer_count,
+                                       offset=kmer_offset + 4 * kmer_count)
+
+    def __len__(self):
+        return len(self.names)
+
+    def record_of(self, positions):
+        return np.searchsorted(self.starts, positions, side='right') - 1
+
+    def seed_positions(self, seed):
+        codes, valid = kmer_codes(_base_codes[np.frombuffer(seed.encode('ascii'), dtype=np.uint8)], self.k)
+        if len(codes) != 1 or not valid[0]:
+            return np.zeros(0, dtype=np.int64)
+        lo = np.searchsorted(self.codes, codes[0], side='left')
+        hi = np.searchsorted(self.codes, codes[0], side='right')
+        return self.positions[lo:hi].astype(np.int64)
+
+    def binding_sites(self, oligo, max_mismatches=2):
+        # The 3' end has to match over k bases, the rest of the oligo may
+        # carry up to max_mismatches. Forward sites bind the minus strand
+        # and extend to the right, reverse sites extend to the left.
+        oligo = oligo.upper()
+        length = len(oligo)
+        sites = []
+        for target in [oligo, reverse_complement(oligo)]:
+            if length < self.k:
+                sites.append((np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)))
+                continue
+            forward = target is oligo
+            hits = self.seed_positions(target[-self.k:] if forward else target[:self.k])
+            starts = hits - (length - self.k) if forward else hits
+            starts = starts[(starts >= 0) & (starts + length <= len(self.sequence))]
+            starts = starts[self.record_of(starts) == self.record_of(starts + length - 1)]
+            windows = self.sequence[starts[:, None] + np.arange(length)]
+            mismatches = (windows != np.frombuffer(target.encode('ascii'), dtype=np.uint8)).sum(axis=1)
+            keep = mismatches <= max_mismatches
+            sites.append((starts[keep], mismatches[keep]))
+        return sites
+
+    def close(self):
+        del self.sequence, self.codes, self.positions
+        self._map.close()
+
+
+def genome_path(path):
+    return resolve_path(path, GENOME_DIR, 'PRIMER3_ST_GENOME_DIR')
+
+
+def index_path(path):
+    if path.endswith(INDEX_SUFFIX):
+        return path
+    # An up to date index next to the FASTA file is used as is
+    if not _is_stale(path + INDEX_SUFFIX, path):
+        return path + INDEX_SUFFIX
+    return cached_index_path(path, INDEX_SUFFIX)
+
+
+def _is_stale(path, source):
+    try:
+        return os.path.getmtime(path) < os.path.getmtime(source)
+    except OSError:
+        return True
+
+
+def is_indexed(path):
+    return path.endswith(INDEX_SUFFIX) or not _is_stale(index_path(path), path)
+
+
+def open_index(path):
+    # The index has to be built beforehand (check_pairs does it in the
+    # process pool), the lock is only held to publish the opened index
+    path = os.path.abspath(path)
+    if not is_indexed(path):
+        raise ValueError(f'{path} has no up to date index')
+    key = (index_path(path), os.path.getmtime(index_path(path)))
+    with _lock:
+        if key in _opened:
+            return _opened[key]
+    index = GenomeIndex(key[0])
+    with _lock:
+        if key not in _opened:
+            for old_key in [old_key for old_key in _opened if old_key[0] == key[0]]:
+                del _opened[old_key]
+            _opened[key] = index
+        return _opened[key]
+
+
+def pcr_products(index, oligos, max_size=3000, max_mismatches=2, sites=None):
+    # oligos maps a name to a sequence, any two of them (or one with
+    # itself) may amplify a product.
+    if sites is None:
+        sites = {}
+    forward = []
+    reverse = []
+    for name, oligo in oligos.items():
+        if oligo not in sites:
+            sites[oligo] = index.binding_sites(oligo, max_mismatches)
+        (f_starts, f_mismatches), (r_starts, r_mismatches) = sites[oligo]
+        forward.append((f_starts, f_starts + len(oligo), f_mismatches, np.full(len(f_starts), name, dtype=object)))
+        reverse.append((r_starts, r_starts + len(oligo), r_mismatches, np.full(len(r_starts), name, dtype=object)))
+    f_starts, f_ends, f_mismatches, f_names = (np.concatenate(column) for column in zip(*forward))
+    r_starts, r_ends, r_mismatches, r_names = (np.concatenate(column) for column in zip(*reverse))
+    order = np.argsort(r_ends, kind='stable')
+    r_starts, r_ends, r_mismatches, r_names = r_starts[order], r_ends[order], r_mismatches[order], r_names[order]
+
+    lo = np.searchsorted(r_ends, f_ends, side='left')
+    hi = np.searchsorted(r_ends, f_starts + max_size, side='right')
+    counts = np.maximum(hi - lo, 0)
+    f_index = np.repeat(np.arange(len(f_starts)), counts)
+    r_index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+    keep = ((r_starts[r_index] >= f_starts[f_index])
+            & (index.record_of(f_starts[f_index]) == index.record_of(r_ends[r_index] - 1)))
+    f_index = f_index[keep]
+    r_index = r_index[keep]
+
+    products = []
+    records = index.record_of(f_starts[f_index])
+    for f, r, record in zip(f_index.tolist(), r_index.tolist(), records.tolist()):
+        start = int(f_starts[f] - index.starts[record])
+        products.append({'Chrom': index.names[record],
+                         'Start': start + 1,
+                         'End': int(r_ends[r] - index.starts[record]),
+                         'Size': int(r_ends[r] - f_starts[f]),
+                         'Forward': f_names[f],
+                         'Reverse': r_names[r],
+                         'Mismatches': int(f_mismatches[f] + r_mismatches[r])})
+    products.sort(key=lambda product: (product['Mismatches'], product['Size']))
+    return products
+
+
+def is_target(product, product_size):
+    return (product['Forward'] == 'LEFT' and product['Reverse'] == 'RIGHT' and product['Mismatches'] == 0
+            and product['Size'] == product_size)
+
+
+def _check_chunk(path, pairs, max_size, max_mismatches):
+    index = open_index(path)
+    sites = {}
+    return [(pair_id, pcr_products(index, {'LEFT': left, 'RIGHT': right}, max_size, max_mismatches, sites))
+            for pair_id, left, right, _ in pairs]
+
+
+def _wait(futures, progress, done, total):
+    # Polls the futures so that a cancelled job (progress raises) stops
+    # waiting, the futures not started yet are cancelled
+    pending = set(futures)
+    try:
+        while len(pending) > 0:
+            finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            done += len(finished)
+            if progress is not None:
+                progress(done=done, total=total)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        raise
+
+
+def check_pairs(path, pairs, max_size=3000, max_mismatches=2, max_workers=None, progress=None):
+    # pairs are (pair id, left primer, right primer, expected product size)
+    # tuples. They are checked in one chunk per worker, each worker opens
+    # the memory-mapped index once and shares the binding sites of primers
+    # used in several pairs.
+    path = os.path.abspath(path)
+    executor = get_executor(max_workers)
+    chunk_size = max(1, -(-len(pairs) // (max_workers or os.cpu_count() or 1)))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    # A missing or stale index is built in a worker first, one step of
+    # the progress next to the chunks
+    total = len(chunks) + 1
+    if progress is not None:
+        progress(done=0, total=total)
+    if not is_indexed(path):
+        build = executor.submit(build_index, path, index_path(path))
+        _wait([build], progress, 0, total)
+        build.result()
+    elif progress is not None:
+        progress(done=1)
+    futures = [executor.submit(_check_chunk, index_path(path), chunk, max_size, max_mismatches) for chunk in chunks]
+    _wait(futures, progress, 1, total)
+    results = []
+    for future in futures:
+        results.extend(future.result())
+    return results
+
+
+def primer_pairs(primers):
+    return tuple((p + 1, primer['LEFT']['SEQUENCE'], primer['RIGHT']['SEQUENCE'], primer['PAIR']['PRODUCT_SIZE'])
+                 for p, primer in enumerate(primers['PRIMERS'])
+                 if 'PAIR' in primer and 'LEFT' in primer and 'RIGHT' in primer)
+
+
+def specificity_rows(pairs, results):
+    sizes = {pair_id: product_size for pair_id, _, _, product_size in pairs}
+    rows = []
+    for pair_id, products in results:
+        targets = [product for product in products if is_target(product, sizes[pair_id])]
+        off_target = len(products) - min(len(targets), 1)
+        rows.append({'Pair': pair_id, 'Products': len(products), 'Off-target': off_target,
+                     'On target': len(targets) > 0})
+    return rows
+
+
+def product_rows(results):
+    return [{'Pair': pair_id, **product} for pair_id, products in results for product in products]
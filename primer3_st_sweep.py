@@ -0,0 +1,107 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import itertools
+
+from primer3_st_args import st_default_values
+from primer3_st_batch import design_jobs
+from primer3_st_cache import design_cache, design_key
+from primer3_st_core import build_args
+from primer3_st_results import hierarchize
+from primer3_st_tiling import primer_penalty
+
+MAX_COMBINATIONS = 1000
+string_sweep_keys = ['PRIMER_PRODUCT_SIZE_RANGE']
+
+
+def sweep_keys():
+    keys = []
+    for key, value in st_default_values.items():
+        default = value.get('value')
+        if key.startswith('PRIMER_') and isinstance(default, (int, float)) and not isinstance(default, bool):
+            keys.append(key)
+    return sorted(keys + string_sweep_keys)
+
+
+def parse_sweep(key, text):
+    if key in string_sweep_keys:
+        values = [value.strip() for value in text.split(';')]
+    else:
+        cast = float if isinstance(st_default_values[key]['value'], float) else int
+        values = []
+        for item in text.split(','):
+            item = item.strip()
+            if ':' in item:
+                parts = [cast(x) for x in item.split(':')]
+                start, stop = parts[0], parts[1]
+                step = parts[2] if len(parts) > 2 else cast(1)
+                if step <= 0 or stop < start:
+                    raise ValueError(f'{key}: invalid range {item}')
+                values += [round(start + i * step, 10) for i in range(int(round((stop - start) / step, 10)) + 1)]
+            elif item != '':
+                values.append(cast(item))
+    values = list(dict.fromkeys(value for value in values if value != ''))
+    if len(values) == 0:
+        raise ValueError(f'{key}: no values')
+    return values
+
+
+def sweep_count(sweeps):
+    count = 1
+    for values in sweeps.values():
+        count *= len(values)
+    return count
+
+
+def sweep_grid(sweeps):
+    keys = list(sweeps)
+    return [dict(zip(keys, values)) for values in itertools.product(*sweeps.values())]
+
+
+def design_sweep(params, task, sweeps, max_workers=None, progress=None, cache=design_cache):
+    if sweep_count(sweeps) > MAX_COMBINATIONS:
+        raise ValueError(f'{sweep_count(sweeps)} combinations, the limit is {MAX_COMBINATIONS}')
+    # Settings that end up with the same primer3 arguments (e.g. weights
+    # that the task ignores) share a single design.
+    groups = {}
+    for settings in sweep_grid(sweeps):
+        seq_args, global_args, _, misprime_lib_name, mishyb_lib_name = build_args({**params, **settings}, task)
+        key = design_key(seq_args, global_args, misprime_lib_name, mishyb_lib_name)
+        if key not in groups:
+            groups[key] = ([], (seq_args, global_args, misprime_lib_name, mishyb_lib_name))
+        groups[key][0].append(settings)
+    run_numbers = {key: n for n, key in enumerate(groups, start=1)}
+    rows = []
+    jobs = ((key, *args) for key, (_, args) in groups.items())
+    for done, (key, primer3_results, error) in enumerate(design_jobs(jobs, max_workers, cache), start=1):
+        result = {'Pairs': 0, 'Best penalty': None, 'Error': None}
+        if error is not None:
+            result['Error'] = str(error)
+        else:
+            primers = hierarchize(primer3_results)
+            result['Pairs'] = len(primers['PRIMERS'])
+            if len(primers['PRIMERS']) > 0:
+                result['Best penalty'] = min(primer_penalty(primer) for primer in primers['PRIMERS'])
+            if 'ERROR' in primers:
+                result['Error'] = primers['ERROR']
+        for settings in groups[key][0]:
+            rows.append({**settings, 'Design': run_numbers[key], **result})
+        if progress is not None:
+            progress(done, len(groups))
+    rows.sort(key=lambda row: (row['Best penalty'] is None, row['Best penalty'] or 0, -row['Pairs']))
+    return rows
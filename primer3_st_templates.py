@@ -0,0 +1,255 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+
+# Templates are read straight from a memory map of the file, only the
+# requested slice is turned into a string. FASTA files use a samtools
+# style .fai index (name, length, offset, bases and bytes per line). An
+# up to date index next to the file is used as is, otherwise one is
+# written to the index directory.
+FAI_SUFFIX = '.fai'
+# Paths typed in the app are relative to TEMPLATE_DIR, without it the app
+# does not read templates from the server.
+TEMPLATE_DIR = os.environ.get('PRIMER3_ST_TEMPLATE_DIR')
+INDEX_DIR = os.environ.get('PRIMER3_ST_INDEX_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'primer3-streamlit', 'indexes'))
+TWOBIT_SIGNATURE = 0x1A412743
+TWOBIT_HEADER = struct.Struct('<IIII')
+MAX_FETCH = 50_000_000
+
+_twobit_bases = np.frombuffer(b'TCAG', dtype=np.uint8)
+_region = re.compile(r'^\s*([^:\s]+)(?::([\d,]+)-([\d,]+))?\s*$')
+
+_opened = {}
+_lock = threading.Lock()
+
+
+def parse_region(text):
+    # chrom:start-end with 1-based inclusive coordinates, or a bare name
+    # for the whole record. Returns 0-based half-open coordinates, end is
+    # None for the whole record.
+    match = _region.match(text)
+    if match is None:
+        raise ValueError(f'{text!r} is not a region, use name:start-end')
+    name, start, end = match.groups()
+    if start is None:
+        return name, 0, None
+    start, end = int(start.replace(',', '')), int(end.replace(',', ''))
+    if start < 1 or end < start:
+        raise ValueError(f'{text!r} is not a region, start has to be at least 1 and not after the end')
+    return name, start - 1, end
+
+
+def resolve_path(path, root, setting):
+    if not root:
+        raise ValueError(f'server files are not enabled, set {setting} to the directory holding them')
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f'{path} is outside the directory set by {setting}')
+    return resolved
+
+
+def template_path(path):
+    return resolve_path(path, TEMPLATE_DIR, 'PRIMER3_ST_TEMPLATE_DIR')
+
+
+def cached_index_path(path, suffix, index_dir=None):
+    # Named after the absolute path of the source, so files with the same
+    # name in different directories do not share an index
+    path = os.path.abspath(path)
+    digest = hashlib.sha256(path.encode()).hexdigest()[:16]
+    return os.path.join(index_dir or INDEX_DIR, f'{digest}-{os.path.basename(path)}{suffix}')
+
+
+def fai_path(path):
+    if not _is_stale(path + FAI_SUFFIX, path):
+        return path + FAI_SUFFIX
+    return cached_index_path(path, FAI_SUFFIX)
+
+
+def build_fai(path, index_path=None):
+    entries = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:2] == b'\x1f\x8b':
+            raise ValueError(f'{path} is compressed, templates have to be plain FASTA or 2bit files')
+        header = data.find(b'>')
+        while header != -1:
+            header_end = data.find(b'\n', header)
+            if header_end == -1:
+                header_end = len(data)
+            name = data[header + 1:header_end].split(None, 1)[0].decode()
+            seq_start = header_end + 1
+            next_header = data.find(b'\n>', header_end)
+            seq_end = len(data) if next_header == -1 else next_header + 1
+            while seq_end > seq_start and data[seq_end - 1:seq_end] in b'\r\n \t':
+                seq_end -= 1
+            line_end = data.find(b'\n', seq_start, seq_end)
+            if line_end == -1:
+                line_bytes = line_bases = seq_end - seq_start
+            else:
+                line_bytes = line_end - seq_start + 1
+                line_bases = line_bytes - (2 if data[line_end - 1:line_end] == b'\r' else 1)
+            n_bytes = seq_end - seq_start
+            length = n_bytes // line_bytes * line_bases + n_bytes % line_bytes if line_bytes > 0 else 0
+            entries.append(f'{name}\t{length}\t{seq_start}\t{line_bases}\t{line_bytes}\n')
+            header = -1 if next_header == -1 else next_header + 1
+    index_path = index_path or cached_index_path(path, FAI_SUFFIX)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f'{index_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.writelines(entries)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+class FastaTemplate:
+    def __init__(self, path):
+        self.path = path
+        index_path = fai_path(path)
+        if _is_stale(index_path, path):
+            build_fai(path, index_path)
+        self.records = {}
+        with open(index_path) as f:
+            for line in f:
+                name, length, offset, line_bases, line_bytes = line.split('\t')[:5]
+                self.records[name] = (int(length), int(offset), int(line_bases), int(line_bytes))
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def length(self, name):
+        return self.records[name][0]
+
+    def fetch(self, name, start, end):
+        length, offset, line_bases, line_bytes = self.records[name]
+        if start >= end:
+            return ''
+        first = offset + start // line_bases * line_bytes + start % line_bases
+        last = offset + (end - 1) // line_bases * line_bytes + (end - 1) % line_bases
+        return self._map[first:last + 1].translate(None, b'\r\n').decode('ascii')
+
+    def close(self):
+        self._map.close()
+
+
+class TwoBitTemplate:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for order in '<>':
+            signature, version, count, _ = struct.unpack_from(order + 'IIII', self._map, 0)
+            if signature == TWOBIT_SIGNATURE:
+                break
+        else:
+            self._map.close()
+            raise ValueError(f'{path} is not a 2bit file')
+        self._order = order
+        offset_format = order + ('Q' if version == 1 else 'I')
+        self.records = {}
+        self._headers = {}
+        position = TWOBIT_HEADER.size
+        for _ in range(count):
+            name_size = self._map[position]
+            name = self._map[position + 1:position + 1 + name_size].decode()
+            position += 1 + name_size
+            self.records[name] = struct.unpack_from(offset_format, self._map, position)[0]
+            position += struct.calcsize(offset_format)
+
+    def _header(self, name):
+        # dnaSize, the N blocks, the lower case blocks and the offset of the
+        # packed bases, read once per record.
+        if name not in self._headers:
+            position = self.records[name]
+            dna_size, n_count = struct.unpack_from(self._order + 'II', self._map, position)
+            position += 8
+            n_blocks = np.frombuffer(self._map, dtype=self._order + 'u4', count=2 * n_count, offset=position)
+            position += 8 * n_count
+            mask_count = struct.unpack_from(self._order + 'I', self._map, position)[0]
+            position += 4
+            mask_blocks = np.frombuffer(self._map, dtype=self._order + 'u4', count=2 * mask_count, offset=position)
+            position += 8 * mask_count + 4
+            self._headers[name] = (dna_size, n_blocks.reshape(2, n_count).astype(np.int64),
+                                   mask_blocks.reshape(2, mask_count).astype(np.int64), position)
+        return self._headers[name]
+
+    def length(self, name):
+        return self._header(name)[0]
+
+    def fetch(self, name, start, end):
+        _, n_blocks, mask_blocks, packed = self._header(name)
+        if start >= end:
+            return ''
+        data = np.frombuffer(self._map, dtype=np.uint8, count=(end + 3) // 4 - start // 4, offset=packed + start // 4)
+        codes = np.stack([data >> 6, data >> 4, data >> 2, data]).T.ravel() & 3
+        seq = _twobit_bases[codes[start % 4:start % 4 + end - start]]
+        for (block_starts, block_sizes), value in [(n_blocks, None), (mask_blocks, 32)]:
+            for block_start, block_size in zip(block_starts, block_sizes):
+                lo, hi = max(block_start, start), min(block_start + block_size, end)
+                if lo < hi:
+                    if value is None:
+                        seq[lo - start:hi - start] = ord('N')
+                    else:
+                        seq[lo - start:hi - start] |= value
+        return seq.tobytes().decode('ascii')
+
+    def close(self):
+        del self._headers
+        self._map.close()
+
+
+def _is_stale(path, source):
+    try:
+        return os.path.getmtime(path) < os.path.getmtime(source)
+    except OSError:
+        return True
+
+
+def open_template(path):
+    path = os.path.abspath(path)
+    with _lock:
+        key = (path, os.path.getmtime(path))
+        if key not in _opened:
+            for old_key in [old_key for old_key in _opened if old_key[0] == path]:
+                del _opened[old_key]
+            _opened[key] = TwoBitTemplate(path) if path.lower().endswith('.2bit') else FastaTemplate(path)
+        return _opened[key]
+
+
+def fetch_region(path, region, flank=0):
+    # Returns the sequence ID, the region plus flanks clipped to the record,
+    # and the 0-based start and length of the region inside that slice.
+    template = open_template(path)
+    name, start, end = parse_region(region)
+    if name not in template.records:
+        raise ValueError(f'{name} is not a record of {os.path.basename(path)}')
+    length = template.length(name)
+    end = length if end is None else end
+    if end > length:
+        raise ValueError(f'{region} ends after the end of {name} ({length} bases)')
+    slice_start, slice_end = max(start - flank, 0), min(end + flank, length)
+    if slice_end - slice_start > MAX_FETCH:
+        raise ValueError(f'{region} with flanks is longer than {MAX_FETCH} bases')
+    return f'{name}:{start + 1}-{end}', template.fetch(name, slice_start, slice_end), (start - slice_start, end - start)
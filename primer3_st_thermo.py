@@ -0,0 +1,185 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from primer3.bindings import calc_end_stability, calc_hairpin, calc_heterodimer, calc_homodimer, calc_tm
+
+from primer3_st_batch import get_executor
+
+CHUNK_SIZE = 2000
+# Fewer missing values than this are calculated in the calling process
+POOL_THRESHOLD = 500
+tm_methods = ['breslauer', 'santalucia']
+salt_correction_methods = ['schildkraut', 'santalucia', 'owczarzy']
+# Kinds taking two sequences whose order does not matter
+symmetric_kinds = ['heterodimer']
+
+
+def thermo_conditions(global_args, temp_c=37.0):
+    return (float(global_args.get('PRIMER_SALT_MONOVALENT', 50.0)), float(global_args.get('PRIMER_SALT_DIVALENT', 1.5)),
+            float(global_args.get('PRIMER_DNTP_CONC', 0.6)), float(global_args.get('PRIMER_DNA_CONC', 50.0)),
+            float(temp_c), tm_methods[global_args.get('PRIMER_TM_FORMULA', 1)],
+            salt_correction_methods[global_args.get('PRIMER_SALT_CORRECTIONS', 1)])
+
+
+def calculate(kind, seqs, conditions):
+    mv_conc, dv_conc, dntp_conc, dna_conc, temp_c, tm_method, salt_corrections = conditions
+    if kind not in ['tm', 'hairpin', 'homodimer', 'heterodimer', 'end_stability']:
+        raise ValueError(f'Unknown thermodynamic calculation: {kind}')
+    try:
+        if kind == 'tm':
+            return calc_tm(seqs[0], mv_conc, dv_conc, dntp_conc, dna_conc, tm_method=tm_method,
+                           salt_corrections_method=salt_corrections)
+        if kind == 'hairpin':
+            result = calc_hairpin(seqs[0], mv_conc, dv_conc, dntp_conc, dna_conc, temp_c)
+        elif kind == 'homodimer':
+            result = calc_homodimer(seqs[0], mv_conc, dv_conc, dntp_conc, dna_conc, temp_c)
+        elif kind == 'heterodimer':
+            result = calc_heterodimer(seqs[0], seqs[1], mv_conc, dv_conc, dntp_conc, dna_conc, temp_c)
+        else:
+            result = calc_end_stability(seqs[0], seqs[1], mv_conc, dv_conc, dntp_conc, dna_conc, temp_c)
+    except (RuntimeError, ValueError):
+        # e.g. both sequences longer than the 60 bases primer3 aligns
+        return None if kind == 'tm' else [None, None]
+    # dG in cal/mol, Tm only if a structure was found
+    return [result.dg, result.tm if result.structure_found else None]
+
+
+def calculate_chunk(requests, conditions):
+    return [calculate(kind, seqs, conditions) for kind, seqs in requests]
+
+
+class ThermoCalculator:
+    def __init__(self, max_entries=500000, store_path=None):
+        self.max_entries = max_entries
+        self.store_path = store_path
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = None
+        if store_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(store_path)), exist_ok=True)
+            self._store = sqlite3.connect(store_path, check_same_thread=False)
+            self._store.execute('CREATE TABLE IF NOT EXISTS thermo (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._store.commit()
+
+    @staticmethod
+    def key(kind, seqs, conditions):
+        if kind in symmetric_kinds:
+            seqs = sorted(seqs)
+        return '|'.join([kind, *seqs, *(str(value) for value in conditions)])
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            self.hits += len(found)
+            missing = [key for key in keys if key not in found]
+            if self._store is not None and missing:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = self._store.execute(
+                        f'SELECT key, value FROM thermo WHERE key IN ({",".join("?" * len(chunk))})', chunk)
+                    for key, value in rows:
+                        found[key] = json.loads(value)
+                        self.store_hits += 1
+                        self._remember(key, found[key])
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._remember(key, value)
+            if self._store is not None:
+                self._store.executemany('INSERT OR REPLACE INTO thermo VALUES (?, ?)',
+                                        [(key, json.dumps(value)) for key, value in values.items()])
+                self._store.commit()
+
+    def calculate(self, requests, conditions, max_workers=None, progress=None):
+        # requests are (kind, sequences) tuples. Cached values are returned
+        # directly, the missing ones are calculated once each, in chunks on
+        # the process pool when there are many of them.
+        keys = [self.key(kind, seqs, conditions) for kind, seqs in requests]
+        values = self.get_many(list(dict.fromkeys(keys)))
+        missing = {}
+        for key, (kind, seqs) in zip(keys, requests):
+            if key not in values and key not in missing:
+                missing[key] = (kind, tuple(sorted(seqs)) if kind in symmetric_kinds else tuple(seqs))
+        if progress is not None:
+            progress(done=0, total=len(missing))
+        if len(missing) < POOL_THRESHOLD:
+            calculated = dict(zip(missing, calculate_chunk(list(missing.values()), conditions)))
+            self.put_many(calculated)
+            values.update(calculated)
+            if progress is not None:
+                progress(done=len(missing))
+            return [values[key] for key in keys]
+        executor = get_executor(max_workers)
+        missing_keys = list(missing)
+        pending = {}
+        for start in range(0, len(missing_keys), CHUNK_SIZE):
+            chunk = missing_keys[start:start + CHUNK_SIZE]
+            pending[executor.submit(calculate_chunk, [missing[key] for key in chunk], conditions)] = chunk
+        done_count = 0
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = pending.pop(future)
+                    calculated = dict(zip(chunk, future.result()))
+                    self.put_many(calculated)
+                    values.update(calculated)
+                    done_count += len(chunk)
+                    if progress is not None:
+                        progress(done=done_count)
+        finally:
+            for future in pending:
+                future.cancel()
+        return [values[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.store_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'store_hits': self.store_hits, 'misses': self.misses,
+                    'entries': len(self._entries)}
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_cache_dir = os.environ.get('PRIMER3_ST_CACHE_DIR')
+thermo = ThermoCalculator(store_path=os.path.join(_cache_dir, 'thermo.sqlite') if _cache_dir else None)
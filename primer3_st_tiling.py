@@ -0,0 +1,153 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+from primer3_st_batch import design_batch
+from primer3_st_core import hierarchize
+
+oligo_types = ['LEFT', 'INTERNAL', 'RIGHT']
+
+
+def check_tiling(window, overlap, targets=()):
+    if window <= 0 or not 0 <= overlap < window:
+        raise ValueError(f'the overlap ({overlap}) must be smaller than the window ({window})')
+    too_long = [f'{start},{length}' for start, length in targets if length > window]
+    if len(too_long) > 0:
+        raise ValueError(f'targets longer than the window ({window}): ' + ' '.join(too_long))
+
+
+def tile_windows(seq_length, window, overlap):
+    check_tiling(window, overlap)
+    start = 0
+    while True:
+        end = min(start + window, seq_length)
+        yield start, end
+        if end >= seq_length:
+            break
+        start += window - overlap
+
+
+def tile_count(seq_length, window, overlap):
+    check_tiling(window, overlap)
+    if seq_length <= window:
+        return 1
+    stride = window - overlap
+    return -(-(seq_length - window) // stride) + 1
+
+
+def window_regions(seq_args, start, end):
+    # Region coordinates are shifted into the window. Excluded and included
+    # regions are clipped, targets must lie entirely inside the window.
+    # None means the window cannot satisfy the requested regions.
+    first_base = seq_args.get('PRIMER_FIRST_BASE_INDEX', 1)
+    window_args = {}
+    for region in ['SEQUENCE_EXCLUDED_REGION', 'SEQUENCE_INCLUDED_REGION', 'SEQUENCE_TARGET']:
+        if region not in seq_args:
+            continue
+        shifted = []
+        for r_start, r_length in seq_args[region]:
+            r_start -= first_base
+            r_end = r_start + r_length
+            if region == 'SEQUENCE_TARGET':
+                if r_start >= start and r_end <= end:
+                    shifted.append([r_start - start + first_base, r_length])
+            elif r_end > start and r_start < end:
+                clipped_start = max(r_start, start)
+                shifted.append([clipped_start - start + first_base, min(r_end, end) - clipped_start])
+        if len(shifted) == 0 and region != 'SEQUENCE_EXCLUDED_REGION':
+            return None
+        window_args[region] = shifted
+    return window_args
+
+
+def parse_explain(explain):
+    counts = {}
+    for item in explain.split(','):
+        label, _, count = item.strip().rpartition(' ')
+        if count.isdigit():
+            counts[label] = counts.get(label, 0) + int(count)
+    return counts
+
+
+def merge_explain(merged, explain):
+    for key, value in explain.items():
+        counts = merged.setdefault(key, {})
+        for label, count in parse_explain(value).items():
+            counts[label] = counts.get(label, 0) + count
+
+
+def primer_penalty(primer):
+    if 'PAIR' in primer:
+        return primer['PAIR'].get('PENALTY', 0)
+    return sum(primer[pt].get('PENALTY', 0) for pt in oligo_types if pt in primer)
+
+
+def design_tiled(seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None, window=5000, overlap=1000,
+                 max_workers=None, progress=None):
+    check_tiling(window, overlap, seq_args.get('SEQUENCE_TARGET', []))
+    seq = seq_args['SEQUENCE_TEMPLATE']
+    seq_id = seq_args.get('SEQUENCE_ID', '')
+    base_args = {k: v for k, v in seq_args.items()
+                 if k not in ['SEQUENCE_TEMPLATE', 'SEQUENCE_EXCLUDED_REGION', 'SEQUENCE_INCLUDED_REGION', 'SEQUENCE_TARGET']}
+    region_args = dict(seq_args)
+    region_args['PRIMER_FIRST_BASE_INDEX'] = global_args.get('PRIMER_FIRST_BASE_INDEX', 1)
+    offsets = {}
+
+    def records():
+        for start, end in tile_windows(len(seq), window, overlap):
+            window_args = window_regions(region_args, start, end)
+            if window_args is None:
+                continue
+            window_id = f'{seq_id}:{start + 1}-{end}'
+            offsets[window_id] = start
+            yield window_id, seq[start:end], window_args
+
+    merged = {'PRIMERS': [], 'EXPLAIN': {}, 'TILES': 0}
+    explain_counts = {}
+    warnings = []
+    seen = set()
+    for window_id, primer3_results, error in design_batch(records(), base_args, global_args, misprime_lib_name,
+                                                          mishyb_lib_name, max_workers):
+        merged['TILES'] += 1
+        if progress is not None:
+            progress(merged['TILES'])
+        if error is not None:
+            warnings.append(f'{window_id}: {error}')
+            continue
+        primers = hierarchize(primer3_results)
+        offset = offsets.pop(window_id)
+        if 'WARNING' in primers:
+            warnings.append(f'{window_id}: {primers["WARNING"]}')
+        if 'ERROR' in primers:
+            warnings.append(f'{window_id}: {primers["ERROR"]}')
+        merge_explain(explain_counts, primers['EXPLAIN'])
+        for primer in primers['PRIMERS']:
+            for pt in oligo_types:
+                if pt in primer:
+                    primer[pt]['POSITION'] += offset
+            key = tuple((pt, primer[pt]['POSITION'], primer[pt]['LENGTH']) for pt in oligo_types if pt in primer)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged['PRIMERS'].append(primer)
+    merged['PRIMERS'].sort(key=primer_penalty)
+    for key, counts in explain_counts.items():
+        merged['EXPLAIN'][key] = ', '.join(f'{label} {count}' for label, count in counts.items())
+    if merged['TILES'] == 0:
+        warnings.append(f'No window of {window} bases fits the targets and included regions')
+    if len(warnings) > 0:
+        merged['WARNING'] = '; '.join(warnings)
+    return merged
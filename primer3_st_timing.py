@@ -0,0 +1,75 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import datetime
+import json
+import os
+import time
+from contextlib import contextmanager
+
+TIMING_LOG = os.environ.get('PRIMER3_ST_TIMING_LOG')
+
+
+class RunTimer:
+    def __init__(self, **info):
+        self.info = info
+        self.started = time.time()
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    def add(self, stage, seconds):
+        if stage not in self.stages:
+            self.stages[stage] = {'seconds': 0.0, 'calls': 0}
+        self.stages[stage]['seconds'] += seconds
+        self.stages[stage]['calls'] += 1
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def total(self):
+        return time.perf_counter() - self._start
+
+    def rows(self):
+        total = self.total()
+        rows = []
+        for stage, timing in self.stages.items():
+            rows.append({'Stage': stage,
+                         'Calls': timing['calls'],
+                         'ms': round(timing['seconds'] * 1000, 2),
+                         '% of run': round(timing['seconds'] / total * 100, 1) if total > 0 else 0.0})
+        rows.append({'Stage': 'total', 'Calls': 1, 'ms': round(total * 1000, 2), '% of run': 100.0})
+        return rows
+
+    def record(self):
+        return {'date': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                **self.info,
+                'total_ms': round(self.total() * 1000, 3),
+                'stages': {stage: {'ms': round(timing['seconds'] * 1000, 3), 'calls': timing['calls']}
+                           for stage, timing in self.stages.items()}}
+
+    def write_log(self, path=None):
+        path = path or TIMING_LOG
+        if not path:
+            return
+        with open(path, 'a') as handle:
+            handle.write(json.dumps(self.record()) + '\n')
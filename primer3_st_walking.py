@@ -0,0 +1,191 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+from primer3_st_batch import design_jobs
+from primer3_st_core import hierarchize
+from primer3_st_tiling import merge_explain, window_regions
+
+strands = {'LEFT': 'Forward', 'RIGHT': 'Reverse'}
+
+
+def walk_regions(seq_args, first_base=1):
+    # Each target is walked on its own, without targets the whole template.
+    if len(seq_args.get('SEQUENCE_TARGET', [])) == 0:
+        return [(0, len(seq_args['SEQUENCE_TEMPLATE']))]
+    return sorted((start - first_base, start - first_base + length) for start, length in seq_args['SEQUENCE_TARGET'])
+
+
+def walk_positions(start, end, spacing, interval, reverse=False):
+    # Forward reads start at the region start and every spacing bases after
+    # it, reverse reads end interval bases after each forward read start.
+    # Positions are 0-based, the first readable base of a forward read and
+    # the last readable base of a reverse read.
+    if spacing <= 0:
+        raise ValueError('Primer walking needs a positive spacing')
+    for position in range(start, end, spacing):
+        yield 'LEFT', position
+    if reverse:
+        position = start + interval
+        while True:
+            yield 'RIGHT', position
+            if position >= end - 1:
+                break
+            position += spacing
+
+
+def walk_count(seq_args, spacing, interval, reverse=False, first_base=1):
+    return sum(1 for start, end in walk_regions(seq_args, first_base)
+               for _ in walk_positions(start, end, spacing, interval, reverse))
+
+
+def primer_window(pt, position, seq_length, lead, accuracy, max_size):
+    if pt == 'LEFT':
+        end = position - lead
+        start = end - accuracy - max_size
+    else:
+        start = position + lead + 1
+        end = start + accuracy + max_size
+    return max(start, 0), min(end, seq_length)
+
+
+def read_span(oligo, pt, seq_length, lead, read_length, first_base=1):
+    if pt == 'LEFT':
+        read_start = oligo['POSITION'] - first_base + oligo['LENGTH'] + lead
+        return min(read_start, seq_length), min(read_start + read_length, seq_length)
+    read_end = oligo['POSITION'] - first_base - oligo['LENGTH'] + 1 - lead
+    return max(read_end - read_length, 0), max(read_end, 0)
+
+
+def coverage_gaps(regions, reads, reverse=False):
+    # Splits each region at every read boundary and labels the pieces by the
+    # strands that read them. Without reverse primers only unread pieces are
+    # gaps, with them pieces read on one strand only are reported as well.
+    gaps = []
+    for start, end in regions:
+        bounds = {start, end}
+        for _, read_start, read_end in reads:
+            bounds.update(b for b in (read_start, read_end) if start < b < end)
+        bounds = sorted(bounds)
+        for piece_start, piece_end in zip(bounds, bounds[1:]):
+            read_by = {pt for pt, read_start, read_end in reads if read_start <= piece_start and read_end >= piece_end}
+            if len(read_by) == 0:
+                coverage = 'None'
+            elif reverse and len(read_by) == 1:
+                coverage = f'{strands[read_by.pop()]} only'
+            else:
+                continue
+            if len(gaps) > 0 and gaps[-1][1] == piece_start and gaps[-1][2] == coverage:
+                gaps[-1][1] = piece_end
+            else:
+                gaps.append([piece_start, piece_end, coverage])
+    return gaps
+
+
+def design_walk(seq_args, global_args, misprime_lib_name=None, mishyb_lib_name=None, lead=50, spacing=500, interval=250,
+                accuracy=20, reverse=False, read_length=700, max_workers=None, progress=None):
+    seq = seq_args['SEQUENCE_TEMPLATE']
+    seq_id = seq_args.get('SEQUENCE_ID', '')
+    first_base = global_args.get('PRIMER_FIRST_BASE_INDEX', 1)
+    min_size = global_args.get('PRIMER_MIN_SIZE', 18)
+    max_size = global_args.get('PRIMER_MAX_SIZE', 27)
+    if lead < 0 or accuracy < 0 or read_length <= 0:
+        raise ValueError('Primer walking needs a positive read length, lead and accuracy')
+    base_args = {k: v for k, v in seq_args.items()
+                 if k not in ['SEQUENCE_TEMPLATE', 'SEQUENCE_EXCLUDED_REGION', 'SEQUENCE_INCLUDED_REGION', 'SEQUENCE_TARGET']}
+    region_args = {'PRIMER_FIRST_BASE_INDEX': first_base}
+    if 'SEQUENCE_EXCLUDED_REGION' in seq_args:
+        region_args['SEQUENCE_EXCLUDED_REGION'] = seq_args['SEQUENCE_EXCLUDED_REGION']
+    walk_args = {}
+    for pt in strands:
+        walk_args[pt] = dict(global_args)
+        walk_args[pt].update({'PRIMER_TASK': 'generic', 'PRIMER_PICK_LEFT_PRIMER': int(pt == 'LEFT'),
+                              'PRIMER_PICK_INTERNAL_OLIGO': 0, 'PRIMER_PICK_RIGHT_PRIMER': int(pt == 'RIGHT'),
+                              'PRIMER_NUM_RETURN': 1})
+    regions = walk_regions(seq_args, first_base)
+    positions = [(pt, position) for start, end in regions for pt, position in walk_positions(start, end, spacing, interval, reverse)]
+    offsets = {}
+    notes = {}
+
+    def jobs():
+        for pt, position in positions:
+            start, end = primer_window(pt, position, len(seq), lead, accuracy, max_size)
+            if end - start < min_size:
+                notes[pt, position] = 'Outside the template'
+                continue
+            offsets[pt, position] = start
+            window_args = dict(base_args, **window_regions(region_args, start, end))
+            window_args['SEQUENCE_ID'] = f'{seq_id}:{start + 1}-{end}'
+            window_args['SEQUENCE_TEMPLATE'] = seq[start:end]
+            yield (pt, position), window_args, walk_args[pt], misprime_lib_name, mishyb_lib_name
+
+    merged = {'PRIMERS': [], 'EXPLAIN': {}, 'POSITIONS': len(positions)}
+    explain_counts = {}
+    warnings = []
+    picked = {}
+    done = 0
+    for job_id, primer3_results, error in design_jobs(jobs(), max_workers):
+        done += 1
+        if progress is not None:
+            progress(done)
+        if error is not None:
+            notes[job_id] = str(error)
+            continue
+        primers = hierarchize(primer3_results)
+        if 'ERROR' in primers:
+            notes[job_id] = primers['ERROR']
+            continue
+        merge_explain(explain_counts, primers['EXPLAIN'])
+        if len(primers['PRIMERS']) == 0:
+            notes[job_id] = 'No primer found'
+            continue
+        primer = primers['PRIMERS'][0]
+        primer[job_id[0]]['POSITION'] += offsets[job_id]
+        picked[job_id] = primer
+    if progress is not None:
+        progress(len(positions))
+
+    walk = []
+    reads = []
+    seen = {}
+    for pt, position in sorted(positions, key=lambda p: (p[1], p[0])):
+        row = {'Walk': len(walk) + 1, 'Strand': strands[pt], 'Start': None, 'Length': None, 'Sequence': '',
+               'Tm': None, 'Penalty': None, 'Read from': None, 'Read to': None, 'Note': notes.get((pt, position), '')}
+        if (pt, position) in picked:
+            primer = picked[pt, position]
+            oligo = primer[pt]
+            read_start, read_end = read_span(oligo, pt, len(seq), lead, read_length, first_base)
+            reads.append((pt, read_start, read_end))
+            row.update({'Start': oligo['POSITION'], 'Length': oligo['LENGTH'], 'Sequence': oligo['SEQUENCE'],
+                        'Tm': round(oligo['TM'], 1), 'Penalty': round(oligo['PENALTY'], 3),
+                        'Read from': read_start + first_base, 'Read to': read_end - 1 + first_base})
+            key = (pt, oligo['POSITION'], oligo['LENGTH'])
+            if key in seen:
+                row['Note'] = f'Same primer as walk {seen[key]}'
+            else:
+                seen[key] = row['Walk']
+                merged['PRIMERS'].append(primer)
+        elif row['Note'] != '':
+            warnings.append(f'{strands[pt]} walk at {position + first_base}: {row["Note"]}')
+        walk.append(row)
+    merged['WALK'] = walk
+    merged['GAPS'] = [{'Start': start + first_base, 'End': end - 1 + first_base, 'Length': end - start, 'Coverage': coverage}
+                      for start, end, coverage in coverage_gaps(regions, reads, reverse)]
+    for key, counts in explain_counts.items():
+        merged['EXPLAIN'][key] = ', '.join(f'{label} {count}' for label, count in counts.items())
+    if len(warnings) > 0:
+        merged['WARNING'] = '; '.join(warnings)
+    return merged
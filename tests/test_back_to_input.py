@@ -0,0 +1,46 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from primer3_st_core import changed_params
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Primer3-Streamlit.py')
+
+
+def test_changed_params_keeps_reset_preset_value():
+    params = {'PRIMER_MAX_POLY_X': 4, 'PRIMER_OPT_SIZE': 20}
+    assert changed_params(params) == {}
+    assert changed_params(params, {'PRIMER_MAX_POLY_X': 3}) == {'PRIMER_MAX_POLY_X': 4}
+
+
+def test_back_keeps_setting_reset_after_preset(monkeypatch):
+    monkeypatch.setenv('PRIMER3_ST_HISTORY', '')
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    at.button[[b.label for b in at.button].index('Load Example')].click().run()
+    at.selectbox(key='SCRIPT_SETTINGS_PRESET').set_value('qPCR').run()
+    assert at.number_input(key='PRIMER_MAX_POLY_X').value == 3
+    at.number_input(key='PRIMER_MAX_POLY_X').set_value(4)
+    at.button(key='PICK_PRIMERS').click().run()
+    assert not at.exception
+    at.button[[b.label for b in at.button].index('< Back')].click().run()
+    assert not at.exception
+    assert at.number_input(key='PRIMER_MAX_POLY_X').value == 4
@@ -0,0 +1,67 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import io
+
+from primer3_st_boulder import read_jobs, read_records, read_settings, record_text, split_record, write_settings
+
+RECORDS = ('SEQUENCE_ID=one\n'
+           'SEQUENCE_TEMPLATE=ACGTACGTACGT\n'
+           'SEQUENCE_TARGET=3,4 8,2\n'
+           'PRIMER_PRODUCT_SIZE_RANGE=100-200 200-300\n'
+           'PRIMER_OPT_SIZE=20\n'
+           'PRIMER_MISPRIMING_LIBRARY=HUMAN\n'
+           '=\n'
+           'SEQUENCE_ID=two\n'
+           'SEQUENCE_TEMPLATE=TTTTGGGG\n'
+           'PRIMER_OPT_TM=61.5\n'
+           '=\n')
+
+
+def test_read_write_round_trip():
+    records = list(read_records(io.StringIO(RECORDS)))
+    assert [record['SEQUENCE_ID'] for record in records] == ['one', 'two']
+    text = ''.join(record_text(record) for record in records)
+    assert text == RECORDS
+    seq_args, global_args, misprime_lib_name, _ = split_record(records[0])
+    assert seq_args['SEQUENCE_TARGET'] == [[3, 4], [8, 2]]
+    assert global_args['PRIMER_PRODUCT_SIZE_RANGE'] == [[100, 200], [200, 300]]
+    assert misprime_lib_name == 'HUMAN'
+    assert record_text(seq_args, global_args) == ('SEQUENCE_ID=one\n'
+                                                  'SEQUENCE_TEMPLATE=ACGTACGTACGT\n'
+                                                  'SEQUENCE_TARGET=3,4 8,2\n'
+                                                  'PRIMER_PRODUCT_SIZE_RANGE=100-200 200-300\n'
+                                                  'PRIMER_OPT_SIZE=20\n'
+                                                  '=\n')
+
+
+def test_read_jobs_keeps_primer_tags_for_following_records():
+    jobs = list(read_jobs(io.StringIO(RECORDS), {'PRIMER_MAX_SIZE': 25}))
+    _, seq_args, global_args, misprime_lib_name, _ = jobs[1]
+    assert seq_args == {'SEQUENCE_ID': 'two', 'SEQUENCE_TEMPLATE': 'TTTTGGGG'}
+    assert global_args == {'PRIMER_MAX_SIZE': 25, 'PRIMER_PRODUCT_SIZE_RANGE': [[100, 200], [200, 300]],
+                           'PRIMER_OPT_SIZE': 20, 'PRIMER_OPT_TM': 61.5}
+    assert misprime_lib_name == 'HUMAN'
+
+
+def test_settings_round_trip():
+    global_args = {'PRIMER_OPT_SIZE': 20, 'PRIMER_MAX_TM': 63.5, 'PRIMER_PICK_INTERNAL_OLIGO': True,
+                   'PRIMER_MISPRIMING_LIBRARY': 'RODENT'}
+    handle = io.StringIO()
+    write_settings(handle, global_args)
+    handle.seek(0)
+    assert read_settings(handle) == {**global_args, 'PRIMER_PICK_INTERNAL_OLIGO': 1}
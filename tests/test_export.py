@@ -0,0 +1,71 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import csv
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from primer3_st_export import columns, export_bytes, primer_rows
+
+PRIMERS = {'PRIMERS': [{'LEFT': {'SEQUENCE': 'ACGTACGTACGTACGTAC', 'POSITION': 10, 'LENGTH': 18, 'TM': 59.5,
+                                 'GC_PERCENT': 50.0, 'SELF_ANY_TH': 1.5, 'PENALTY': 0.5},
+                        'RIGHT': {'SEQUENCE': 'TTGCAACGTTGCAACGTT', 'POSITION': 210, 'LENGTH': 18, 'TM': 60.1,
+                                  'PENALTY': 0.25},
+                        'PAIR': {'PRODUCT_SIZE': 201, 'PENALTY': 0.75, 'COMPL_ANY_TH': 2.0}},
+                       {'LEFT': {'SEQUENCE': 'GGGCCCAAATTTGGGCCC', 'POSITION': 30, 'LENGTH': 18, 'TM': 61.0,
+                                 'PENALTY': 1.0}}],
+           'EXPLAIN': {}}
+
+
+def expected_rows():
+    names = [name for name, _ in columns]
+    return [dict(zip(names, row)) for row in primer_rows('seq1', PRIMERS)]
+
+
+def test_primer_rows():
+    rows = expected_rows()
+    assert [(row['PAIR'], row['OLIGO']) for row in rows] == [(1, 'LEFT'), (1, 'RIGHT'), (2, 'LEFT')]
+    assert rows[0]['SELF_ANY'] == 1.5 and rows[0]['HAIRPIN'] is None
+    assert rows[1]['PRODUCT_SIZE'] == 201 and rows[2]['PRODUCT_SIZE'] is None
+
+
+@pytest.mark.parametrize('export_format, delimiter', [('CSV', ','), ('TSV', '\t')])
+def test_delimited_round_trip(export_format, delimiter):
+    data = export_bytes(primer_rows('seq1', PRIMERS), export_format)
+    rows = list(csv.DictReader(io.StringIO(data.decode()), delimiter=delimiter))
+    expected = [{name: '' if value is None else str(value) for name, value in row.items()} for row in expected_rows()]
+    assert rows == expected
+
+
+@pytest.mark.parametrize('export_format', ['Parquet', 'Arrow'])
+def test_arrow_round_trip(export_format):
+    data = export_bytes(primer_rows('seq1', PRIMERS), export_format)
+    if export_format == 'Parquet':
+        table = pq.read_table(io.BytesIO(data))
+    else:
+        table = pa.ipc.open_file(io.BytesIO(data)).read_all()
+    assert table.schema.names == [name for name, _ in columns]
+    assert table.schema.field('PAIR').type == pa.int32()
+    assert table.to_pylist() == expected_rows()
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        export_bytes([], 'XLSX')
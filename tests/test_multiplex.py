@@ -0,0 +1,45 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from primer3_st_multiplex import matrix_rows, select_panel
+
+
+def alternate(number, left, right, penalty):
+    return {'Alternate': number, 'Oligos': {'LEFT': left, 'RIGHT': right}, 'Penalty': penalty}
+
+
+def test_select_panel_avoids_cross_dimers():
+    targets = [('a', [alternate(1, 'A1L', 'A1R', 0.1), alternate(2, 'A2L', 'A2R', 0.5)]),
+               ('b', [alternate(1, 'B1L', 'B1R', 0.2)])]
+    index = {seq: i for i, seq in enumerate(['A1L', 'A1R', 'A2L', 'A2R', 'B1L', 'B1R'])}
+    matrix = np.full((6, 6), -2000.0)
+    # The best alternate of a dimerizes with the only one of b
+    matrix[index['A1L'], index['B1R']] = matrix[index['B1R'], index['A1L']] = -12000.0
+    panel = select_panel(targets, matrix, index, min_dg=-9000.0)
+    assert [(entry['Target'], entry['Alternate'], entry['Compatible']) for entry in panel] == [
+        ('a', 2, True), ('b', 1, True)]
+    assert panel[0]['Worst dG (kcal/mol)'] == -2.0
+
+    matrix[index['A2R'], index['B1L']] = matrix[index['B1L'], index['A2R']] = -15000.0
+    panel = select_panel(targets, matrix, index, min_dg=-9000.0)
+    assert [(entry['Alternate'], entry['Partner'], entry['Compatible']) for entry in panel] == [
+        (1, 'b', False), (1, 'a', False)]
+    rows = matrix_rows(panel, matrix, index)
+    assert [row['Oligo'] for row in rows] == ['a L', 'a R', 'b L', 'b R']
+    assert rows[0]['b R'] == -12.0
@@ -0,0 +1,49 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+from primer3_st_core import pair_summary
+from primer3_st_results import as_dict, hierarchize
+
+PRIMER3_RESULTS = {'PRIMER_LEFT_EXPLAIN': 'considered 10, ok 2',
+                   'PRIMER_PAIR_NUM_RETURNED': 2,
+                   'PRIMER_PAIR_0_PENALTY': 0.5, 'PRIMER_PAIR_0_PRODUCT_SIZE': 120,
+                   'PRIMER_LEFT_0_SEQUENCE': 'ACGTACGTACGTACGTAC', 'PRIMER_LEFT_0': [10, 18], 'PRIMER_LEFT_0_TM': 59.54,
+                   'PRIMER_RIGHT_0_SEQUENCE': 'TTGCAACGTTGCAACGTT', 'PRIMER_RIGHT_0': [129, 18],
+                   'PRIMER_RIGHT_0_TM': 60.06,
+                   'PRIMER_PAIR_1_PENALTY': 0.9, 'PRIMER_PAIR_1_PRODUCT_SIZE': 130,
+                   'PRIMER_LEFT_1_SEQUENCE': 'CGTACGTACGTACGTACG', 'PRIMER_LEFT_1': [11, 18], 'PRIMER_LEFT_1_TM': 58.96,
+                   'PRIMER_RIGHT_1_SEQUENCE': 'GTTGCAACGTTGCAACGT', 'PRIMER_RIGHT_1': [140, 18],
+                   'PRIMER_RIGHT_1_TM': 59.5}
+
+
+def test_hierarchize():
+    primers = as_dict(hierarchize(PRIMER3_RESULTS))
+    assert primers['EXPLAIN'] == {'PRIMER_LEFT': 'considered 10, ok 2'}
+    assert len(primers['PRIMERS']) == 2
+    assert primers['PRIMERS'][1]['LEFT'] == {'SEQUENCE': 'CGTACGTACGTACGTACG', 'POSITION': 11, 'LENGTH': 18,
+                                             'TM': 58.96}
+    assert primers['PRIMERS'][0]['PAIR'] == {'PENALTY': 0.5, 'PRODUCT_SIZE': 120}
+
+
+def test_pair_summary():
+    assert pair_summary(hierarchize(PRIMER3_RESULTS)) == [
+        {'Pair': 1, 'Left': 'ACGTACGTACGTACGTAC', 'Left Tm': 59.5, 'Right': 'TTGCAACGTTGCAACGTT', 'Right Tm': 60.1,
+         'Product Size': 120, 'Penalty': 0.5},
+        {'Pair': 2, 'Left': 'CGTACGTACGTACGTACG', 'Left Tm': 59.0, 'Right': 'GTTGCAACGTTGCAACGT', 'Right Tm': 59.5,
+         'Product Size': 130, 'Penalty': 0.9}]
+    single = {'PRIMERS': [{'LEFT': {'SEQUENCE': 'ACGTACGTACGTACGTAC', 'TM': 59.54, 'PENALTY': 0.4}}]}
+    assert pair_summary(single) == [{'Pair': 1, 'Left': 'ACGTACGTACGTACGTAC', 'Left Tm': 59.5, 'Penalty': 0.4}]
@@ -0,0 +1,69 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import random
+
+import pytest
+
+import primer3_st_specificity
+import primer3_st_templates
+from primer3_st_specificity import (GenomeIndex, build_index, check_pairs, pcr_products, reverse_complement,
+                                    specificity_rows)
+
+random.seed(11)
+CHR1 = ''.join(random.choice('ACGT') for _ in range(5000))
+CHR2 = ''.join(random.choice('ACGT') for _ in range(3000))
+LEFT = CHR1[1000:1020]
+RIGHT = reverse_complement(CHR1[1230:1250])
+
+
+@pytest.fixture
+def genome(tmp_path, monkeypatch):
+    monkeypatch.setattr(primer3_st_templates, 'INDEX_DIR', str(tmp_path / 'indexes'))
+    # A copy of the amplicon with one mismatch in the left primer on chr2
+    off_target = CHR1[1000:1250]
+    off_target = off_target[:5] + ('A' if off_target[5] != 'A' else 'C') + off_target[6:]
+    path = tmp_path / 'genome.fa'
+    path.write_text(f'>chr1\n{CHR1}\n>chr2\n{CHR2[:500]}{off_target}{CHR2[500:]}\n')
+    return str(path)
+
+
+def test_pcr_products(genome, tmp_path):
+    index = GenomeIndex(build_index(genome, str(tmp_path / 'genome.p3kx')))
+    products = pcr_products(index, {'LEFT': LEFT, 'RIGHT': RIGHT}, max_size=1000, max_mismatches=1)
+    assert products == [{'Chrom': 'chr1', 'Start': 1001, 'End': 1250, 'Size': 250, 'Forward': 'LEFT',
+                         'Reverse': 'RIGHT', 'Mismatches': 0},
+                        {'Chrom': 'chr2', 'Start': 501, 'End': 750, 'Size': 250, 'Forward': 'LEFT',
+                         'Reverse': 'RIGHT', 'Mismatches': 1}]
+    assert pcr_products(index, {'LEFT': LEFT, 'RIGHT': RIGHT}, max_size=200) == []
+    assert len(pcr_products(index, {'LEFT': LEFT, 'RIGHT': RIGHT}, max_mismatches=0)) == 1
+    index.close()
+
+
+def test_check_pairs_builds_the_index(genome):
+    pairs = ((1, LEFT, RIGHT, 250),)
+    steps = []
+    results = check_pairs(genome, pairs, max_size=1000, max_mismatches=1, max_workers=1,
+                          progress=lambda **step: steps.append(step))
+    assert specificity_rows(pairs, results) == [{'Pair': 1, 'Products': 2, 'Off-target': 1, 'On target': True}]
+    assert steps[0] == {'done': 0, 'total': 2} and steps[-1] == {'done': 2, 'total': 2}
+
+
+def test_build_index_refuses_large_files(genome, tmp_path, monkeypatch):
+    monkeypatch.setattr(primer3_st_specificity, 'MAX_GENOME_SIZE', 1000)
+    with pytest.raises(ValueError):
+        build_index(genome, str(tmp_path / 'genome.p3kx'))
@@ -0,0 +1,95 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import random
+import struct
+
+import pytest
+
+import primer3_st_templates
+from primer3_st_templates import TWOBIT_SIGNATURE, fetch_region, parse_region
+
+random.seed(7)
+CHR1 = ''.join(random.choice('ACGT') for _ in range(95))
+CHR2 = ''.join(random.choice('ACGT') for _ in range(40))
+
+
+def write_fasta(path, records, width=10, newline='\n'):
+    with open(path, 'w', newline='') as f:
+        for name, seq in records:
+            f.write(f'>{name} description{newline}')
+            for i in range(0, len(seq), width):
+                f.write(seq[i:i + width] + newline)
+
+
+def write_twobit(path, records):
+    # Version 0 little-endian 2bit, runs of N become N blocks and lower
+    # case runs mask blocks
+    codes = {'T': 0, 'C': 1, 'A': 2, 'G': 3}
+    header_size = 16 + sum(1 + len(name) + 4 for name, _ in records)
+    index = b''
+    data = b''
+    for name, seq in records:
+        index += bytes([len(name)]) + name.encode() + struct.pack('<I', header_size + len(data))
+        blocks = {}
+        for kind, test in [('n', lambda base: base in 'Nn'), ('mask', str.islower)]:
+            starts = [i for i, base in enumerate(seq) if test(base) and (i == 0 or not test(seq[i - 1]))]
+            ends = [i + 1 for i, base in enumerate(seq) if test(base) and (i == len(seq) - 1 or not test(seq[i + 1]))]
+            blocks[kind] = (struct.pack('<I', len(starts)) + struct.pack(f'<{len(starts)}I', *starts)
+                            + struct.pack(f'<{len(starts)}I', *[end - start for start, end in zip(starts, ends)]))
+        packed = bytearray()
+        bases = [codes.get(base.upper(), 0) for base in seq] + [0] * (-len(seq) % 4)
+        for i in range(0, len(bases), 4):
+            packed.append(bases[i] << 6 | bases[i + 1] << 4 | bases[i + 2] << 2 | bases[i + 3])
+        data += struct.pack('<I', len(seq)) + blocks['n'] + blocks['mask'] + struct.pack('<I', 0) + bytes(packed)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IIII', TWOBIT_SIGNATURE, 0, len(records), 0) + index + data)
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(primer3_st_templates, 'INDEX_DIR', str(tmp_path / 'indexes'))
+
+
+def test_parse_region():
+    assert parse_region('chr1:1,001-2,000') == ('chr1', 1000, 2000)
+    assert parse_region(' chr2 ') == ('chr2', 0, None)
+    with pytest.raises(ValueError):
+        parse_region('chr1:20-10')
+
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_fetch_fasta_region(tmp_path, newline):
+    path = tmp_path / 'genome.fa'
+    write_fasta(path, [('chr1', CHR1), ('chr2', CHR2)], newline=newline)
+    assert fetch_region(str(path), 'chr1:21-30') == ('chr1:21-30', CHR1[20:30], (0, 10))
+    assert fetch_region(str(path), 'chr1:19-95', flank=5) == ('chr1:19-95', CHR1[13:95], (5, 77))
+    assert fetch_region(str(path), 'chr2') == ('chr2:1-40', CHR2, (0, 40))
+    assert (tmp_path / 'indexes').is_dir()
+    with pytest.raises(ValueError):
+        fetch_region(str(path), 'chr2:30-41')
+    with pytest.raises(ValueError):
+        fetch_region(str(path), 'chr3:1-10')
+
+
+def test_fetch_twobit_region(tmp_path):
+    path = tmp_path / 'genome.2bit'
+    chr2 = CHR2[:10] + 'NNNNN' + CHR2[15:25].lower() + CHR2[25:]
+    write_twobit(path, [('chr1', CHR1), ('chr2', chr2)])
+    assert fetch_region(str(path), 'chr1:3-93') == ('chr1:3-93', CHR1[2:93], (0, 91))
+    assert fetch_region(str(path), 'chr2:12-20', flank=3) == ('chr2:12-20', chr2[8:23], (3, 9))
+    assert fetch_region(str(path), 'chr2')[1] == chr2
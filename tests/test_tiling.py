@@ -0,0 +1,51 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+import pytest
+
+from primer3_st_tiling import check_tiling, tile_count, tile_windows, window_regions
+
+
+def test_tile_windows():
+    assert list(tile_windows(12000, 5000, 1000)) == [(0, 5000), (4000, 9000), (8000, 12000)]
+    assert list(tile_windows(3000, 5000, 1000)) == [(0, 3000)]
+    assert list(tile_windows(9000, 5000, 1000)) == [(0, 5000), (4000, 9000)]
+    for seq_length in [1, 5000, 5001, 9000, 9001, 12000]:
+        assert tile_count(seq_length, 5000, 1000) == len(list(tile_windows(seq_length, 5000, 1000)))
+
+
+def test_check_tiling():
+    check_tiling(5000, 0, [[1, 5000]])
+    with pytest.raises(ValueError):
+        check_tiling(5000, 5000)
+    with pytest.raises(ValueError):
+        check_tiling(5000, -1)
+    with pytest.raises(ValueError):
+        check_tiling(5000, 1000, [[1, 200], [3000, 5001]])
+
+
+def test_window_regions():
+    seq_args = {'SEQUENCE_TARGET': [[4101, 100]], 'SEQUENCE_EXCLUDED_REGION': [[3901, 300], [7001, 10]]}
+    # Targets are shifted into the window, excluded regions are clipped to it
+    assert window_regions(seq_args, 4000, 9000) == {'SEQUENCE_EXCLUDED_REGION': [[1, 200], [3001, 10]],
+                                                    'SEQUENCE_TARGET': [[101, 100]]}
+    assert window_regions(seq_args, 0, 5000) == {'SEQUENCE_EXCLUDED_REGION': [[3901, 300]],
+                                                 'SEQUENCE_TARGET': [[4101, 100]]}
+    # A window without the whole target cannot be designed
+    assert window_regions(seq_args, 4150, 9150) is None
+    assert window_regions({**seq_args, 'PRIMER_FIRST_BASE_INDEX': 0}, 4000, 9000) == {
+        'SEQUENCE_EXCLUDED_REGION': [[0, 201], [3001, 10]], 'SEQUENCE_TARGET': [[101, 100]]}
@@ -0,0 +1,49 @@
+# Copyright 2023 Alberto Pessoa <pessoa.am@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# # You should have received a copy of the
+# GNU Affero General Public License along with this program.
+# If not, see <https://www.gnu.org/licenses/>.
+
+
+from primer3_st_walking import coverage_gaps, primer_window, read_span, walk_positions, walk_regions
+
+
+def test_walk_positions():
+    assert list(walk_positions(0, 1200, 500, 250)) == [('LEFT', 0), ('LEFT', 500), ('LEFT', 1000)]
+    assert list(walk_positions(100, 1200, 500, 250, reverse=True)) == [
+        ('LEFT', 100), ('LEFT', 600), ('LEFT', 1100), ('RIGHT', 350), ('RIGHT', 850), ('RIGHT', 1350)]
+
+
+def test_walk_regions():
+    assert walk_regions({'SEQUENCE_TEMPLATE': 'A' * 300}) == [(0, 300)]
+    assert walk_regions({'SEQUENCE_TEMPLATE': 'A' * 300, 'SEQUENCE_TARGET': [[201, 50], [11, 20]]}) == [
+        (10, 30), (200, 250)]
+
+
+def test_primer_window_and_read_span():
+    assert primer_window('LEFT', 500, 2000, 50, 20, 27) == (403, 450)
+    assert primer_window('RIGHT', 500, 2000, 50, 20, 27) == (551, 598)
+    # Too close to the start to hold a primer, design_walk notes it
+    start, end = primer_window('LEFT', 30, 2000, 50, 20, 27)
+    assert end - start < 18
+    # 1-based primer positions, the right primer position is its 3' end
+    assert read_span({'POSITION': 431, 'LENGTH': 20}, 'LEFT', 2000, 50, 700) == (500, 1200)
+    assert read_span({'POSITION': 570, 'LENGTH': 20}, 'RIGHT', 2000, 50, 700) == (0, 500)
+
+
+def test_coverage_gaps():
+    reads = [('LEFT', 0, 400), ('LEFT', 500, 900)]
+    assert coverage_gaps([(0, 1000)], reads) == [[400, 500, 'None'], [900, 1000, 'None']]
+    reads.append(('RIGHT', 300, 1000))
+    assert coverage_gaps([(0, 1000)], reads, reverse=True) == [
+        [0, 300, 'Forward only'], [400, 500, 'Reverse only'], [900, 1000, 'Reverse only']]